@@ -0,0 +1,63 @@
+"""
+法案名の検出について、全法案名を順に部分文字列検索する従来の方法とBillNameMatcherを比較する
+
+poetry run python -m benchmarks.bench_bill_matcher --num_bills 5000 --num_speeches 1000
+"""
+
+import argparse
+import random
+import timeit
+
+from crawler.utils import BillNameMatcher
+
+SUBJECTS = ['地方税', '所得税', '国家公務員', '子ども', '地球温暖化', 'デジタル社会', '原子力', '労働基準', '医療', '郵政']
+ACTIONS = ['の一部を改正する', 'の整備に関する', 'の推進に関する', 'の特例に関する', 'の廃止に関する']
+SUFFIXES = ['法律案', '法案', '基本法案']
+
+
+def build_corpus(num_bills, num_speeches, seed=0):
+    rnd = random.Random(seed)
+    bill_id2names = dict()
+    for i in range(num_bills):
+        name = rnd.choice(SUBJECTS) + rnd.choice(ACTIONS) + rnd.choice(SUFFIXES) + f'（第{i}号）'
+        bill_id2names[f'Bill:{i}'] = name
+    names = list(bill_id2names.values())
+    speeches = []
+    for _ in range(num_speeches):
+        speech = '、'.join(rnd.choice(names) for _ in range(rnd.randint(0, 3)))
+        speeches.append('これより会議を開きます。' + speech + 'を一括して議題とします。' * rnd.randint(1, 20))
+    return bill_id2names, speeches
+
+
+def extract_topic_ids_naive(speech, bill_id2names):
+    return [bill_id for bill_id, bill_name in bill_id2names.items() if bill_name in speech]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_bills', type=int, default=5000)
+    parser.add_argument('--num_speeches', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bill_id2names, speeches = build_corpus(args.num_bills, args.num_speeches)
+    build_time = timeit.timeit(lambda: BillNameMatcher(bill_id2names).find_ids(''), number=1)  # built lazily
+    matcher = BillNameMatcher(bill_id2names)
+    for speech in speeches:
+        assert matcher.find_ids(speech) == extract_topic_ids_naive(speech, bill_id2names)
+
+    naive_time = min(timeit.repeat(
+        lambda: [extract_topic_ids_naive(speech, bill_id2names) for speech in speeches],
+        number=1, repeat=args.repeat))
+    matcher_time = min(timeit.repeat(
+        lambda: [matcher.find_ids(speech) for speech in speeches],
+        number=1, repeat=args.repeat))
+
+    print(f'{args.num_bills} bills, {args.num_speeches} speeches')
+    print(f'naive:   {naive_time:.3f}s')
+    print(f'matcher: {matcher_time:.3f}s (+{build_time:.3f}s to build once)')
+    print(f'speedup: {naive_time / matcher_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
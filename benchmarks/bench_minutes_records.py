@@ -0,0 +1,112 @@
+"""
+会議録のSpeech, SpeechText, Activity, Urlについて、スキーマオブジェクトとRecordの生成速度とメモリ使用量を比較する
+
+poetry run python -m benchmarks.bench_minutes_records --num_speeches 10000 --num_speakers 50
+"""
+
+import argparse
+import gc
+import timeit
+import tracemalloc
+from datetime import datetime
+
+from crawler.utils import build_speech, build_minutes_activity, build_url, UrlTitle, SpeechRecord, ActivityRecord, \
+    UrlRecord, SpeechTextRecord
+from politylink.elasticsearch.schema import SpeechText
+
+MINUTES_ID = 'Minutes:benchmark'
+MINUTES_NAME = '衆議院本会議'
+DATE = '2021-01-01'
+DOMAIN = 'ndl.go.jp'
+
+
+def build_speech_recs(num_speeches, num_speakers):
+    return [{
+        'speechOrder': str(i),
+        'speaker': f'議員{i % num_speakers}',
+        'speech': f'○議員{i % num_speakers}　' + 'ただいま議題となりました法律案について質問いたします。' * 10,
+        'speechURL': f'https://kokkai.ndl.go.jp/txt/benchmark/{i}'
+    } for i in range(1, num_speeches + 1)]
+
+
+def build_schema_objects(speech_recs, dt):
+    """
+    build objects in the same way as MinutesSpider.scrape_meeting before the records
+    """
+
+    objects, speaker2url = [], dict()
+    for rec in speech_recs:
+        speech = build_speech(MINUTES_ID, int(rec['speechOrder']))
+        speech.ndl_url = rec['speechURL']
+        speech.speaker_name = rec['speaker']
+        speech.member_id = f'Member:{rec["speaker"]}'
+        objects.append(speech)
+        objects.append(SpeechText({
+            'id': speech.id, 'title': MINUTES_NAME, 'speaker': rec['speaker'], 'body': rec['speech'], 'date': DATE}))
+        if rec['speaker'] not in speaker2url:
+            activity = build_minutes_activity(f'Member:{rec["speaker"]}', MINUTES_ID, dt)
+            url = build_url(rec['speechURL'], UrlTitle.HONBUN, DOMAIN)
+            url.to_id = activity.id
+            objects.append(activity)
+            speaker2url[rec['speaker']] = url
+    return objects + list(speaker2url.values())
+
+
+def build_records(speech_recs, dt):
+    objects, speaker2url = [], dict()
+    for rec in speech_recs:
+        speech = SpeechRecord(MINUTES_ID, int(rec['speechOrder']))
+        speech.ndl_url = rec['speechURL']
+        speech.speaker_name = rec['speaker']
+        speech.member_id = f'Member:{rec["speaker"]}'
+        objects.append(speech)
+        objects.append(SpeechTextRecord(speech.id, MINUTES_NAME, rec['speaker'], rec['speech'], DATE))
+        if rec['speaker'] not in speaker2url:
+            activity = ActivityRecord(f'Member:{rec["speaker"]}', MINUTES_ID, dt)
+            url = UrlRecord(rec['speechURL'], UrlTitle.HONBUN, DOMAIN)
+            url.to_id = activity.id
+            objects.append(activity)
+            speaker2url[rec['speaker']] = url
+    return objects + list(speaker2url.values())
+
+
+def measure_bytes(build, speech_recs, dt):
+    """
+    :return: bytes retained by the built objects, excluding the speech records shared by both builders
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    objects = build(speech_recs, dt)
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return end - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_speeches', type=int, default=10000)
+    parser.add_argument('--num_speakers', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    speech_recs = build_speech_recs(args.num_speeches, args.num_speakers)
+    dt = datetime(2021, 1, 1)
+    schema_ids = [obj.id for obj in build_schema_objects(speech_recs, dt)]
+    assert [obj.id for obj in build_records(speech_recs, dt)] == schema_ids
+
+    print(f'{args.num_speeches} speeches, {args.num_speakers} speakers, {len(schema_ids)} objects')
+    name2time = dict()
+    for name, build in [('schema', build_schema_objects), ('record', build_records)]:
+        name2time[name] = min(timeit.repeat(lambda: build(speech_recs, dt), number=1, repeat=args.repeat))
+        num_bytes = measure_bytes(build, speech_recs, dt)
+        print(f'{name}: {len(schema_ids) / name2time[name]:,.0f} objects/s, '
+              f'{num_bytes / args.num_speeches:,.0f} bytes/speech')
+    print(f'speedup: {name2time["schema"] / name2time["record"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
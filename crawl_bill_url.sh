@@ -1,7 +1,4 @@
 #!/bin/bash
 
-spiders=("caa" "cao" "cas" "maff" "mlit" "mof" "mofa" "npa" "sanhou" "shuhou" "soumu")
-for spider in "${spiders[@]}"
-do
-  poetry run scrapy crawl ${spider}
-done
\ No newline at end of file
+# run all the bill url spiders concurrently in one process
+poetry run python -m crawler.runner --group bill_url "$@"
@@ -0,0 +1,158 @@
+"""
+会議録のバックフィルを期間ごとに分割し、複数のプロセスで並行に実行する
+
+poetry run python -m crawler.backfill --start_date 2015-01-01 --end_date 2020-12-31 --shard_days 90 --workers 8 \
+    -a speech=true -a keyphrase=true
+
+各プロセスは担当期間をMinutesSpiderで独自のチェックポイントから再開しながらクロールし、
+全期間の統計と失敗をまとめたレポートを出力する。同じ引数で再実行すると未完了の期間のみクロールする。
+バックフィル中は会議録と発言のインデックスのrefreshを止め、全期間の終了後に一度だけrefreshする。
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+from collections import Counter
+from logging import getLogger
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.log import configure_logging
+from scrapy.utils.project import get_project_settings, data_path
+
+from crawler.runner import parse_key_values
+from crawler.utils import split_date_range
+from crawler.utils.elasticsearch import disable_refresh, restore_refresh
+from politylink.elasticsearch.client import ElasticsearchClient
+from politylink.elasticsearch.schema import MinutesText, SpeechText
+
+LOGGER = getLogger(__name__)
+
+# stats which are not counters, reported as the max over windows instead of the sum
+MAX_STAT_PREFIXES = ('memusage/', 'elapsed_time_seconds')
+
+
+def crawl_window(task):
+    """
+    crawl minutes of one window in a fresh process, since the reactor can not be restarted
+    :param task: (window_from, window_until, spider_kwargs, setting overrides)
+    :return: dict of the result
+    """
+
+    window_from, window_until, spider_kwargs, overrides = task
+    result = {'window': [window_from, window_until], 'finish_reason': None, 'stats': dict(), 'error': None}
+    try:
+        settings = get_project_settings()
+        settings.setdict(overrides, priority='cmdline')
+        process = CrawlerProcess(settings)
+        crawler = process.create_crawler('minutes')
+        process.crawl(crawler, start_date=window_from, end_date=window_until, resume='true', **spider_kwargs)
+        process.start()
+        stats = crawler.stats.get_stats()
+        result['finish_reason'] = stats.get('finish_reason')
+        result['stats'] = {k: v for k, v in stats.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+    except Exception:
+        result['error'] = traceback.format_exc()
+    return result
+
+
+def build_report(results):
+    """
+    :return: dict of the stats merged over windows and the failed windows.
+             counters are summed, and the others in MAX_STAT_PREFIXES (ex. memory usage) take the max
+    """
+
+    stats = Counter()
+    for result in results:
+        for key, value in result['stats'].items():
+            if key.startswith(MAX_STAT_PREFIXES):
+                stats[key] = max(stats.get(key, value), value)
+            else:
+                stats[key] += value
+    failures = [result for result in results if result['error'] or result['finish_reason'] != 'finished']
+    return {
+        'num_windows': len(results),
+        'num_failures': len(failures),
+        'stats': dict(sorted(stats.items())),
+        'failures': [{k: result[k] for k in ['window', 'finish_reason', 'error']} for result in failures],
+    }
+
+
+def run_backfill(windows, workers, spider_kwargs=None, overrides=None, log_dir=None):
+    """
+    :param log_dir: directory to write the log of each window, or None to write them to stderr together
+    :return: list of the results of crawl_window in the order of completion
+    """
+
+    tasks = []
+    for window_from, window_until in windows:
+        window_overrides = dict(overrides or dict())
+        if log_dir:
+            window_overrides['LOG_FILE'] = f'{log_dir}/minutes_{window_from}_{window_until}.log'
+        tasks.append((window_from, window_until, spider_kwargs or dict(), window_overrides))
+    results = []
+    # spawn so that workers do not inherit the reactor or the threads of the parent
+    with multiprocessing.get_context('spawn').Pool(workers, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(crawl_window, tasks):
+            results.append(result)
+            window_from, window_until = result['window']
+            status = 'failed' if result['error'] else result['finish_reason']
+            LOGGER.info(f'[{len(results)}/{len(tasks)}] {window_from}~{window_until}: {status}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='backfill minutes in parallel processes')
+    parser.add_argument('--start_date', required=True, help='first date in %%Y-%%m-%%d')
+    parser.add_argument('--end_date', required=True, help='last date (inclusive) in %%Y-%%m-%%d')
+    parser.add_argument('--shard_days', type=int, default=90, help='number of days crawled by a task')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of processes, each of which sends its own requests to the NDL API')
+    parser.add_argument('--report', help='path to write the report in JSON')
+    parser.add_argument('--log_dir', help='directory to write the log of each window')
+    parser.add_argument('--keep_refresh', action='store_true',
+                        help='keep refreshing the indices during the backfill instead of refreshing them at the end')
+    parser.add_argument('-a', dest='spider_args', action='append', metavar='NAME=VALUE',
+                        help='argument passed to MinutesSpider of every window')
+    parser.add_argument('-s', dest='settings', action='append', metavar='NAME=VALUE', help='setting override')
+    args = parser.parse_args()
+
+    spider_kwargs = parse_key_values(args.spider_args)
+    for key in ['start_date', 'end_date', 'resume', 'checkpoint', 'incremental']:
+        if key in spider_kwargs:
+            parser.error(f'{key} is managed by the coordinator')
+    # workers already use all the cores, so extract keyphrases in the persistence thread of each worker
+    overrides = {'KEYPHRASE_WORKERS': 0}
+    if not args.keep_refresh:
+        overrides['ELASTICSEARCH_REFRESH'] = False  # leave the indices disabled here to the coordinator
+    overrides.update(parse_key_values(args.settings))
+
+    configure_logging(get_project_settings())
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+    windows = split_date_range(args.start_date, args.end_date, args.shard_days)
+    LOGGER.info(f'backfill {len(windows)} windows from {args.start_date} to {args.end_date} in {args.workers} processes')
+    es_client, index2interval = None, dict()
+    if not args.keep_refresh:
+        es_client = ElasticsearchClient()
+        index2interval = disable_refresh(es_client.client, [MinutesText.index, SpeechText.index])
+    try:
+        results = run_backfill(windows, args.workers, spider_kwargs, overrides, args.log_dir)
+    finally:
+        if index2interval:
+            restore_refresh(es_client.client, index2interval)
+    report = build_report(results)
+    report_path = args.report or data_path(f'minutes_backfill_{args.start_date}_{args.end_date}.report.json',
+                                           createdir=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    LOGGER.info(f'wrote the report of {report["num_windows"]} windows to {report_path}')
+    if report['num_failures']:
+        LOGGER.error(f'{report["num_failures"]} windows failed, run the same command again to resume them')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
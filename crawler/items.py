@@ -0,0 +1,176 @@
+"""
+Spiderから永続化パイプラインへ渡すItemを定義する
+
+SpiderはGraphQLやElasticsearchに直接書き込まず、これらのItemをyieldする
+実際の書き込みはcrawler.pipelines.PersistencePipelineがまとめて行う
+"""
+
+import scrapy
+
+from crawler.utils import UrlTitle
+from politylink.elasticsearch.client import OpType
+
+
+class MergeItem(scrapy.Item):
+    """
+    GraphQL objects (Minutes, Speech, Activity, Url, ...) to merge
+    """
+
+    objects = scrapy.Field()
+
+
+class LinkItem(scrapy.Item):
+    """
+    pairs of politylink ids to link in GraphQL
+    """
+
+    from_ids = scrapy.Field()
+    to_ids = scrapy.Field()
+
+
+class MutationItem(scrapy.Item):
+    """
+    GraphQL objects to merge and pairs of politylink ids to link in one mutation
+    """
+
+    objects = scrapy.Field()
+    from_ids = scrapy.Field()
+    to_ids = scrapy.Field()
+
+
+class ReplaceUrlsItem(scrapy.Item):
+    """
+    Urls to replace the ones of url_title linked to each of parent_ids in GraphQL
+    each Url should have to_id to one of parent_ids
+    if require_parents is True, Urls of parents which do not exist in GraphQL are skipped instead of merged
+    """
+
+    parent_ids = scrapy.Field()
+    url_title = scrapy.Field()
+    urls = scrapy.Field()
+    require_parents = scrapy.Field()
+
+
+class IndexItem(scrapy.Item):
+    """
+    Elasticsearch documents (MinutesText, SpeechText, NewsText, ...) to index
+    """
+
+    texts = scrapy.Field()
+    op_type = scrapy.Field()
+
+
+class KeyphraseItem(scrapy.Item):
+    """
+    GraphQL objects (Activity) to set keyphrases extracted from texts before they are merged
+    the pipeline updates the objects in place, so this should be yielded before the item to merge them
+    """
+
+    objects = scrapy.Field()
+    texts = scrapy.Field()
+    num_keyphrases = scrapy.Field()
+
+
+class CheckpointItem(scrapy.Item):
+    """
+    marker to notify the spider of state via SpiderTemplate.on_checkpoint
+    once all the items yielded before it are persisted
+
+    if ids are given, the state only depends on the objects of the ids
+    and is notified unless they failed even if other items in the same batch failed
+    """
+
+    state = scrapy.Field()
+    ids = scrapy.Field()
+
+
+def build_merge_item(objects):
+    return MergeItem(objects=list(objects))
+
+
+def build_link_item(from_ids, to_ids):
+    return LinkItem(from_ids=list(from_ids), to_ids=list(to_ids))
+
+
+def build_replace_urls_item(parent_ids, url_title, urls, require_parents=False):
+    url_title = url_title.value if isinstance(url_title, UrlTitle) else url_title
+    return ReplaceUrlsItem(parent_ids=list(dict.fromkeys(parent_ids)), url_title=url_title, urls=list(urls),
+                           require_parents=require_parents)
+
+
+def build_index_item(texts, op_type=OpType.INDEX):
+    return IndexItem(texts=list(texts), op_type=op_type)
+
+
+def build_keyphrase_item(objects, texts, num_keyphrases):
+    return KeyphraseItem(objects=list(objects), texts=list(texts), num_keyphrases=num_keyphrases)
+
+
+class LinkAccumulator:
+    """
+    collect GraphQL objects and links produced while handling a response
+    to persist them as a single MutationItem with duplicated links removed
+    """
+
+    def __init__(self):
+        self.objects = []
+        self.links = dict()  # use dict as ordered set of (from_id, to_id)
+
+    def add(self, item):
+        self.objects += get_item_objects(item)
+        for link in get_item_links(item):
+            self.links[link] = None
+
+    def flush(self):
+        """
+        :return: list of MutationItem which is empty if nothing is collected
+        """
+
+        if not (self.objects or self.links):
+            return []
+        from_ids, to_ids = zip(*self.links) if self.links else ([], [])
+        item = MutationItem(objects=self.objects, from_ids=list(from_ids), to_ids=list(to_ids))
+        self.objects, self.links = [], dict()
+        return [item]
+
+
+def get_item_objects(item):
+    if isinstance(item, (MergeItem, MutationItem)):
+        return item['objects']
+    return []
+
+
+def get_item_links(item):
+    if isinstance(item, (LinkItem, MutationItem)):
+        return list(zip(item['from_ids'], item['to_ids']))
+    return []
+
+
+def get_item_ids(item):
+    """
+    ids of objects and texts persisted by the item, to pass to CheckpointItem
+    """
+
+    if isinstance(item, (MergeItem, MutationItem)):
+        return [obj.id for obj in item['objects']]
+    elif isinstance(item, ReplaceUrlsItem):
+        return [url.id for url in item['urls']]
+    elif isinstance(item, IndexItem):
+        return [text.id for text in item['texts']]
+    return []
+
+
+def get_item_size(item):
+    """
+    number of backend operations required to persist the item
+    """
+
+    if isinstance(item, (MergeItem, LinkItem, MutationItem)):
+        return len(get_item_objects(item)) + len(get_item_links(item))
+    elif isinstance(item, ReplaceUrlsItem):
+        return len(item['parent_ids']) + len(item['urls'])
+    elif isinstance(item, (IndexItem, KeyphraseItem)):
+        return len(item['texts'])
+    elif isinstance(item, CheckpointItem):
+        return 0
+    return 1
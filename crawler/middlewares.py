@@ -0,0 +1,130 @@
+"""
+ドメインごとの並列数・間隔・リトライ回数をDOMAIN_POLICIESに従って適用するダウンローダーミドルウェアを定義する
+"""
+
+from logging import getLogger
+
+from scrapy import signals
+from scrapy.utils.httpobj import urlparse_cached
+
+LOGGER = getLogger(__name__)
+
+
+class DomainPolicy:
+    """
+    Politeness of a domain
+    :param concurrency: max number of concurrent requests to the domain
+    :param delay: min seconds between requests to the domain
+    :param autothrottle_target: average number of concurrent requests to aim at by adjusting the delay with latency,
+                                the delay is fixed if None
+    :param retry_times: max number of retries of a failed request
+    """
+
+    def __init__(self, domain, concurrency=1, delay=1.0, autothrottle_target=None, retry_times=2):
+        self.domain = domain
+        self.concurrency = int(concurrency)
+        self.delay = float(delay)
+        self.autothrottle_target = autothrottle_target
+        self.retry_times = int(retry_times)
+
+    def __repr__(self):
+        return f'DomainPolicy({self.domain}, concurrency={self.concurrency}, delay={self.delay}, ' \
+               f'autothrottle_target={self.autothrottle_target}, retry_times={self.retry_times})'
+
+    def matches(self, hostname):
+        return hostname == self.domain or hostname.endswith('.' + self.domain)
+
+
+def build_domain_policies(domain2policy, default_policy=None):
+    """
+    :param domain2policy: dict of domain -> dict of DomainPolicy parameters
+    :param default_policy: dict of DomainPolicy parameters shared by all domains unless overridden
+    :return: list of DomainPolicy, longer domains first to prefer the most specific one
+    """
+
+    policies = [DomainPolicy(domain, **{**(default_policy or dict()), **params})
+                for domain, params in domain2policy.items()]
+    return sorted(policies, key=lambda x: len(x.domain), reverse=True)
+
+
+class DomainPolicyMiddleware:
+    """
+    Enforce DomainPolicy on requests
+
+    Requests to the domain of a policy share one download slot named after the domain, so that the limits apply
+    across its subdomains. The policy of spider.domain is used even if it is not in DOMAIN_POLICIES,
+    and spider.max_concurrent_requests and spider.download_delay take precedence over the policy if set.
+    Requests to the other domains are left to the global settings.
+    """
+
+    def __init__(self, crawler, policies, default_policy=None):
+        self.crawler = crawler
+        self.policies = policies
+        self.default_policy = default_policy or dict()
+        self.max_delay = crawler.settings.getfloat('AUTOTHROTTLE_MAX_DELAY', 60.0)
+        self.spider_policy = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        default_policy = settings.getdict('DOMAIN_POLICY_DEFAULT')
+        policies = build_domain_policies(settings.getdict('DOMAIN_POLICIES'), default_policy)
+        middleware = cls(crawler, policies, default_policy)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        domain = getattr(spider, 'domain', NotImplemented)
+        if isinstance(domain, str):
+            policy = self.find_policy(domain) or DomainPolicy(domain, **self.default_policy)
+            policy = DomainPolicy(
+                domain=policy.domain,
+                concurrency=getattr(spider, 'max_concurrent_requests', policy.concurrency),
+                delay=getattr(spider, 'download_delay', policy.delay),
+                autothrottle_target=policy.autothrottle_target,
+                retry_times=policy.retry_times
+            )
+            self.spider_policy = policy
+            self.policies = [x for x in self.policies if x.domain != policy.domain] + [policy]
+            self.policies.sort(key=lambda x: len(x.domain), reverse=True)
+            LOGGER.info(f'applied {policy} to {spider.name}')
+
+        downloader = self.crawler.engine.downloader
+        for policy in self.policies:
+            downloader.per_slot_settings[policy.domain] = {'concurrency': policy.concurrency, 'delay': policy.delay}
+
+    def find_policy(self, hostname):
+        for policy in self.policies:
+            if policy.matches(hostname):
+                return policy
+        return None
+
+    def process_request(self, request, spider):
+        policy = self.find_policy(urlparse_cached(request).hostname or '')
+        if policy is None:
+            return None
+        request.meta.setdefault('download_slot', policy.domain)
+        request.meta.setdefault('max_retry_times', policy.retry_times)
+        if policy.autothrottle_target:
+            request.meta['autothrottle_dont_adjust_delay'] = True  # adjusted by process_response instead
+        return None
+
+    def process_response(self, request, response, spider):
+        policy = self.find_policy(urlparse_cached(request).hostname or '')
+        latency = request.meta.get('download_latency')
+        slot = self.crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+        if policy and policy.autothrottle_target and latency is not None and slot is not None:
+            self.adjust_delay(slot, policy, latency, response)
+        return response
+
+    def adjust_delay(self, slot, policy, latency, response):
+        """
+        same as AutoThrottle except that the target concurrency and the min delay come from the policy
+        """
+
+        target_delay = latency / policy.autothrottle_target
+        new_delay = max(target_delay, (slot.delay + target_delay) / 2.0)
+        new_delay = min(max(policy.delay, new_delay), self.max_delay)
+        if response.status != 200 and new_delay <= slot.delay:
+            return
+        slot.delay = new_delay
@@ -0,0 +1,474 @@
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, Future
+from functools import partial
+from logging import getLogger
+
+from scrapy.utils.project import data_path
+from twisted.internet import defer, task, threads
+
+from crawler.items import MergeItem, LinkItem, MutationItem, ReplaceUrlsItem, IndexItem, KeyphraseItem, \
+    CheckpointItem, get_item_size, get_item_objects, get_item_links
+from crawler.utils import ContentHashStore, KeyphraseCache, build_content_hash_entry, extract_keyphrases, to_schema
+from crawler.utils.elasticsearch import BulkIndexer
+from politylink.elasticsearch.client import OpType
+from politylink.graphql.client import GraphQLClient
+
+LOGGER = getLogger(__name__)
+
+
+class PersistencePipeline:
+    """
+    Buffer items yielded by spiders and persist them to GraphQL and Elasticsearch in batches
+
+    A batch is flushed when it reaches batch_size operations, every flush_interval seconds, and on spider close.
+    Flushing runs in a worker thread so that the reactor can keep downloading while waiting for the backends.
+    When hash_store is given, objects whose content is the same as the last write are skipped.
+    CheckpointItems are passed back to the spider once the batch containing them is persisted without failure.
+    Keyphrases of KeyphraseItems are extracted in a pool of keyphrase_workers processes (inline if 0)
+    and set to the objects before the mutation of the batch. keyphrase_cache is consulted before extraction.
+    Texts are indexed by BulkIndexer built with bulk_index_options if given, otherwise by es_client.bulk_index.
+    """
+
+    mutation_item_classes = (MergeItem, LinkItem, MutationItem)
+    item_classes = mutation_item_classes + (ReplaceUrlsItem, IndexItem, KeyphraseItem, CheckpointItem)
+    keyphrase_chunk_size = 8  # texts per task of the process pool
+
+    def __init__(self, stats=None, batch_size=500, flush_interval=10, max_pending_batches=2, hash_store=None,
+                 keyphrase_workers=4, keyphrase_cache=None, bulk_index_options=None):
+        self.stats = stats
+        self.hash_store = hash_store
+        self.keyphrase_cache = keyphrase_cache
+        self.keyphrase_workers = keyphrase_workers
+        self.keyphrase_executor = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_batches = max_pending_batches
+        self.buffer = []
+        self.buffer_size = 0
+        self.num_pending_batches = 0
+        self.lock = defer.DeferredLock()  # persist one batch at a time to keep the write order
+        self.flush_loop = None
+        self.spider = None
+        self.gql_client = None
+        self.es_client = None
+        self.bulk_index_options = bulk_index_options
+        self.bulk_indexer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        hash_store = None
+        if settings.getbool('CONTENT_HASH_STORE_ENABLED', True):
+            path = data_path(settings.get('CONTENT_HASH_STORE_PATH', 'content_hash.sqlite'), createdir=True)
+            hash_store = ContentHashStore(path)
+        keyphrase_cache = None
+        if settings.getbool('KEYPHRASE_CACHE_ENABLED', True):
+            path = data_path(settings.get('KEYPHRASE_CACHE_PATH', 'keyphrase_cache.sqlite'), createdir=True)
+            keyphrase_cache = KeyphraseCache(path, max_entries=settings.getint('KEYPHRASE_CACHE_MAX_ENTRIES', 1000000))
+        return cls(
+            stats=crawler.stats,
+            batch_size=settings.getint('PERSISTENCE_BATCH_SIZE', 500),
+            flush_interval=settings.getfloat('PERSISTENCE_FLUSH_INTERVAL', 10),
+            max_pending_batches=settings.getint('PERSISTENCE_MAX_PENDING_BATCHES', 2),
+            hash_store=hash_store,
+            keyphrase_workers=settings.getint('KEYPHRASE_WORKERS', 4),
+            keyphrase_cache=keyphrase_cache,
+            bulk_index_options={
+                'max_docs': settings.getint('ELASTICSEARCH_BULK_MAX_DOCS', 500),
+                'max_bytes': settings.getint('ELASTICSEARCH_BULK_MAX_BYTES', 5 * 1024 * 1024),
+                'max_workers': settings.getint('ELASTICSEARCH_BULK_WORKERS', 2),
+                'max_retries': settings.getint('ELASTICSEARCH_BULK_MAX_RETRIES', 3),
+                'refresh': settings.getbool('ELASTICSEARCH_REFRESH', True),
+            }
+        )
+
+    def open_spider(self, spider):
+        self.spider = spider
+        self.gql_client = spider.gql_client
+        self.es_client = spider.es_client
+        if self.bulk_index_options is not None:
+            self.bulk_indexer = BulkIndexer(self.es_client, **self.bulk_index_options)
+        self.flush_loop = task.LoopingCall(self.flush)
+        self.flush_loop.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider):
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+        d = self.flush()
+        d.addBoth(lambda _: self.close_resources())
+        return d
+
+    def close_resources(self):
+        if self.hash_store:
+            self.hash_store.close()
+        if self.keyphrase_cache:
+            self.keyphrase_cache.close()
+        if self.keyphrase_executor:
+            self.keyphrase_executor.shutdown()
+        if self.bulk_indexer:
+            self.bulk_indexer.close()
+
+    def process_item(self, item, spider):
+        if not isinstance(item, self.item_classes):
+            return item
+
+        self.buffer.append(item)
+        self.buffer_size += get_item_size(item)
+        if self.buffer_size >= self.batch_size:
+            d = self.flush()
+            if self.num_pending_batches > self.max_pending_batches:
+                # stop feeding the scraper until the backends catch up
+                d.addCallback(lambda _: item)
+                return d
+        return item
+
+    def flush(self):
+        """
+        hand over the buffered items to a worker thread
+        :return: Deferred which fires when the items are persisted
+        """
+
+        if not self.buffer:
+            return self.lock.run(defer.succeed, None)  # wait for the pending batches
+
+        items = self.buffer
+        self.buffer, self.buffer_size = [], 0
+        self.num_pending_batches += 1
+        failed_ids = set()
+        d = self.lock.run(threads.deferToThread, self.persist, items, failed_ids)
+        d.addCallback(self.update_stats)
+        d.addCallback(self.notify_checkpoints, items, failed_ids)
+        d.addErrback(lambda f: LOGGER.error(f'failed to persist {len(items)} items: {f.getTraceback()}'))
+        d.addBoth(self.finish_batch)
+        return d
+
+    def finish_batch(self, _):
+        self.num_pending_batches -= 1
+
+    def update_stats(self, counter):
+        for key, value in counter.items():
+            LOGGER.info(f'{key}: {value}')
+            if self.stats:
+                self.stats.inc_value(f'persistence/{key}', value)
+        return counter
+
+    def notify_checkpoints(self, counter, items, failed_ids=None):
+        checkpoint_items = [item for item in items if isinstance(item, CheckpointItem)]
+        if not checkpoint_items or not self.spider:
+            return
+        num_skipped = 0
+        for item in checkpoint_items:
+            if 'ids' in item:
+                failed = bool(failed_ids and failed_ids.intersection(item['ids']))
+            else:
+                failed = bool(counter.get('failed'))
+            if failed:
+                num_skipped += 1
+            else:
+                self.spider.on_checkpoint(item['state'])
+        if num_skipped:
+            LOGGER.warning(f'skipped {num_skipped} checkpoints since the items they depend on failed')
+
+    def persist(self, items, failed_ids=None):
+        """
+        persist items in the order of Url deletion, GraphQL mutation and Elasticsearch index.
+        all merges and links in the batch are sent as one combined mutation where merges precede links
+        so that links always refer to merged objects. texts of objects failed to merge are not indexed
+        to keep GraphQL and Elasticsearch consistent (ex. News and NewsText)
+
+        :param failed_ids: set to add ids of objects and texts failed to persist
+        :return: Counter of persisted objects, and the number of items failed to persist
+        """
+
+        if failed_ids is None:
+            failed_ids = set()
+
+        counter = Counter()
+        mutation_items, replace_items, index_items, keyphrase_items = [], [], [], []
+        for item in items:
+            if isinstance(item, self.mutation_item_classes):
+                mutation_items.append(item)
+            elif isinstance(item, ReplaceUrlsItem):
+                replace_items.append(item)
+            elif isinstance(item, IndexItem):
+                index_items.append(item)
+            elif isinstance(item, KeyphraseItem):
+                keyphrase_items.append(item)
+
+        if keyphrase_items:
+            self.set_keyphrases(keyphrase_items, counter)
+
+        if replace_items:
+            try:
+                delete_ids, unlinks, url_mutation_item = self.diff_urls(replace_items)
+                if unlinks:
+                    from_ids, to_ids = zip(*unlinks)
+                    self.gql_client.bulk_unlink(list(from_ids), list(to_ids))
+                    LOGGER.info(f'unlinked {len(unlinks)} urls still used by other parents')
+                    counter['unlinked'] += len(unlinks)
+                if delete_ids:
+                    self.gql_client.bulk_delete(delete_ids)
+                    LOGGER.info(f'deleted {len(delete_ids)} urls')
+                    counter['deleted'] += len(delete_ids)
+                    if self.hash_store:
+                        self.hash_store.invalidate(delete_ids)
+            except Exception:
+                LOGGER.exception('failed to replace urls, merge them without deleting stale ones')
+                # parents required to exist can not be checked
+                urls = [url for item in replace_items if not item.get('require_parents') for url in item['urls']]
+                url_mutation_item = MutationItem(
+                    objects=urls, from_ids=[url.id for url in urls], to_ids=[url.to_id for url in urls])
+            mutation_items.append(url_mutation_item)
+
+        mutation_items, item2entries = self.skip_unchanged(
+            mutation_items, 'objects', self.build_graphql_entry, counter, 'skipped_merge')
+        persisted_items = self.execute(mutation_items, self.bulk_mutate)
+        counter['failed'] += len(mutation_items) - len(persisted_items)
+        failed_ids.update(self.get_failed_ids(mutation_items, persisted_items, get_item_objects))
+        for item in persisted_items:
+            counter['merged'] += len(get_item_objects(item))
+            counter['linked'] += len(get_item_links(item))
+        self.update_hash_store(persisted_items, item2entries)
+
+        if failed_ids:
+            index_items = self.drop_failed_texts(index_items, failed_ids, counter)
+        index_items, item2entries = self.skip_unchanged(
+            index_items, 'texts', self.build_elasticsearch_entry, counter, 'skipped_index')
+        persisted_items = self.execute(index_items, self.bulk_index)
+        if self.bulk_indexer:
+            counter.update(self.bulk_indexer.pop_stats())
+        counter['failed'] += len(index_items) - len(persisted_items)
+        failed_ids.update(self.get_failed_ids(index_items, persisted_items, lambda item: item['texts']))
+        for item in persisted_items:
+            counter['indexed'] += get_item_size(item)
+        self.update_hash_store(persisted_items, item2entries)
+
+        return +counter  # drop zero counts
+
+    def set_keyphrases(self, keyphrase_items, counter):
+        """
+        set keyphrases of the texts to the objects in place, from keyphrase_cache if available,
+        otherwise by extracting them in chunks. objects of a failed chunk are persisted without keyphrases
+        """
+
+        pending = []  # list of (object, text, num_keyphrases, cache key)
+        for item in keyphrase_items:
+            num_keyphrases = item['num_keyphrases']
+            for obj, text in zip(item['objects'], item['texts']):
+                key = self.keyphrase_cache.build_key(text, num_keyphrases) if self.keyphrase_cache else None
+                pending.append((obj, text, num_keyphrases, key))
+
+        if self.keyphrase_cache:
+            key2keyphrases = self.keyphrase_cache.get([key for _, _, _, key in pending])
+            for obj, _, _, key in pending:
+                if key in key2keyphrases:
+                    obj.keyphrases = key2keyphrases[key]
+                    counter['keyphrase_cache_hit'] += 1
+            pending = [entry for entry in pending if entry[3] not in key2keyphrases]
+
+        jobs = []  # chunks of pending entries sharing num_keyphrases
+        num2entries = defaultdict(list)
+        for entry in pending:
+            num2entries[entry[2]].append(entry)
+        for num_keyphrases, entries in num2entries.items():
+            for i in range(0, len(entries), self.keyphrase_chunk_size):
+                jobs.append(entries[i:i + self.keyphrase_chunk_size])
+        submit = self.get_keyphrase_executor().submit if self.keyphrase_workers > 0 else self.run_now
+        futures = [submit(extract_keyphrases, [entry[1] for entry in job], job[0][2]) for job in jobs]
+
+        key2keyphrases = dict()
+        for job, future in zip(jobs, futures):
+            try:
+                keyphrases_lst = future.result()
+            except Exception:
+                LOGGER.exception(f'failed to extract keyphrases for {len(job)} objects')
+                continue
+            for (obj, _, _, key), keyphrases in zip(job, keyphrases_lst):
+                obj.keyphrases = keyphrases
+                key2keyphrases[key] = keyphrases
+            counter['keyphrased'] += len(job)
+        if self.keyphrase_cache and key2keyphrases:
+            self.keyphrase_cache.update(key2keyphrases)
+
+    def get_keyphrase_executor(self):
+        if self.keyphrase_executor is None:
+            # spawn instead of fork since the crawler process runs the reactor and worker threads
+            self.keyphrase_executor = ProcessPoolExecutor(
+                max_workers=self.keyphrase_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.keyphrase_executor
+
+    @staticmethod
+    def run_now(func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def skip_unchanged(self, items, field, to_entry, counter, counter_key):
+        """
+        drop objects in items[field] whose content is the same as the last write
+
+        :return: list of items with the remaining objects only,
+                 and dict from id(item) to content hash entries of the remaining objects
+        """
+
+        if not self.hash_store:
+            return items, dict()
+
+        item_entries = [[to_entry(obj) for obj in item.get(field, [])] for item in items]
+        changed_keys = self.hash_store.find_changed([entry for entries in item_entries for entry in entries])
+        ret_items, item2entries = [], dict()
+        for item, entries in zip(items, item_entries):
+            if field in item:
+                pairs = [(obj, entry) for obj, entry in zip(item[field], entries) if entry[:2] in changed_keys]
+                counter[counter_key] += len(entries) - len(pairs)
+                item = item.copy()
+                item[field] = [obj for obj, _ in pairs]
+                item2entries[id(item)] = [entry for _, entry in pairs]
+            if get_item_size(item):
+                ret_items.append(item)
+        return ret_items, item2entries
+
+    def update_hash_store(self, items, item2entries):
+        if self.hash_store:
+            self.hash_store.update([entry for item in items for entry in item2entries.get(id(item), [])])
+
+    @staticmethod
+    def build_graphql_entry(obj):
+        return build_content_hash_entry(obj.id, 'graphql', GraphQLClient.build_merge_param(obj))
+
+    @staticmethod
+    def build_elasticsearch_entry(text):
+        return build_content_hash_entry(text.id, 'elasticsearch', to_schema(text).__dict__)
+
+    def execute(self, items, func):
+        """
+        apply func to items in one batch, and fall back to item by item on failure to isolate the broken one
+        :return: list of persisted items
+        """
+
+        if not items:
+            return []
+        try:
+            func(items)
+            return items
+        except Exception:
+            if len(items) == 1:
+                LOGGER.exception(f'failed to persist {items[0]}')
+                return []
+            LOGGER.warning(f'failed to persist {len(items)} items at once, retry one by one')
+            return [persisted for item in items for persisted in self.execute([item], func)]
+
+    @staticmethod
+    def get_failed_ids(items, persisted_items, get_objects):
+        persisted = {id(item) for item in persisted_items}
+        return {obj.id for item in items if id(item) not in persisted for obj in get_objects(item)}
+
+    @staticmethod
+    def drop_failed_texts(index_items, failed_ids, counter):
+        ret_items = []
+        for item in index_items:
+            texts = [text for text in item['texts'] if text.id not in failed_ids]
+            if len(texts) < len(item['texts']):
+                counter['failed'] += 1
+                if not texts:
+                    continue
+                item = item.copy()
+                item['texts'] = texts
+            ret_items.append(item)
+        return ret_items
+
+    def bulk_mutate(self, items):
+        op_builders = []
+        for item in items:
+            for obj in get_item_objects(item):
+                op_builders.append(partial(self.gql_client.build_merge_operation, obj=obj))
+        links = dict()  # use dict as ordered set to drop duplicated links across responses
+        for item in items:
+            for link in get_item_links(item):
+                links[link] = None
+        for from_id, to_id in links:
+            op_builders.append(partial(self.gql_client.build_link_operation, from_id=from_id, to_id=to_id))
+        self.gql_client.bulk_mutation(op_builders)
+
+    def bulk_index(self, items):
+        op_type2texts = defaultdict(list)
+        for item in items:
+            op_type2texts[item['op_type']] += [to_schema(text) for text in item['texts']]  # for SpeechTextRecord
+        for op_type, texts in op_type2texts.items():
+            if op_type == OpType.MERGE:  # bulk api does not support round-trip merge
+                for text in texts:
+                    self.es_client.index(text, op_type=op_type)
+            elif self.bulk_indexer:
+                self.bulk_indexer.index(texts, op_type=op_type)
+            else:
+                self.es_client.bulk_index(texts, op_type=op_type)
+
+    def diff_urls(self, replace_items):
+        """
+        compare Urls in replace_items with the ones stored in GraphQL
+
+        a stale Url is deleted only if no parent in the batch still has it, otherwise it is unlinked from the parent.
+        parents missing in GraphQL are skipped if the item requires them to exist
+
+        :return: ids of stale Urls to delete, list of (url id, parent id) to unlink,
+                 and MutationItem to merge and link only new Urls
+        """
+
+        parent_id2urls = self.fetch_urls({parent_id for item in replace_items for parent_id in item['parent_ids']})
+        item_parent_ids = []
+        for item in replace_items:
+            parent_ids = item['parent_ids']
+            if item.get('require_parents'):
+                parent_ids = [parent_id for parent_id in parent_ids if parent_id in parent_id2urls]
+                for parent_id in set(item['parent_ids']) - set(parent_ids):
+                    LOGGER.warning(f'skipped urls of {parent_id} since it does not exist')
+            item_parent_ids.append(parent_ids)
+
+        current_url_ids = set()  # Urls which some parent in the batch still has
+        for item, parent_ids in zip(replace_items, item_parent_ids):
+            for url in item['urls']:
+                if url.to_id in parent_ids:
+                    current_url_ids.add(url.id)
+                elif url.to_id not in item['parent_ids']:
+                    LOGGER.warning(f'ignored {url.id} since its parent {url.to_id} is not in {item["parent_ids"]}')
+
+        delete_ids, unlinks, new_urls, from_ids, to_ids = dict(), dict(), [], [], []
+        for item, parent_ids in zip(replace_items, item_parent_ids):
+            parent_id2new_urls = defaultdict(list)
+            for url in item['urls']:
+                parent_id2new_urls[url.to_id].append(url)
+            for parent_id in parent_ids:
+                old_url_ids = {url.id for url in parent_id2urls.get(parent_id, []) if url.title == item['url_title']}
+                new_url_ids = {url.id for url in parent_id2new_urls[parent_id]}
+                for url_id in old_url_ids - new_url_ids:
+                    if url_id in current_url_ids:
+                        unlinks[(url_id, parent_id)] = None
+                    else:
+                        delete_ids[url_id] = None
+                for url in parent_id2new_urls[parent_id]:
+                    if url.id not in old_url_ids:
+                        new_urls.append(url)
+                        from_ids.append(url.id)
+                        to_ids.append(parent_id)
+        return list(delete_ids), list(unlinks), MutationItem(objects=new_urls, from_ids=from_ids, to_ids=to_ids)
+
+    def fetch_urls(self, parent_ids):
+        """
+        fetch Urls linked to parent_ids with one query per id type
+        parents which do not exist yet (expected when they are merged in this batch) are omitted
+
+        :return: dict from parent id to list of Url
+        """
+
+        type2ids = defaultdict(list)
+        for parent_id in sorted(parent_ids):
+            type2ids[parent_id.split(':')[0]].append(parent_id)
+        parent_id2urls = dict()
+        for ids in type2ids.values():
+            for parent in self.gql_client.bulk_get(ids, fields=['id', 'urls']):
+                parent_id2urls[parent.id] = parent.urls
+        return parent_id2urls
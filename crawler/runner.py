@@ -0,0 +1,101 @@
+"""
+複数のSpiderを一つのCrawlerProcessで並行に実行する
+
+poetry run python -m crawler.runner --group bill_url
+poetry run python -m crawler.runner caa cao -a diet=204
+
+各Spiderは独自のダウンローダーを持つため、DOWNLOAD_DELAYなどの制限はサイトごとに適用される。
+GraphQLClientや法案インデックスはSharedResourceによりプロセス内で共有される。
+"""
+
+import argparse
+import sys
+from logging import getLogger
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from crawler.utils import peek_shared_resource
+
+LOGGER = getLogger(__name__)
+
+SPIDER_GROUPS = {
+    'bill_url': ['caa', 'cao', 'cas', 'maff', 'mlit', 'mof', 'mofa', 'npa', 'sanhou', 'shuhou', 'soumu'],
+}
+
+
+def resolve_spider_names(names, groups=None):
+    """
+    expand group names and remove duplicates while keeping the order
+    """
+
+    spider_names = []
+    for group in groups or []:
+        if group not in SPIDER_GROUPS:
+            raise ValueError(f'unknown spider group: {group}')
+        spider_names += SPIDER_GROUPS[group]
+    spider_names += names
+    return list(dict.fromkeys(spider_names))
+
+
+def parse_key_values(pairs):
+    """
+    ex. ['diet=204', 'LOG_LEVEL=INFO'] -> {'diet': '204', 'LOG_LEVEL': 'INFO'}
+    """
+
+    key2value = dict()
+    for pair in pairs or []:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f'expected key=value: {pair}')
+        key2value[key] = value
+    return key2value
+
+
+def run_spiders(spider_names, settings=None, spider_kwargs=None):
+    """
+    run spiders concurrently in one CrawlerProcess and block until all of them finish
+    :return: dict of spider name -> finish reason
+    """
+
+    process = CrawlerProcess(settings or get_project_settings())
+    crawlers = dict()
+    for spider_name in spider_names:
+        crawler = process.create_crawler(spider_name)
+        crawlers[spider_name] = crawler
+        process.crawl(crawler, **(spider_kwargs or dict()))
+    process.start()
+
+    spider2reason = {name: crawler.stats.get_value('finish_reason') for name, crawler in crawlers.items()}
+    for name, reason in spider2reason.items():
+        LOGGER.info(f'{name}: {reason}')
+    # shared by the spiders, so reported once for the process
+    for key, value in getattr(peek_shared_resource('bill_finder'), 'stats', dict()).items():
+        LOGGER.info(f'bill index {key}: {value}')
+    return spider2reason
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run spiders concurrently in one process')
+    parser.add_argument('spiders', nargs='*', help='spider names')
+    parser.add_argument('-g', '--group', action='append', choices=SPIDER_GROUPS.keys(), help='spider group names')
+    parser.add_argument('-a', dest='spider_args', action='append', metavar='NAME=VALUE',
+                        help='spider argument passed to all spiders')
+    parser.add_argument('-s', dest='settings', action='append', metavar='NAME=VALUE', help='setting override')
+    args = parser.parse_args()
+
+    spider_names = resolve_spider_names(args.spiders, args.group)
+    if not spider_names:
+        parser.error('no spider is given')
+    settings = get_project_settings()
+    settings.setdict(parse_key_values(args.settings), priority='cmdline')
+
+    spider2reason = run_spiders(spider_names, settings, parse_key_values(args.spider_args))
+    failed_names = [name for name, reason in spider2reason.items() if reason != 'finished']
+    if failed_names:
+        LOGGER.error(f'{len(failed_names)} spiders did not finish: {failed_names}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -20,16 +20,34 @@ NEWSPIDER_MODULE = 'crawler.spiders'
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-CONCURRENT_REQUESTS = 1
+# actual concurrency is bounded per domain by DOMAIN_POLICIES
+CONCURRENT_REQUESTS = 16
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
 DOWNLOAD_DELAY = 1
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 1
 #CONCURRENT_REQUESTS_PER_IP = 16
 
+# Politeness per domain enforced by DomainPolicyMiddleware, which applies to subdomains as well
+# concurrency: max concurrent requests, delay: min seconds between requests,
+# autothrottle_target: adjust the delay by latency to keep this many requests in flight on average (fixed if absent),
+# retry_times: max retries of a failed request
+DOMAIN_POLICY_DEFAULT = {'concurrency': 1, 'delay': 1, 'retry_times': 2}
+DOMAIN_POLICIES = {
+    'ndl.go.jp': {'concurrency': 4, 'delay': 0.25, 'autothrottle_target': 2.0, 'retry_times': 5},
+    'shugiintv.go.jp': {'concurrency': 2, 'delay': 0.5, 'autothrottle_target': 1.0, 'retry_times': 3},
+    'webtv.sangiin.go.jp': {'concurrency': 2, 'delay': 0.5, 'autothrottle_target': 1.0, 'retry_times': 3},
+    'grips.ac.jp': {'concurrency': 2, 'delay': 0.5, 'retry_times': 3},
+    'shugiin.go.jp': {'concurrency': 1, 'delay': 1},
+    'sangiin.go.jp': {'concurrency': 1, 'delay': 1},
+    'mainichi.jp': {'concurrency': 1, 'delay': 2},
+    'nikkei.com': {'concurrency': 1, 'delay': 2},
+    'reuters.com': {'concurrency': 1, 'delay': 2},
+}
+
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
 
@@ -50,9 +68,9 @@ DOWNLOAD_DELAY = 1
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    'crawler.middlewares.CrawlerDownloaderMiddleware': 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    'crawler.middlewares.DomainPolicyMiddleware': 543,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,9 +80,32 @@ DOWNLOAD_DELAY = 1
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    'crawler.pipelines.CrawlerPipeline': 300,
-#}
+ITEM_PIPELINES = {
+    'crawler.pipelines.PersistencePipeline': 300,
+}
+
+# Persist items in batches of PERSISTENCE_BATCH_SIZE operations, or every PERSISTENCE_FLUSH_INTERVAL seconds
+PERSISTENCE_BATCH_SIZE = 500
+PERSISTENCE_FLUSH_INTERVAL = 10
+# Pause the scraper when more batches than this are waiting for the backends
+PERSISTENCE_MAX_PENDING_BATCHES = 2
+# Skip writing objects whose content is the same as the last write (stored under .scrapy)
+CONTENT_HASH_STORE_ENABLED = True
+CONTENT_HASH_STORE_PATH = 'content_hash.sqlite'
+# Number of processes to extract keyphrases of Activity (0 to extract in the persistence thread)
+KEYPHRASE_WORKERS = 4
+# Reuse keyphrases extracted from the same text in previous runs (stored under .scrapy)
+KEYPHRASE_CACHE_ENABLED = True
+KEYPHRASE_CACHE_PATH = 'keyphrase_cache.sqlite'
+KEYPHRASE_CACHE_MAX_ENTRIES = 1000000
+# Index texts in chunks of at most ELASTICSEARCH_BULK_MAX_DOCS documents and ELASTICSEARCH_BULK_MAX_BYTES bytes,
+# sent in parallel by ELASTICSEARCH_BULK_WORKERS threads. Documents rejected by a busy cluster are retried
+ELASTICSEARCH_BULK_MAX_DOCS = 500
+ELASTICSEARCH_BULK_MAX_BYTES = 5 * 1024 * 1024
+ELASTICSEARCH_BULK_WORKERS = 2
+ELASTICSEARCH_BULK_MAX_RETRIES = 3
+# Set False to disable refresh of the indices while crawling and refresh them once on close
+ELASTICSEARCH_REFRESH = True
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -1,36 +1,111 @@
 import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
 from urllib.parse import urljoin
 
 import scrapy
+from scrapy.utils.project import data_path
 
+from crawler.items import MergeItem, LinkItem, MutationItem, KeyphraseItem, LinkAccumulator, CheckpointItem, \
+    build_merge_item, build_link_item, build_index_item, build_replace_urls_item
 from crawler.utils import extract_text, build_url, UrlTitle, validate_news_or_raise, validate_news_text_or_raise, \
-    build_minutes_activity
+    build_minutes_activity, MemberIndex, BillIndex, SharedResource, get_shared_resource, IdWindow, FrontierSearch, \
+    SeenIdStore, canonicalize_news_url, parse_shard, in_shard
 from politylink.elasticsearch.client import ElasticsearchClient
 from politylink.elasticsearch.schema import NewsText
 from politylink.graphql.client import GraphQLClient
 from politylink.graphql.schema import News
-from politylink.helpers import BillFinder, MinutesFinder, CommitteeFinder, MemberFinder
+from politylink.helpers import MinutesFinder, CommitteeFinder
 
 LOGGER = logging.getLogger(__name__)
 
 
+def coalesce_links(callback):
+    """
+    decorator for spider callbacks to persist GraphQL objects and links produced from a response in one mutation
+    """
+
+    @wraps(callback)
+    def wrapper(self, response, *args, **kwargs):
+        return self.coalesce(callback(self, response, *args, **kwargs))
+
+    return wrapper
+
+
 class SpiderTemplate(scrapy.Spider):
     domain = NotImplemented
 
+    # created on the first access and shared by all the spiders in the process
+    gql_client = SharedResource(GraphQLClient)
+    es_client = SharedResource(ElasticsearchClient)
+    bill_finder = SharedResource(BillIndex)
+    minutes_finder = SharedResource(MinutesFinder)
+    committee_finder = SharedResource(CommitteeFinder)
+    member_finder = SharedResource(MemberIndex)
+
     def __init__(self, *args, **kwargs):
         super(SpiderTemplate, self).__init__(*args, **kwargs)
         logging.getLogger('elasticsearch').setLevel(logging.WARNING)
         logging.getLogger('sgqlc').setLevel(logging.WARNING)
-        self.gql_client = GraphQLClient()
-        self.es_client = ElasticsearchClient()
-        self.bill_finder = BillFinder()
-        self.minutes_finder = MinutesFinder()
-        self.committee_finder = CommitteeFinder()
-        self.member_finder = MemberFinder()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        start = time.perf_counter()
+        spider = super(SpiderTemplate, cls).from_crawler(crawler, *args, **kwargs)
+        LOGGER.info(f'initialized {spider.name} spider in {time.perf_counter() - start:.2f}s')
+        return spider
 
     def parse(self, response):
         NotImplemented
 
+    def closed(self, reason):
+        """
+        called when the spider is closed, subclasses releasing resources should call super
+        """
+
+        pass
+
+    def find_bill(self, *args, **kwargs):
+        """
+        same as bill_finder.find_one, and count hit and miss of this spider in bill_index stats
+        since the stats of bill_finder are shared by all the spiders in the process
+        """
+
+        bills = self.bill_finder.find(*args, **kwargs)
+        if hasattr(self, 'crawler'):
+            self.crawler.stats.inc_value('bill_index/hit' if bills else 'bill_index/miss')
+        if len(bills) != 1:
+            raise ValueError(f'found {len(bills)} bills: args={args}, kwargs={kwargs}, results={bills}')
+        return bills[0]
+
+    def coalesce(self, results):
+        """
+        accumulate MergeItems and LinkItems in callback results into one MutationItem per response
+        KeyphraseItems pass through at once since they must precede the merge of their objects,
+        and the other results (texts, checkpoints, requests) follow the MutationItem in the original order
+        """
+
+        accumulator = LinkAccumulator()
+        deferred = []
+        for result in results or []:
+            if isinstance(result, (MergeItem, LinkItem, MutationItem)):
+                accumulator.add(result)
+            elif isinstance(result, KeyphraseItem):
+                yield result
+            else:
+                deferred.append(result)
+        yield from accumulator.flush()
+        yield from deferred
+
+    def on_checkpoint(self, state):
+        """
+        called by PersistencePipeline when all the items yielded before CheckpointItem(state) are persisted
+        """
+
+        pass
+
     def link_urls(self, urls):
         """
         link Url to parent resource
@@ -42,7 +117,7 @@ class SpiderTemplate(scrapy.Spider):
                 from_ids.append(url.id)
                 to_ids.append(url.to_id)
         if from_ids:
-            self.gql_client.bulk_link(from_ids, to_ids)
+            yield build_link_item(from_ids, to_ids)
 
     def link_activities(self, activities):
         """
@@ -56,7 +131,7 @@ class SpiderTemplate(scrapy.Spider):
                     from_ids.append(activity.id)
                     to_ids.append(getattr(activity, id_field))
         if from_ids:
-            self.gql_client.bulk_link(from_ids, to_ids)
+            yield build_link_item(from_ids, to_ids)
 
     def link_bill_action(self, bill_action_lst):
         """
@@ -70,7 +145,7 @@ class SpiderTemplate(scrapy.Spider):
                     from_ids.append(bill_action.id)
                     to_ids.append(getattr(bill_action, id_field))
         if from_ids:
-            self.gql_client.bulk_link(from_ids, to_ids)
+            yield build_link_item(from_ids, to_ids)
 
     def link_minutes(self, minutes):
         """
@@ -80,21 +155,21 @@ class SpiderTemplate(scrapy.Spider):
         if hasattr(minutes, 'topic_ids'):
             bill_ids = list(filter(lambda x: x, minutes.topic_ids))
             if bill_ids:
-                self.gql_client.bulk_link([minutes.id] * len(bill_ids), bill_ids)
-                LOGGER.info(f'linked {len(bill_ids)} bills to {minutes.id}')
+                yield build_link_item([minutes.id] * len(bill_ids), bill_ids)
+                LOGGER.info(f'queued links of {len(bill_ids)} bills to {minutes.id}')
 
         if hasattr(minutes, 'speaker_ids'):
             member_ids = list(filter(lambda x: x, minutes.speaker_ids))
             if member_ids:
-                self.gql_client.bulk_link(member_ids, [minutes.id] * len(member_ids))
-                LOGGER.info(f'linked {len(member_ids)} members to {minutes.id}')
+                yield build_link_item(member_ids, [minutes.id] * len(member_ids))
+                LOGGER.info(f'queued links of {len(member_ids)} members to {minutes.id}')
 
         try:
             committee = self.committee_finder.find_one(minutes.name)
         except ValueError as e:
             LOGGER.warning(e)
         else:
-            self.gql_client.link(minutes.id, committee.id)
+            yield build_link_item([minutes.id], [committee.id])
 
     def link_speeches(self, speeches):
         from_ids, to_ids = [], []
@@ -105,14 +180,27 @@ class SpiderTemplate(scrapy.Spider):
                 from_ids.append(speech.member_id)
                 to_ids.append(speech.id)
         if from_ids:
-            self.gql_client.bulk_link(from_ids, to_ids)
+            yield build_link_item(from_ids, to_ids)
 
-    def delete_old_urls(self, src_id, url_title):
-        obj = self.gql_client.get(src_id, fields=['urls'])
-        for url in obj.urls:
-            if url.title == url_title:
-                self.gql_client.delete(url.id)
-                LOGGER.info(f'deleted {url.id}')
+    def replace_urls(self, parent_ids, url_title, urls, require_parents=False):
+        """
+        replace Urls of url_title linked to parent resources with urls
+        each Url should have to_id to one of parent_ids
+        :param require_parents: skip Urls of parents which do not exist in GraphQL, checked in bulk by the pipeline
+        """
+
+        yield build_replace_urls_item(parent_ids, url_title, urls, require_parents)
+
+    def replace_urls_by_title(self, urls):
+        """
+        replace Urls linked to parent resources for each title in urls
+        """
+
+        title2urls = defaultdict(list)
+        for url in urls:
+            title2urls[url.title].append(url)
+        for url_title, title_urls in title2urls.items():
+            yield from self.replace_urls(map(lambda x: x.to_id, title_urls), url_title, title_urls)
 
     def get_diet(self, diet_number=None):
         if diet_number:
@@ -121,13 +209,16 @@ class SpiderTemplate(scrapy.Spider):
             return self.get_latest_diet()
 
     def get_latest_diet(self):
-        diets = sorted(self.gql_client.get_all_diets(['id', 'number', 'start_date']), key=lambda x: x.number)
-        return diets[-1]
+        def fetch_latest_diet():
+            diets = sorted(self.gql_client.get_all_diets(['id', 'number', 'start_date']), key=lambda x: x.number)
+            return diets[-1]
+
+        return get_shared_resource('latest_diet', fetch_latest_diet)
 
     def get_topic_ids(self, topics, date):
         def get_topic_id(topic):
             try:
-                bill = self.bill_finder.find_one(text=topic, date=date)
+                bill = self.find_bill(text=topic, date=date)
                 return bill.id
             except ValueError as e:
                 LOGGER.debug(e)  # this is expected when topic does not include bill
@@ -154,9 +245,10 @@ class TableSpiderTemplate(SpiderTemplate):
     bill_category = None
     diet_number = None
 
+    @coalesce_links
     def parse(self, response):
         table = response.xpath('//table')[self.table_idx]
-        self.parse_table(table, self.bill_category, self.diet_number)
+        yield from self.parse_table(table, self.bill_category, self.diet_number)
 
     def parse_table(self, table, bill_category=None, diet_number=None):
         for row in table.xpath('.//tr'):
@@ -166,7 +258,7 @@ class TableSpiderTemplate(SpiderTemplate):
                     bill_query = extract_text(cells[self.bill_col]).strip()
                     urls = self.extract_urls(cells[self.url_col])
                     LOGGER.info(f'scraped {len(urls)} urls for {bill_query}')
-                    self.store_urls_for_bill(urls, bill_query, bill_category, diet_number)
+                    yield from self.store_urls_for_bill(urls, bill_query, bill_category, diet_number)
                 except Exception as e:
                     LOGGER.warning(f'failed to parse {row}: {e}')
                     continue
@@ -191,13 +283,13 @@ class TableSpiderTemplate(SpiderTemplate):
         if diet_number:
             kwargs['diet_number'] = diet_number
         try:
-            bill = self.bill_finder.find_one(bill_query, **kwargs)
+            bill = self.find_bill(bill_query, **kwargs)
         except ValueError as e:
             LOGGER.warning(e)
         else:
-            self.gql_client.bulk_merge(urls)
-            self.gql_client.bulk_link(map(lambda x: x.id, urls), [bill.id] * len(urls))
-            LOGGER.info(f'linked {len(urls)} urls to {bill.bill_number}')
+            yield build_merge_item(urls)
+            yield build_link_item(map(lambda x: x.id, urls), [bill.id] * len(urls))
+            LOGGER.info(f'queued links of {len(urls)} urls to {bill.bill_number}')
 
 
 class DietTableSpiderTemplate(TableSpiderTemplate):
@@ -206,15 +298,131 @@ class DietTableSpiderTemplate(TableSpiderTemplate):
         self.diet = self.get_diet(diet)
         self.start_urls = [self.build_start_url(self.diet.number)]
 
+    @coalesce_links
     def parse(self, response):
         table = response.xpath('//table')[self.table_idx]
-        self.parse_table(table, self.bill_category, self.diet.number)
+        yield from self.parse_table(table, self.bill_category, self.diet.number)
 
     @staticmethod
     def build_start_url(diet_number):
         NotImplemented
 
 
+class IdRangeSpiderTemplate(SpiderTemplate):
+    """
+    Template of spiders to probe pages of sequential ids in (next_id, last_id]
+
+    Up to window_size ids are requested concurrently and the window slides as ids are resolved.
+    Subclasses implement build_id_url and scrape_id, which returns items of the page or None if the id is missing.
+    Pages failed to fetch or scrape are also counted as missing.
+
+    If frontier_search is true, the latest existing id is searched by FrontierSearch from next_id beforehand
+    and only the ids up to it are probed without failure_in_row_limit.
+    """
+
+    def __init__(self, next_id, last_id, failure_in_row_limit=None, window_size=4, frontier_search='false',
+                 frontier_tolerance=3, *args, **kwargs):
+        super(IdRangeSpiderTemplate, self).__init__(*args, **kwargs)
+        if failure_in_row_limit is not None:
+            failure_in_row_limit = int(failure_in_row_limit)
+        self.id_window = IdWindow(int(next_id), int(last_id), int(window_size), failure_in_row_limit)
+        self.frontier_search = None
+        if frontier_search == 'true':
+            self.frontier_search = FrontierSearch(int(next_id), int(frontier_tolerance), max_id=int(last_id))
+        self.frontier_id2found = dict()
+
+    def build_id_url(self, id_):
+        NotImplemented
+
+    def scrape_id(self, response):
+        NotImplemented
+
+    def is_id_found(self, response):
+        """
+        used by frontier search, subclasses may override this to check the page more cheaply than scrape_id
+        """
+
+        items = self.scrape_id(response)
+        if items is None:
+            return False
+        list(items)  # raise if the page can not be scraped
+        return True
+
+    def start_requests(self):
+        if self.frontier_search:
+            yield from self.build_frontier_requests()
+        else:
+            yield from self.build_id_requests()
+
+    def build_frontier_requests(self):
+        self.frontier_id2found = dict()
+        for id_ in self.frontier_search.next_ids():
+            # dont_filter to fetch the same page again in probing
+            yield scrapy.Request(self.build_id_url(id_), self.parse_frontier, errback=self.parse_frontier_error,
+                                 dont_filter=True, meta={'probe_id': id_})
+
+    def parse_frontier(self, response):
+        try:
+            found = self.is_id_found(response)
+        except Exception:
+            LOGGER.debug(f'failed to scrape {response.url}', exc_info=True)
+            found = False
+        yield from self.commit_frontier(response.meta['probe_id'], found)
+
+    def parse_frontier_error(self, failure):
+        LOGGER.debug(f'failed to fetch {failure.request.url}: {failure.value}')
+        yield from self.commit_frontier(failure.request.meta['probe_id'], False)
+
+    def commit_frontier(self, id_, found):
+        search = self.frontier_search
+        self.frontier_id2found[id_] = found
+        if len(self.frontier_id2found) < len(search.next_ids()):
+            return
+        search.commit([id_ for id_, found in self.frontier_id2found.items() if found])
+        if not search.is_done():
+            yield from self.build_frontier_requests()
+            return
+
+        LOGGER.info(f'found the latest id={search.lo} in {search.num_requests} requests ({search.num_clusters} clusters)')
+        self.id_window.last_id = min(self.id_window.last_id, search.lo)
+        self.id_window.failure_in_row_limit = None  # the ids are known to end at the latest id
+        yield from self.build_id_requests()
+
+    def build_id_requests(self):
+        for id_ in self.id_window.issue():
+            # give higher priority to smaller ids to advance the frontier
+            yield scrapy.Request(self.build_id_url(id_), self.parse, errback=self.parse_error, priority=-id_,
+                                 meta={'probe_id': id_})
+
+    def parse(self, response):
+        id_ = response.meta['probe_id']
+        try:
+            items = self.scrape_id(response)
+            items = None if items is None else list(items)
+        except Exception as e:
+            LOGGER.warning(f'failed to scrape {response.url}: {e}')
+            LOGGER.debug(f'failed to scrape {response.url}', exc_info=True)
+            items = None
+        if items is not None:
+            yield from self.coalesce(items)
+        yield from self.commit_id(id_, items is not None)
+
+    def parse_error(self, failure):
+        LOGGER.warning(f'failed to fetch {failure.request.url}: {failure.value}')
+        yield from self.commit_id(failure.request.meta['probe_id'], False)
+
+    def commit_id(self, id_, hit):
+        window = self.id_window
+        if window.commit(id_, hit):
+            LOGGER.info(f'stopped at id={window.frontier} after {window.failure_in_row} misses in a row')
+        LOGGER.debug(f'[{id_}/{window.last_id}] hit={hit}, frontier={window.frontier}')
+        yield from self.build_id_requests()
+
+    def closed(self, reason):
+        super(IdRangeSpiderTemplate, self).closed(reason)
+        LOGGER.info(f'found {self.id_window.num_hits} pages up to id={self.id_window.frontier}')
+
+
 class TvSpiderTemplate(SpiderTemplate):
 
     def build_activities_and_urls(self, atags, minutes, response_url):
@@ -240,12 +448,87 @@ class TvSpiderTemplate(SpiderTemplate):
 
 
 class NewsSpiderTemplate(SpiderTemplate):
-    def __init__(self, file=None, *args, **kwargs):
+    """
+    Template of news spiders
+
+    Canonical urls of saved news are recorded in SeenIdStore under the news namespace shared by all publishers.
+    If incremental is true, filter_news_urls drops the recorded ones before requesting them,
+    and list pages made up entirely of recorded news tell the spider to stop paginating.
+
+    If file is given, news urls are read from the file lazily instead of list pages, so that scrapy pulls
+    the requests only as fast as it can download them. shard="i/n" keeps the urls in the i-th of n shards
+    to split one file across processes.
+    """
+
+    file_chunk_size = 100
+
+    def __init__(self, file=None, shard=None, incremental='true', seen_store=None, *args, **kwargs):
         super(NewsSpiderTemplate, self).__init__(*args, **kwargs)
-        self.news_url_list = list()
-        if file:
-            self.news_url_list += [line.strip() for line in open(file, 'r')]
-            LOGGER.info(f'loaded {len(self.news_url_list)} news from {file}')
+        self.file = file
+        self.shard = parse_shard(shard) if shard else None
+        self.incremental = incremental == 'true'
+        self.seen_store = SeenIdStore(seen_store or data_path('seen_ids.sqlite', createdir=True), 'news')
+        self.scheduled_news_urls = set()
+
+    def start_requests(self):
+        if self.file:
+            yield from self.build_file_requests()
+        else:
+            yield from self.build_list_requests()
+
+    def build_list_requests(self):
+        for url in self.start_urls:
+            yield scrapy.Request(url, self.parse)
+
+    def build_file_requests(self):
+        num_lines, num_requests = 0, 0
+        for chunk in self.iter_file_chunks():
+            num_lines += len(chunk)
+            if self.shard:
+                chunk = [url for url in chunk if in_shard(canonicalize_news_url(url), *self.shard)]
+            for news_url in self.filter_news_urls(chunk):
+                num_requests += 1
+                yield scrapy.Request(news_url, self.parse_news)
+        LOGGER.info(f'requested {num_requests} news out of {num_lines} lines in {self.file}')
+
+    def iter_file_chunks(self):
+        with open(self.file, 'r') as f:
+            chunk = []
+            for line in f:
+                if line.strip():
+                    chunk.append(line.strip())
+                if len(chunk) >= self.file_chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    def filter_news_urls(self, news_urls):
+        """
+        :return: urls of news neither saved before nor scheduled in this run
+        """
+
+        canonical_urls = [canonicalize_news_url(url) for url in news_urls]
+        seen_urls = self.seen_store.find_seen(canonical_urls) if self.incremental else set()
+        new_urls = []
+        for news_url, canonical_url in zip(news_urls, canonical_urls):
+            if canonical_url not in seen_urls and canonical_url not in self.scheduled_news_urls:
+                self.scheduled_news_urls.add(canonical_url)
+                new_urls.append(news_url)
+        if len(new_urls) < len(news_urls):
+            LOGGER.info(f'skipped {len(news_urls) - len(new_urls)} saved or scheduled news')
+        return new_urls
+
+    def is_all_saved(self, news_urls):
+        """
+        :return: True if all the news on a list page are saved before, to stop pagination in incremental mode.
+                 news only scheduled in this run do not count since list pages overlap as new articles shift them
+        """
+
+        if not (self.incremental and news_urls):
+            return False
+        canonical_urls = {canonicalize_news_url(url) for url in news_urls}
+        return len(self.seen_store.find_seen(canonical_urls)) == len(canonical_urls)
 
     def parse_news(self, response):
         """
@@ -256,11 +539,23 @@ class NewsSpiderTemplate(SpiderTemplate):
             news, news_text = self.scrape_news_and_text(response)
             validate_news_or_raise(news)
             validate_news_text_or_raise(news_text)
-            self.gql_client.merge(news)
-            self.es_client.index(news_text)
-            LOGGER.info(f'saved {news.id}')
         except Exception:
             LOGGER.exception(f'failed to save News from {response.url}')
+            return
+        yield build_merge_item([news])
+        yield build_index_item([news_text])
+        LOGGER.info(f'scraped {news.id}')
+        # record the listed url as well as the redirected one
+        day = datetime.now().strftime('%Y-%m-%d')
+        urls = response.meta.get('redirect_urls', []) + [response.url]
+        yield CheckpointItem(state={canonicalize_news_url(url): day for url in urls}, ids=[news.id])
+
+    def on_checkpoint(self, state):
+        self.seen_store.add(state)  # news is seen only after it is persisted
+
+    def closed(self, reason):
+        super(NewsSpiderTemplate, self).closed(reason)
+        self.seen_store.close()
 
     def scrape_news_and_text(self, response) -> (News, NewsText):
         NotImplemented
@@ -19,14 +19,14 @@ class MainichiSpider(NewsSpiderTemplate):
         super(MainichiSpider, self).__init__(*args, **kwargs)
 
     def parse(self, response):
-        if self.news_url_list:
-            news_url_list = self.news_url_list
-        else:
-            news_url_list = extract_full_href_list(response.xpath('//section[@id="article-list"]//li'), response.url)
-            LOGGER.info(f'scraped {len(news_url_list)} news urls from {response.url}')
-        for news_url in news_url_list:
-            if 'premier' not in news_url:  # ToDo: process premier article
-                yield response.follow(news_url, callback=self.parse_news)
+        news_url_list = extract_full_href_list(response.xpath('//section[@id="article-list"]//li'), response.url)
+        LOGGER.info(f'scraped {len(news_url_list)} news urls from {response.url}')
+        for news_url in self.filter_news_urls(news_url_list):
+            yield response.follow(news_url, callback=self.parse_news)
+
+    def filter_news_urls(self, news_urls):
+        news_urls = [url for url in news_urls if 'premier' not in url]  # ToDo: process premier article
+        return super(MainichiSpider, self).filter_news_urls(news_urls)
 
     def scrape_news_and_text(self, response):
         maybe_json_ld = extract_json_ld_or_none(response)
@@ -1,5 +1,6 @@
 from logging import getLogger
 
+from crawler.items import build_merge_item
 from crawler.spiders import SpiderTemplate
 from crawler.utils import build_committee
 
@@ -45,5 +46,5 @@ class ManualCommitteeSpider(SpiderTemplate):
             build_committee_with_meta('衆議院情報監視審査会', 'REPRESENTATIVES', None, description=jouhou_desc),
             build_committee_with_meta('衆議院政治倫理審査会', 'REPRESENTATIVES', None, description=seiji_desc),
         ]
-        self.gql_client.bulk_merge(committees)
-        LOGGER.info(f'merged {len(committees)} committees')
+        yield build_merge_item(committees)
+        LOGGER.info(f'scraped {len(committees)} committees')
@@ -1,15 +1,19 @@
 import json
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import cached_property
 from logging import getLogger
 
 import scrapy
-
-from crawler.spiders import SpiderTemplate
-from crawler.utils import build_minutes, build_speech, extract_topics, build_url, UrlTitle, build_minutes_activity, \
-    clean_speech, extract_topic_ids, build_bill_action, is_moderator
-from politylink.elasticsearch.schema import MinutesText, SpeechText
-from politylink.nlp.keyphrase import KeyPhraseExtractor
+from scrapy.utils.project import data_path
+
+from crawler.items import build_merge_item, build_index_item, build_keyphrase_item, CheckpointItem, get_item_ids
+from crawler.spiders import SpiderTemplate, coalesce_links
+from crawler.utils import build_minutes, build_speech, extract_topics, UrlTitle, clean_speech, extract_topic_ids, \
+    build_bill_action, is_moderator, Checkpoint, PageFrontier, split_date_range, to_neo4j_datetime, BillNameMatcher, \
+    KeywordMatcher, SpeechRecord, ActivityRecord, UrlRecord, SpeechTextRecord
+from politylink.elasticsearch.schema import MinutesText
+from politylink.graphql.schema import _MinutesFilter
 from politylink.utils.bill import extract_bill_action_types
 
 LOGGER = getLogger(__name__)
@@ -18,9 +22,13 @@ LOGGER = getLogger(__name__)
 class MinutesSpider(SpiderTemplate):
     name = 'minutes'
     domain = 'ndl.go.jp'
+    max_page_size = 10  # limit of meeting API
+    list_page_size = 100  # limit of meeting_list API
+    speech_chunk_size = 100
 
     def __init__(self, start_date, end_date, pos=1, text='true', speech='false', keyphrase='false', overwrite='false',
-                 *args, **kwargs):
+                 page_size=5, fanout='false', concurrency=4, window_days=0, resume='false', checkpoint=None,
+                 incremental='false', *args, **kwargs):
         super(MinutesSpider, self).__init__(*args, **kwargs)
         self.start_date = start_date
         self.end_date = end_date
@@ -28,171 +36,374 @@ class MinutesSpider(SpiderTemplate):
         self.collect_speech_text = speech == 'true'
         self.collect_keyphrase = keyphrase == 'true'
         self.overwrite_url = overwrite == 'true'
-        self.next_pos = int(pos)
+        self.page_size = int(page_size)
+        if not 0 < self.page_size <= self.max_page_size:
+            raise ValueError(f'page_size should be between 1 and {self.max_page_size}: page_size={page_size}')
+        self.fanout = fanout == 'true'
+        # the downloader no longer reads max_concurrent_requests of spiders,
+        # so DomainPolicyMiddleware applies it to the download slot of ndl.go.jp through per_slot_settings
+        self.max_concurrent_requests = int(concurrency) if self.fanout else 1
+        self.window_days = int(window_days)
+        self.windows = split_date_range(start_date, end_date, self.window_days)
+        self.checkpoint = Checkpoint(
+            checkpoint or data_path(f'minutes_{start_date}_{end_date}.checkpoint.json', createdir=True))
+        next_pos = int(pos)
+        if resume == 'true':
+            next_pos = self.resume_from_checkpoint(next_pos)
+        self.frontier = PageFrontier(len(self.windows), next_pos=next_pos)
+        self.incremental = incremental == 'true'
+        if self.incremental and resume == 'true':
+            raise ValueError('checkpoint is not supported in incremental mode')
         self.num_key_phrases = 3
-        self.key_phrase_extractor = KeyPhraseExtractor()
-        self.bill_id2names = {bill['id']: bill['name'] for bill in
-                              self.gql_client.get_all_bills(fields=['id', 'name'])}
 
-    def build_next_url(self):
-        return 'https://kokkai.ndl.go.jp/api/meeting?from={0}&until={1}&startRecord={2}&maximumRecords=5&recordPacking=JSON'.format(
-            self.start_date, self.end_date, self.next_pos)
+    @cached_property
+    def bill_matcher(self):
+        return BillNameMatcher({bill.id: bill.name for bill in self.bill_finder.bills if hasattr(bill, 'name')})
+
+    @cached_property
+    def ingested_issue_ids(self):
+        return self.fetch_ingested_issue_ids()
+
+    def resume_from_checkpoint(self, default_pos):
+        """
+        restrict self.windows to the remaining ones in the saved checkpoint
+        :return: position to start the first window from
+        """
+
+        state = self.checkpoint.load()
+        if state is None:
+            LOGGER.info(f'no checkpoint found in {self.checkpoint.path}, start from the beginning')
+            return default_pos
+        if state['done']:
+            LOGGER.info(f'checkpoint in {self.checkpoint.path} is already done')
+            self.windows = []
+            return default_pos
+
+        window_from, window_until = state['window']
+        next_from = (datetime.strptime(window_until, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.windows = [(window_from, window_until)]
+        if next_from <= self.end_date:
+            self.windows += split_date_range(next_from, self.end_date, self.window_days)
+        LOGGER.info(f'resume from {window_from}~{window_until} pos={state["next_pos"]} '
+                    f'(last issueID={state["last_issue_id"]})')
+        return state['next_pos']
+
+    def build_checkpoint_state(self):
+        done = self.frontier.is_done()
+        return {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'window': None if done else list(self.windows[self.frontier.window_index]),
+            'next_pos': None if done else self.frontier.next_pos,
+            'last_issue_id': self.frontier.last_issue_id,
+            'done': done,
+            'updated_at': datetime.now().isoformat()
+        }
+
+    def on_checkpoint(self, state):
+        if self.frontier.commit(**state):
+            self.checkpoint.save(self.build_checkpoint_state())
+
+    def build_url(self, window_index, pos):
+        window_from, window_until = self.windows[window_index]
+        return 'https://kokkai.ndl.go.jp/api/meeting?from={0}&until={1}&startRecord={2}&maximumRecords={3}&recordPacking=JSON'.format(
+            window_from, window_until, pos, self.page_size)
+
+    def build_request(self, window_index, pos, is_first_page=False):
+        # give higher priority to earlier windows and pages so that they are committed roughly in order
+        return scrapy.Request(self.build_url(window_index, pos), self.parse, priority=-(window_index * 10 ** 6 + pos),
+                              meta={'window_index': window_index, 'pos': pos, 'is_first_page': is_first_page})
+
+    def build_list_request(self, window_index, pos):
+        window_from, window_until = self.windows[window_index]
+        url = 'https://kokkai.ndl.go.jp/api/meeting_list?from={0}&until={1}&startRecord={2}&maximumRecords={3}&recordPacking=JSON'.format(
+            window_from, window_until, pos, self.list_page_size)
+        return scrapy.Request(url, self.parse_list, meta={'window_index': window_index})
+
+    def build_meeting_request(self, issue_id):
+        url = 'https://kokkai.ndl.go.jp/api/meeting?issueID={0}&recordPacking=JSON'.format(issue_id)
+        return scrapy.Request(url, self.parse_meeting)
 
     def start_requests(self):
-        yield scrapy.Request(self.build_next_url(), self.parse)
+        if not self.windows:
+            return
+        if self.incremental:
+            yield self.build_list_request(0, 1)
+        else:
+            yield self.build_request(0, self.frontier.next_pos, is_first_page=True)
+
+    def fetch_ingested_issue_ids(self):
+        """
+        :return: set of ndl_min_id of Minutes in the date range
+        """
 
-    def parse(self, response):
+        filter_ = _MinutesFilter(None)
+        filter_.start_date_time_gte = to_neo4j_datetime(datetime.strptime(self.start_date, '%Y-%m-%d'))
+        filter_.start_date_time_lt = to_neo4j_datetime(datetime.strptime(self.end_date, '%Y-%m-%d') + timedelta(days=1))
+        minutes_lst = self.gql_client.get_all_minutes(fields=['id', 'ndl_min_id'], filter_=filter_)
+        issue_ids = {minutes.ndl_min_id for minutes in minutes_lst if getattr(minutes, 'ndl_min_id', None)}
+        LOGGER.info(f'found {len(issue_ids)} ingested minutes from {self.start_date} to {self.end_date}')
+        return issue_ids
+
+    def select_issue_ids(self, meeting_recs):
         """
-        Minutes, Activity, Speech, UrlをGraphQLに保存する
+        select meetings to fetch the full records for
+        a meeting is updated if its last speech in the meeting list does not exist in GraphQL
+        (ex. the meeting was partially published at the last crawl)
+
+        :param meeting_recs: records of meeting_list API which contain speech meta data without speech body
+        :return: list of issueID of new or updated meetings
+        """
+
+        issue_ids, last_speech_id2issue_id = [], dict()
+        for meeting_rec in meeting_recs:
+            issue_id = meeting_rec['issueID']
+            if issue_id not in self.ingested_issue_ids:
+                issue_ids.append(issue_id)
+                continue
+            last_speech_order = max(int(speech_rec['speechOrder']) for speech_rec in meeting_rec['speechRecord'])
+            if last_speech_order == 0:  # 会議録情報 only
+                continue
+            minutes = build_minutes(meeting_rec['nameOfHouse'] + meeting_rec['nameOfMeeting'],
+                                    datetime.strptime(meeting_rec['date'], '%Y-%m-%d'))
+            last_speech_id2issue_id[build_speech(minutes.id, last_speech_order).id] = issue_id
+
+        if last_speech_id2issue_id:
+            speech_ids = list(last_speech_id2issue_id.keys())
+            found_ids = {speech.id for speech in self.gql_client.bulk_get(speech_ids, fields=['id'])}
+            issue_ids += [issue_id for speech_id, issue_id in last_speech_id2issue_id.items()
+                          if speech_id not in found_ids]
+        return issue_ids
+
+    def build_next_requests(self, response, response_body):
+        window_index = response.meta['window_index']
+        next_pos = response_body.get('nextRecordPosition')
+        has_next_window = window_index + 1 < len(self.windows)
+
+        if self.fanout:
+            if not response.meta['is_first_page']:
+                return []
+            requests = self.build_fanout_requests(window_index, response_body)
+            if has_next_window:
+                requests.append(self.build_request(window_index + 1, 1, is_first_page=True))
+            return requests
+
+        if next_pos is not None:
+            return [self.build_request(window_index, next_pos)]
+        if has_next_window:
+            return [self.build_request(window_index + 1, 1, is_first_page=True)]
+        return []
+
+    def build_fanout_requests(self, window_index, response_body):
+        """
+        build requests for all the remaining pages at once from numberOfRecords in the first page
+        """
+
+        next_pos = response_body.get('nextRecordPosition')
+        if next_pos is None:
+            return []
+        num_records = int(response_body['numberOfRecords'])
+        positions = list(range(next_pos, num_records + 1, self.page_size))
+        LOGGER.info(f'fan out {len(positions)} pages for {num_records} records in {self.windows[window_index]}')
+        return [self.build_request(window_index, pos) for pos in positions]
+
+    def parse_list(self, response):
+        """
+        会議録の一覧から未取得または更新された会議録の本文をリクエストする
         """
 
         LOGGER.info(f'requested {response.url}')
         response_body = json.loads(response.body)
-        minutes_lst, minutes_text_lst, activity_lst, speech_lst, speech_text_lst, bill_action_lst, url_lst = \
-            self.scrape_minutes_activities_speeches_urls(response_body)
-
-        self.gql_client.bulk_merge(minutes_lst)
-        LOGGER.info(f'merged {len(minutes_lst)} minutes')
-        for minutes in minutes_lst:
-            if self.overwrite_url:
-                self.delete_old_urls(minutes.id, UrlTitle.HONBUN)
-            self.link_minutes(minutes)
-
-        self.gql_client.bulk_merge(speech_lst)
-        self.link_speeches(speech_lst)
-        LOGGER.info(f'merged {len(speech_lst)} speeches')
-
-        self.gql_client.bulk_merge(bill_action_lst)
-        LOGGER.info(f'merged {len(bill_action_lst)} bill actions')
-        if self.overwrite_url:
-            for bill_action in bill_action_lst:
-                self.delete_old_urls(bill_action.id, UrlTitle.HONBUN)
-        self.link_bill_action(bill_action_lst)
+        meeting_recs = response_body.get('meetingRecord', [])
+        issue_ids = self.select_issue_ids(meeting_recs)
+        LOGGER.info(f'found {len(issue_ids)} new or updated meetings out of {len(meeting_recs)}')
+        for issue_id in issue_ids:
+            yield self.build_meeting_request(issue_id)
+
+        window_index = response.meta['window_index']
+        next_pos = response_body.get('nextRecordPosition')
+        if next_pos is not None:
+            yield self.build_list_request(window_index, next_pos)
+        elif window_index + 1 < len(self.windows):
+            yield self.build_list_request(window_index + 1, 1)
+
+    @coalesce_links
+    def parse_meeting(self, response):
+        """
+        会議録一件分のMinutes, Activity, Speech, UrlをGraphQLに保存する
+        """
 
-        self.gql_client.bulk_merge(activity_lst)
-        LOGGER.info(f'merged {len(activity_lst)} activities')
-        if self.overwrite_url:
-            for activity in activity_lst:
-                self.delete_old_urls(activity.id, UrlTitle.HONBUN)
-        self.link_activities(activity_lst)
+        LOGGER.info(f'requested {response.url}')
+        yield from self.scrape_items(json.loads(response.body))
 
-        self.gql_client.bulk_merge(url_lst)
-        LOGGER.info(f'merged {len(url_lst)} urls')
-        self.link_urls(url_lst)
+    @coalesce_links
+    def parse(self, response):
+        """
+        Minutes, Activity, Speech, UrlをGraphQLに保存する
+        """
 
-        if self.collect_text:
-            self.es_client.bulk_index(minutes_text_lst)
-            LOGGER.info(f'merged {len(minutes_text_lst)} minutes texts')
-        if self.collect_speech_text:
-            self.es_client.bulk_index(speech_text_lst)
-            LOGGER.info(f'merged {len(speech_text_lst)} speech texts')
+        LOGGER.info(f'requested {response.url}')
+        response_body = json.loads(response.body)
+        meeting_recs = response_body.get('meetingRecord', [])
+        checkpoint_item = CheckpointItem(state={
+            'window_index': response.meta['window_index'],
+            'pos': response.meta['pos'],
+            'next_pos': response_body.get('nextRecordPosition'),
+            'num_records': int(response_body['numberOfRecords']),
+            'last_issue_id': meeting_recs[-1]['issueID'] if meeting_recs else None
+        })
+        # the checkpoint only depends on the objects of this page, not on failures of the other pages in the batch
+        ids = dict()  # use dict as ordered set
+        for item in self.scrape_items(response_body):
+            ids.update(dict.fromkeys(get_item_ids(item)))
+            yield item
+        checkpoint_item['ids'] = list(ids)
+        yield checkpoint_item
+        yield from self.build_next_requests(response, response_body)
+
+    def scrape_items(self, response_body):
+        """
+        yield items to persist the meeting records of meeting API
+        meetings are processed one at a time so that the objects of a meeting can be released after it is yielded
+        """
 
-        self.next_pos = response_body['nextRecordPosition']
-        if self.next_pos is not None:
-            yield response.follow(self.build_next_url(), callback=self.parse)
+        meeting_recs = response_body.get('meetingRecord', [])  # missing if no record in the window
+        meeting_recs.reverse()
+        while meeting_recs:
+            yield from self.scrape_meeting(meeting_recs.pop())
 
-    def scrape_minutes_activities_speeches_urls(self, response_body):
-        minutes_lst, minutes_text_lst, activity_lst, speech_lst, speech_text_lst, bill_action_lst, url_lst = [], [], [], [], [], [], []
+    def scrape_meeting(self, meeting_rec):
+        """
+        yield Minutes, Speech, Activity, BillAction, Url and texts of a meeting record
+        speeches are yielded in chunks of speech_chunk_size while iterating over the speech records.
+        Speech, Activity, Url and SpeechText are built as compact records since there are many of them
+        """
 
-        for meeting_rec in response_body['meetingRecord']:
+        try:
+            minutes = build_minutes(
+                meeting_rec['nameOfHouse'] + meeting_rec['nameOfMeeting'],
+                datetime.strptime(meeting_rec['date'], '%Y-%m-%d'))
+            minutes.ndl_min_id = meeting_rec['issueID']
+            minutes.ndl_url = meeting_rec['meetingURL']
+            topics = extract_topics(meeting_rec['speechRecord'][0]['speech'])
+            if topics:
+                minutes.topics = topics
+                minutes.topic_ids = self.get_topic_ids(topics, minutes.start_date_time)
+            else:
+                LOGGER.warning(f'failed to extract topic for {minutes}')
+        except ValueError as e:
+            LOGGER.warning(f'failed to parse minutes: {e}')
+            return
+        yield build_merge_item([minutes])
+        yield from self.link_minutes(minutes)
+
+        minutes_url = UrlRecord(meeting_rec['meetingURL'], UrlTitle.HONBUN, self.domain)
+        minutes_url.to_id = minutes.id
+
+        # resolve each speaker once for both Speech and Activity
+        speaker2member = dict()
+        for speaker in set(map(lambda x: x['speaker'], meeting_rec['speechRecord'])):
             try:
-                minutes = build_minutes(
-                    meeting_rec['nameOfHouse'] + meeting_rec['nameOfMeeting'],
-                    datetime.strptime(meeting_rec['date'], '%Y-%m-%d'))
-                minutes.ndl_min_id = meeting_rec['issueID']
-                minutes.ndl_url = meeting_rec['meetingURL']
-                topics = extract_topics(meeting_rec['speechRecord'][0]['speech'])
-                if topics:
-                    minutes.topics = topics
-                    minutes.topic_ids = self.get_topic_ids(topics, minutes.start_date_time)
-                else:
-                    LOGGER.warning(f'failed to extract topic for {minutes}')
-            except ValueError as e:
-                LOGGER.warning(f'failed to parse minutes: {e}')
+                speaker2member[speaker] = self.member_finder.find_one(speaker, exact_match=True)
+            except Exception:
                 continue
-            minutes_lst.append(minutes)
 
-            url = build_url(meeting_rec['meetingURL'], UrlTitle.HONBUN, self.domain)
-            url.to_id = minutes.id
+        speaker2recs = defaultdict(list)  # for Activity
+        moderator_recs = []  # for BillAction
+        text_parts = []  # for MinutesText, joined at the end to avoid quadratic string concatenation
+        speech_lst, speech_text_lst = [], []
+        num_speeches = 0
+
+        for speech_rec in meeting_rec['speechRecord'][1:]:  # skip 会議録情報
+            speaker = speech_rec['speaker']
+            speaker2recs[speaker].append(speech_rec)
+            if is_moderator(speech_rec['speech']):
+                moderator_recs.append(speech_rec)
+
+            speech = SpeechRecord(minutes.id, int(speech_rec['speechOrder']))
+            speech.ndl_url = speech_rec['speechURL']
+            speech.speaker_name = speaker
+            if speaker in speaker2member:
+                speech.member_id = speaker2member[speaker].id  # only for link
+            speech_lst.append(speech)
+            if self.collect_text or self.collect_speech_text:
+                cleaned_speech = clean_speech(speech_rec['speech'])
+                if self.collect_text:
+                    text_parts.append(cleaned_speech)
+                if self.collect_speech_text:
+                    speech_text_lst.append(
+                        SpeechTextRecord(speech.id, minutes.name, speaker, cleaned_speech, meeting_rec['date']))
+
+            if len(speech_lst) >= self.speech_chunk_size:
+                yield from self.flush_speeches(speech_lst, speech_text_lst)
+                num_speeches += len(speech_lst)
+                speech_lst, speech_text_lst = [], []
+        yield from self.flush_speeches(speech_lst, speech_text_lst)
+        num_speeches += len(speech_lst)
+
+        activity_lst, activity_speech_lst, url_lst = [], [], [minutes_url]
+        for speaker, recs in speaker2recs.items():
+            if speaker not in speaker2member:
+                continue  # ignore non member speaker
+            member = speaker2member[speaker]
+            activity = ActivityRecord(member.id, minutes.id, minutes.start_date_time)
+            if self.collect_keyphrase:
+                activity_speech_lst.append(''.join([rec['speech'] for rec in recs]))
+            url = UrlRecord(recs[0]['speechURL'], UrlTitle.HONBUN, self.domain)
+            url.to_id = activity.id
+            activity_lst.append(activity)
             url_lst.append(url)
 
-            # pre-calculate speaker-member map until MemberFinder becomes fast (POL-285)
-            speaker2member = dict()
-            for speaker in set(map(lambda x: x['speaker'], meeting_rec['speechRecord'])):
-                try:
-                    speaker2member[speaker] = self.member_finder.find_one(speaker, exact_match=True)
-                except Exception:
-                    continue
-
-            speaker2recs = defaultdict(list)  # for Activity
-            moderator_recs = []  # for BillAction
-            full_text = ''  # for MinutesText
-
-            for speech_rec in meeting_rec['speechRecord'][1:]:  # skip 会議録情報
-                speaker = speech_rec['speaker']
-                speaker2recs[speaker].append(speech_rec)
-                cleaned_speech = clean_speech(speech_rec['speech'])
-                full_text += cleaned_speech
-                speech = build_speech(minutes.id, int(speech_rec['speechOrder']))
-                speech.ndl_url = speech_rec['speechURL']
-                speech.speaker_name = speaker
-                if speaker in speaker2member:
-                    speech.member_id = speaker2member[speaker].id  # only for link
-                speech_lst.append(speech)
-                speech_text_lst.append(SpeechText({
-                    'id': speech.id,
-                    'title': minutes.name,
-                    'speaker': speaker,
-                    'body': cleaned_speech,
-                    'date': meeting_rec['date']
-                }))
-
-                if is_moderator(speech_rec['speech']):
-                    moderator_recs.append(speech_rec)
-
-            for speaker, recs in speaker2recs.items():
-                if speaker not in speaker2member:
-                    continue  # ignore non member speaker
-                member = speaker2member[speaker]
-                speech = ''.join([rec['speech'] for rec in recs])
-                activity = build_minutes_activity(member.id, minutes.id, minutes.start_date_time)
-                if self.collect_keyphrase:
-                    activity.keyphrases = self.key_phrase_extractor.extract(speech, self.num_key_phrases)
-                url = build_url(recs[0]['speechURL'], UrlTitle.HONBUN, self.domain)
-                url.to_id = activity.id
-                activity_lst.append(activity)
-                url_lst.append(url)
-
-            bill_action_lst += self.scrape_bill_actions(moderator_recs, minutes, self.bill_id2names)
-
-            minutes_text_lst.append(MinutesText({
+        bill_action_lst = self.scrape_bill_actions(moderator_recs, minutes, self.bill_matcher)
+        yield build_merge_item(bill_action_lst)
+        yield from self.link_bill_action(bill_action_lst)
+
+        if self.collect_keyphrase:
+            # keyphrases are attached by the pipeline before the following merge of activities is persisted
+            yield build_keyphrase_item(activity_lst, activity_speech_lst, self.num_key_phrases)
+        yield build_merge_item(activity_lst)
+        yield from self.link_activities(activity_lst)
+
+        if self.overwrite_url:
+            parent_ids = [x.id for x in [minutes] + bill_action_lst + activity_lst]
+            yield from self.replace_urls(parent_ids, UrlTitle.HONBUN, url_lst)
+        else:
+            yield build_merge_item(url_lst)
+            yield from self.link_urls(url_lst)
+
+        if self.collect_text:
+            yield build_index_item([MinutesText({
                 'id': minutes.id,
                 'title': minutes.name,
-                'body': full_text,
+                'body': ''.join(text_parts),
                 'date': meeting_rec['date']
-            }))
+            })])
+        LOGGER.info(f'scraped {minutes.id} with {num_speeches} speeches, {len(activity_lst)} activities, '
+                    f'{len(bill_action_lst)} bill actions and {len(url_lst)} urls')
 
-        return minutes_lst, minutes_text_lst, activity_lst, speech_lst, speech_text_lst, bill_action_lst, url_lst
+    def flush_speeches(self, speech_lst, speech_text_lst):
+        if speech_lst:
+            yield build_merge_item(speech_lst)
+            yield from self.link_speeches(speech_lst)
+        if speech_text_lst:
+            yield build_index_item(speech_text_lst)
 
     @staticmethod
-    def scrape_bill_actions(moderator_recs, minutes, bill_id2names):
+    def scrape_bill_actions(moderator_recs, minutes, bill_matcher):
         bill_action_lst = []
 
         if not hasattr(minutes, 'topics'):
             return bill_action_lst
 
-        minutes_bill_id2names = {}
-        for topic_id in minutes.topic_ids:
-            if topic_id in bill_id2names.keys():
-                minutes_bill_id2names[topic_id] = bill_id2names[topic_id]
+        minutes_bill_matcher = bill_matcher.subset(minutes.topic_ids)
+        topic_matcher = KeywordMatcher(minutes.topics + minutes_bill_matcher.names)
 
         current_topic_ids = list()
         prev_bill_action_types = defaultdict(set)  # key: bill_id, value: set of action types
         for speech_rec in moderator_recs:
-            speech = build_speech(minutes.id, int(speech_rec['speechOrder']))
-            if any(topic in speech_rec['speech'] for topic in
-                   minutes.topics + list(minutes_bill_id2names.values())):
-                current_topic_ids = extract_topic_ids(speech_rec['speech'], minutes_bill_id2names)
+            speech = SpeechRecord(minutes.id, int(speech_rec['speechOrder']))
+            if topic_matcher.contains_any(speech_rec['speech']):
+                current_topic_ids = extract_topic_ids(speech_rec['speech'], minutes_bill_matcher)
             bill_action_types = extract_bill_action_types(speech_rec['speech'])
             if current_topic_ids and bill_action_types:
                 for current_topic_id in current_topic_ids:
@@ -25,19 +25,18 @@ class NikkeiSpider(NewsSpiderTemplate):
         self.next_bn += 20
         return f'https://www.nikkei.com/politics/politics/?bn={self.next_bn}'
 
-    def start_requests(self):
+    def build_list_requests(self):
         yield scrapy.Request(self.build_next_url(), self.parse)
 
     def parse(self, response):
-        if self.news_url_list:
-            news_url_list = self.news_url_list
-        else:
-            news_url_list = extract_full_href_list(response.css('div.m-miM09'), response.url)
-            LOGGER.info(f'scraped {len(news_url_list)} news urls from {response.url}')
-        for news_url in news_url_list:
+        news_url_list = extract_full_href_list(response.css('div.m-miM09'), response.url)
+        LOGGER.info(f'scraped {len(news_url_list)} news urls from {response.url}')
+        for news_url in self.filter_news_urls(news_url_list):
             yield response.follow(news_url, callback=self.parse_news)
         self.news_count += len(news_url_list)
-        if (not self.news_url_list) and (self.news_count < self.limit):
+        if self.is_all_saved(news_url_list):
+            LOGGER.info(f'stop pagination at {response.url} since all news are already saved')
+        elif self.news_count < self.limit:
             yield response.follow(self.build_next_url(), self.parse)
 
     def scrape_news_and_text(self, response):
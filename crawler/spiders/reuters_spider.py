@@ -26,17 +26,19 @@ class ReutersSpider(NewsSpiderTemplate):
         self.next_page += 1
         return f'https://jp.reuters.com/news/archive/politicsNews?view=page&page={self.next_page}&pageSize=10'
 
-    def start_requests(self):
+    def build_list_requests(self):
         yield scrapy.Request(self.build_next_url(), self.parse)
 
     def parse(self, response):
         news_url_list = extract_full_href_list(
             response.xpath('//section[@id="moreSectionNews"]//article'), response.url)
         LOGGER.info(f'scraped {len(news_url_list)} news urls from {response.url}')
-        for news_url in news_url_list:
+        for news_url in self.filter_news_urls(news_url_list):
             yield response.follow(news_url, callback=self.parse_news)
         self.news_count += len(news_url_list)
-        if self.news_count < self.limit:
+        if self.is_all_saved(news_url_list):
+            LOGGER.info(f'stop pagination at {response.url} since all news are already saved')
+        elif self.news_count < self.limit:
             yield response.follow(self.build_next_url(), self.parse)
 
     def scrape_news_and_text(self, response):
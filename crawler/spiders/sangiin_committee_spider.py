@@ -1,6 +1,7 @@
 import re
 from logging import getLogger
 
+from crawler.items import build_merge_item
 from crawler.spiders import SpiderTemplate
 from crawler.utils import extract_text, build_committee, clean_committee_topic
 
@@ -13,8 +14,8 @@ class SangiinCommitteeSpider(SpiderTemplate):
 
     def parse(self, response):
         committees = self.scrape_committees_from_response(response)
-        self.gql_client.bulk_merge(committees)
-        LOGGER.info(f'merged {len(committees)} committees')
+        yield build_merge_item(committees)
+        LOGGER.info(f'scraped {len(committees)} committees')
 
     @staticmethod
     def scrape_committees_from_response(response):
@@ -1,7 +1,8 @@
 from logging import getLogger
 from urllib.parse import urljoin
 
-from crawler.spiders import SpiderTemplate
+from crawler.items import build_merge_item, build_link_item
+from crawler.spiders import SpiderTemplate, coalesce_links
 from crawler.utils import extract_text, build_url, UrlTitle
 from politylink.graphql.schema import Minutes
 from politylink.utils import DateConverter
@@ -32,9 +33,10 @@ class SangiinMinutesSpider(SpiderTemplate):
         for url in sitsugi_urls:
             yield response.follow(url, callback=self.parse_sitsugi)
 
+    @coalesce_links
     def parse_keika(self, response):
         url = build_url(response.url, title=UrlTitle.IINKAI_KEIKA, domain=self.domain)
-        self.gql_client.merge(url)
+        yield build_merge_item([url])
 
         contents = response.xpath('//div[@id="ContentsBox"]')
         h2_text = contents.xpath('.//h2/text()').get()
@@ -56,9 +58,10 @@ class SangiinMinutesSpider(SpiderTemplate):
                     f'found {len(minutes_list)} Minutes that match with ({committee_name}, {dt}): {minutes_list}')
             for minutes in minutes_list:
                 minutes = Minutes({'id': minutes.id, 'summary': summary})
-                self.gql_client.merge(minutes)
-                self.gql_client.link(url.id, minutes.id)
+                yield build_merge_item([minutes])
+                yield build_link_item([url.id], [minutes.id])
 
+    @coalesce_links
     def parse_sitsugi(self, response):
         contents = response.xpath('//div[@id="list-style"]')
         h3_text = contents.xpath('.//h3/text()').get()
@@ -72,7 +75,7 @@ class SangiinMinutesSpider(SpiderTemplate):
             except Exception as e:
                 LOGGER.error(f'failed to build url from {a} in {response.url}')
                 return
-            self.gql_client.merge(url)
+            yield build_merge_item([url])
 
             dt = DateConverter.convert(text)
             minutes_list = self.minutes_finder.find(committee_name, dt)
@@ -80,4 +83,4 @@ class SangiinMinutesSpider(SpiderTemplate):
                 LOGGER.warning(
                     f'found {len(minutes_list)} Minutes that match with ({committee_name}, {dt}): {minutes_list}')
             for minutes in minutes_list:
-                self.gql_client.link(url.id, minutes.id)
+                yield build_link_item([url.id], [minutes.id])
@@ -1,6 +1,7 @@
 from logging import getLogger
 
-from crawler.spiders import SpiderTemplate
+from crawler.items import build_merge_item, build_link_item
+from crawler.spiders import SpiderTemplate, coalesce_links
 from crawler.utils.graphql import build_bill, build_url, build_bill_activity, to_neo4j_datetime, UrlTitle, BillCategory
 from crawler.utils.scrape import extract_text, extract_full_href_or_none
 from politylink.graphql.schema import Url, Bill, House
@@ -22,6 +23,7 @@ class SangiinSpider(SpiderTemplate):
     def build_start_url(diet_number):
         return f'https://www.sangiin.go.jp/japanese/joho1/kousei/gian/{diet_number}/gian.htm'
 
+    @coalesce_links
     def parse(self, response):
         """
         議案一覧ページからBillとURLを取得し、GraphQLに保存する
@@ -29,38 +31,35 @@ class SangiinSpider(SpiderTemplate):
 
         LOGGER.info(f'got response from {response.url}')
         bills, urls = self.scrape_bills_and_urls(response)
-        self.gql_client.bulk_merge(bills)
-        self.gql_client.bulk_link(map(lambda x: x.id, bills), [self.diet.id] * len(bills))
-        LOGGER.info(f'merged {len(bills)} bills')
+        yield build_merge_item(bills)
+        yield build_link_item(map(lambda x: x.id, bills), [self.diet.id] * len(bills))
+        LOGGER.info(f'scraped {len(bills)} bills')
 
-        for url in urls:
-            bill_id = url.meta['bill_id']
-            self.delete_old_urls(bill_id, url.title)
-            self.gql_client.merge(url)
-            self.gql_client.link(url.id, bill_id)
-        LOGGER.info(f'merged {len(urls)} urls')
+        yield from self.replace_urls_by_title(urls)
+        LOGGER.info(f'scraped {len(urls)} urls')
 
         for url in urls:
             assert isinstance(url, Url)
             if url.title == UrlTitle.GIAN_ZYOUHOU:
                 yield response.follow(url.url, callback=self.parse_meisai, meta=url.meta)
 
+    @coalesce_links
     def parse_meisai(self, response):
         """
         議案情報ページからBillとActivityを取得し、GraphQLに保存する
         """
 
         bill, activities = self.scrape_bill_and_activities_from_meisai(response)
-        self.gql_client.bulk_merge([bill] + activities)
-        LOGGER.info(f'merged 1 Bill and {len(activities)} Activity')
+        yield build_merge_item([bill] + activities)
+        LOGGER.info(f'scraped 1 Bill and {len(activities)} Activity')
         LOGGER.debug(f'Bill={bill}, Activity={activities}')
         if bill.committee_ids:
-            self.gql_client.bulk_link([bill.id] * len(bill.committee_ids), bill.committee_ids)
-            LOGGER.debug(f'linked {bill.id} to {bill.committee_ids}')
+            yield build_link_item([bill.id] * len(bill.committee_ids), bill.committee_ids)
+            LOGGER.debug(f'queued links of {bill.id} to {bill.committee_ids}')
         if bill.member_ids:
-            self.gql_client.bulk_link(bill.member_ids, [bill.id] * len(bill.member_ids))
-            LOGGER.debug(f'linked {bill.id} to {bill.member_ids}')
-        self.link_activities(activities)
+            yield build_link_item(bill.member_ids, [bill.id] * len(bill.member_ids))
+            LOGGER.debug(f'queued links of {bill.id} to {bill.member_ids}')
+        yield from self.link_activities(activities)
 
     def scrape_bills_and_urls(self, response):
         def get_bill_category_or_none(caption):
@@ -109,6 +108,7 @@ class SangiinSpider(SpiderTemplate):
             maybe_meisai_href = extract_full_href_or_none(cells[2], response_url)
             if maybe_meisai_href:
                 url = build_url(maybe_meisai_href, UrlTitle.GIAN_ZYOUHOU, self.domain)
+                url.to_id = bill.id
                 url.meta = {'bill_id': bill.id}
                 urls.append(url)
 
@@ -1,32 +1,31 @@
 import re
 from logging import getLogger
 
-import scrapy
-
-from crawler.spiders import TvSpiderTemplate
+from crawler.items import build_merge_item
+from crawler.spiders import TvSpiderTemplate, IdRangeSpiderTemplate
 from crawler.utils import build_minutes, build_url, UrlTitle, deduplicate, extract_datetime
 
 LOGGER = getLogger(__name__)
 
 
-class SangiinTvSpider(TvSpiderTemplate):
+class SangiinTvSpider(IdRangeSpiderTemplate, TvSpiderTemplate):
     name = 'sangiin_tv'
     domain = 'sangiin.go.jp'
     house_name = '参議院'
 
-    def __init__(self, next_id=-1, last_id=100000, failure_in_row_limit=10, *args, **kwargs):
-        super(SangiinTvSpider, self).__init__(*args, **kwargs)
+    def __init__(self, next_id=-1, last_id=100000, failure_in_row_limit=10, window_size=4, frontier_search='true',
+                 frontier_tolerance=3, *args, **kwargs):
+        failure_in_row_limit = int(failure_in_row_limit)
         if next_id == -1:
             try:
-                next_id = self.get_last_sid() - failure_in_row_limit
+                next_id = self.get_last_sid()
             except Exception as e:
                 msg = f'failed to get last sid from GraphQL, you need to specify next_id argument'
                 raise Exception(msg) from e
-
-        self.next_id = int(next_id)
-        self.last_id = int(last_id)
-        self.failure_in_row_limit = failure_in_row_limit
-        self.failure_in_row = 0
+            if frontier_search != 'true':
+                next_id -= failure_in_row_limit
+        super(SangiinTvSpider, self).__init__(next_id, last_id, failure_in_row_limit, window_size, frontier_search,
+                                              frontier_tolerance, *args, **kwargs)
 
     def get_last_sid(self):
         query = """
@@ -44,32 +43,20 @@ class SangiinTvSpider(TvSpiderTemplate):
                     return sid
         raise ValueError('sid does not found in the latest {} minutes'.format(len(data['minutes'])))
 
-    def build_next_url(self):
-        self.next_id += 1
-        return 'https://www.webtv.sangiin.go.jp/webtv/detail.php?sid={}'.format(self.next_id)
-
-    def start_requests(self):
-        yield scrapy.Request(self.build_next_url(), self.parse)
-
-    def parse(self, response):
-        try:
-            minutes, activity_list, url_list = self.scrape_minutes_activities_urls(response)
-        except Exception:
-            LOGGER.warning(f'failed to parse minutes from {response.url}')
-            self.failure_in_row += 1
-            if self.next_id < self.last_id and self.failure_in_row < self.failure_in_row_limit:
-                yield response.follow(self.build_next_url(), callback=self.parse)
-            return
+    def build_id_url(self, id_):
+        return 'https://www.webtv.sangiin.go.jp/webtv/detail.php?sid={}'.format(id_)
 
-        self.gql_client.bulk_merge([minutes] + activity_list + url_list)
-        LOGGER.info(f'merged 1 Minutes, {len(activity_list)} activities and {len(url_list)} urls')
-        self.link_minutes(minutes)
-        self.link_activities(activity_list)
-        self.link_urls(url_list)
+    def is_id_found(self, response):
+        terms = response.xpath('//div[starts-with(@id, "detail-contents-inner")]//dl/dt/text()').getall()
+        return '開会日' in terms and '会議名' in terms
 
-        self.failure_in_row = 0
-        if self.next_id < self.last_id:
-            yield response.follow(self.build_next_url(), callback=self.parse)
+    def scrape_id(self, response):
+        minutes, activity_list, url_list = self.scrape_minutes_activities_urls(response)
+        LOGGER.info(f'scraped 1 Minutes, {len(activity_list)} activities and {len(url_list)} urls')
+        yield build_merge_item([minutes] + activity_list + url_list)
+        yield from self.link_minutes(minutes)
+        yield from self.link_activities(activity_list)
+        yield from self.link_urls(url_list)
 
     def scrape_minutes_activities_urls(self, response):
         content = response.xpath('//div[@id="detail-contents-inner"]')
@@ -1,5 +1,6 @@
 from logging import getLogger
 
+from crawler.items import build_merge_item
 from crawler.spiders import SpiderTemplate
 from crawler.utils import extract_text, build_committee, clean_committee_topic
 
@@ -16,8 +17,8 @@ class ShugiinCommitteeSpider(SpiderTemplate):
     def parse(self, response):
         table = response.xpath('//table')[0]
         committees = self.scrape_committees_from_table(table)
-        self.gql_client.bulk_merge(committees)
-        LOGGER.info(f'merged {len(committees)} committees')
+        yield build_merge_item(committees)
+        LOGGER.info(f'scraped {len(committees)} committees')
 
     @staticmethod
     def scrape_committees_from_table(table):
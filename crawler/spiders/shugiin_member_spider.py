@@ -1,7 +1,8 @@
 from logging import getLogger
 from urllib.parse import urljoin
 
-from crawler.spiders import SpiderTemplate
+from crawler.items import build_merge_item, build_index_item
+from crawler.spiders import SpiderTemplate, coalesce_links
 from crawler.utils.common import parse_name_str
 from crawler.utils.elasticsearch import build_member_text
 from crawler.utils.graphql import build_member, build_url, UrlTitle
@@ -21,16 +22,15 @@ class ShugiinMemberSpider(SpiderTemplate):
         self.start_urls = [f'http://www.shugiin.go.jp/internet/itdb_annai.nsf/html/statics/syu/{i}giin.htm'
                            for i in range(1, 11)]
 
+    @coalesce_links
     def parse(self, response):
         members, urls = self.scrape_members_and_urls(response)
-        self.gql_client.bulk_merge(members)
-        LOGGER.info(f'merged {len(members)} members')
+        yield build_merge_item(members)
+        LOGGER.info(f'scraped {len(members)} members')
+
+        yield from self.replace_urls_by_title(urls)
 
         for url in urls:
-            member_id = url.meta['member_id']
-            self.delete_old_urls(member_id, url.title)
-            self.gql_client.merge(url)
-            self.gql_client.link(url.id, member_id)
             yield response.follow(url.url, callback=self.parse_member, meta=url.meta)
 
     def parse_member(self, response):
@@ -57,13 +57,13 @@ class ShugiinMemberSpider(SpiderTemplate):
         if maybe_image_src:
             member.image = urljoin(response.url, maybe_image_src)
 
-        self.gql_client.merge(member)
-        LOGGER.info(f'merged details for {member.id}')
+        yield build_merge_item([member])
+        LOGGER.info(f'scraped details for {member.id}')
 
         if self.collect_text:
             member_text = build_member_text(member)
-            self.es_client.index(member_text)
-            LOGGER.info(f'merged MemberText in Elasticsearch for {member.id}')
+            yield build_index_item([member_text])
+            LOGGER.info(f'scraped MemberText for {member.id}')
 
     def scrape_members_and_urls(self, response):
         members, urls = [], []
@@ -88,6 +88,7 @@ class ShugiinMemberSpider(SpiderTemplate):
             maybe_href = extract_full_href_or_none(cells[0], response.url)
             if maybe_href:
                 url = build_url(maybe_href, UrlTitle.GIIN_ZYOUHOU, self.domain)
+                url.to_id = member.id
                 url.meta = {'member_id': member.id}
                 urls.append(url)
         return members, urls
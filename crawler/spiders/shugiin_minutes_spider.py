@@ -2,7 +2,8 @@ import re
 from datetime import datetime
 from logging import getLogger
 
-from crawler.spiders import SpiderTemplate
+from crawler.items import build_merge_item, build_link_item
+from crawler.spiders import SpiderTemplate, coalesce_links
 from crawler.utils import extract_full_href_or_none, extract_text, build_url, UrlTitle, build_minutes
 from politylink.graphql.client import GraphQLException
 from politylink.graphql.schema import Committee
@@ -50,6 +51,7 @@ class ShugiinMinutesSpider(SpiderTemplate):
                 meta=response.meta
             )
 
+    @coalesce_links
     def parse_minutes(self, response):
         # merge url if exists
         maybe_href = extract_full_href_or_none(response.xpath('//h4'), response.url)
@@ -57,8 +59,8 @@ class ShugiinMinutesSpider(SpiderTemplate):
             LOGGER.warning(f'failed to find url in {response.url}')
             return
         url = build_url(maybe_href, title=UrlTitle.GAIYOU_PDF, domain=self.domain)
-        self.gql_client.merge(url)
-        LOGGER.debug(f'merged {url.id}')
+        yield build_merge_item([url])
+        LOGGER.debug(f'scraped {url.id}')
 
         # link to minutes
         title = extract_text(response.xpath('//title'))
@@ -67,9 +69,10 @@ class ShugiinMinutesSpider(SpiderTemplate):
         minutes = build_minutes(committee_name, date_time)
         try:
             self.gql_client.get(minutes.id, ['id'])  # minutes should already exist
-            self.gql_client.link(url.id, minutes.id)
         except GraphQLException:
             LOGGER.warning(f'failed to find minutes ({committee_name}, {date_time})')
+        else:
+            yield build_link_item([url.id], [minutes.id])
 
     @staticmethod
     def extract_datetime_from_title(title, year):
@@ -1,6 +1,7 @@
 from logging import getLogger
 
-from crawler.spiders import SpiderTemplate
+from crawler.items import build_merge_item, build_link_item, build_index_item
+from crawler.spiders import SpiderTemplate, coalesce_links
 from crawler.utils.elasticsearch import build_bill_text
 from crawler.utils.graphql import build_bill, build_url, UrlTitle, BillCategory
 from crawler.utils.scrape import extract_text, extract_full_href_or_none, extract_parliamentary_groups
@@ -23,6 +24,7 @@ class ShugiinSpider(SpiderTemplate):
     def build_start_url(diet_number):
         return f'http://www.shugiin.go.jp/internet/itdb_gian.nsf/html/gian/kaiji{diet_number}.htm'
 
+    @coalesce_links
     def parse(self, response):
         """
         議案一覧ページからBillとURLを取得し、GraphQLに保存する
@@ -30,16 +32,12 @@ class ShugiinSpider(SpiderTemplate):
 
         LOGGER.info(f'got response from {response.url}')
         bills, urls = self.scrape_bills_and_urls(response)
-        self.gql_client.bulk_merge(bills)
-        self.gql_client.bulk_link(map(lambda x: x.id, bills), [self.diet.id] * len(bills))
-        LOGGER.info(f'merged {len(bills)} bills')
+        yield build_merge_item(bills)
+        yield build_link_item(map(lambda x: x.id, bills), [self.diet.id] * len(bills))
+        LOGGER.info(f'scraped {len(bills)} bills')
 
-        for url in urls:
-            bill_id = url.meta['bill_id']
-            self.delete_old_urls(bill_id, url.title)
-            self.gql_client.merge(url)
-            self.gql_client.link(url.id, bill_id)
-        LOGGER.info(f'merged {len(urls)} urls')
+        yield from self.replace_urls_by_title(urls)
+        LOGGER.info(f'scraped {len(urls)} urls')
 
         for url in urls:
             assert isinstance(url, Url)
@@ -81,14 +79,14 @@ class ShugiinSpider(SpiderTemplate):
         except ValueError as e:
             LOGGER.warning(e)
             return
-        self.es_client.index(bill_text, op_type=OpType.MERGE)
-        LOGGER.info(f'merged BillText in Elasticsearch for {bill_id}')
+        yield build_index_item([bill_text], op_type=OpType.MERGE)
+        LOGGER.info(f'scraped BillText for {bill_id}')
 
         bill = Bill(None)
         bill.id = bill_id
         bill.reason = bill_text.reason
-        self.gql_client.merge(bill)
-        LOGGER.info(f'merged reason in GraphQL for {bill_id}')
+        yield build_merge_item([bill])
+        LOGGER.info(f'scraped reason for {bill_id}')
 
     def parse_keika(self, response):
         """
@@ -116,8 +114,8 @@ class ShugiinSpider(SpiderTemplate):
                         bill.opposed_groups = groups
 
         if hasattr(bill, 'supported_groups') or hasattr(bill, 'opposed_groups'):
-            self.gql_client.merge(bill)
-            LOGGER.info(f'merged groups in GraphQL for {bill_id}')
+            yield build_merge_item([bill])
+            LOGGER.info(f'scraped groups for {bill_id}')
 
     @staticmethod
     def scrape_bills_and_urls(response):
@@ -168,6 +166,7 @@ class ShugiinSpider(SpiderTemplate):
             maybe_keika_href = extract_full_href_or_none(cells[4], response_url)
             if maybe_keika_href:
                 url = build_url(maybe_keika_href, UrlTitle.KEIKA, ShugiinSpider.domain)
+                url.to_id = bill.id
                 url.meta = {'bill_id': bill.id}
                 urls.append(url)
 
@@ -175,6 +174,7 @@ class ShugiinSpider(SpiderTemplate):
             maybe_honbun_href = extract_full_href_or_none(cells[5], response_url)
             if maybe_honbun_href:
                 url = build_url(maybe_honbun_href, UrlTitle.HONBUN, ShugiinSpider.domain)
+                url.to_id = bill.id
                 url.meta = {'bill_id': bill.id}
                 urls.append(url)
 
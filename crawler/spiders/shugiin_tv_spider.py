@@ -4,9 +4,11 @@ from logging import getLogger
 from typing import List
 
 import scrapy
+from scrapy.utils.project import data_path
 
-from crawler.spiders import TvSpiderTemplate
-from crawler.utils import build_minutes, build_url, UrlTitle, deduplicate, extract_datetime
+from crawler.items import build_merge_item, CheckpointItem
+from crawler.spiders import TvSpiderTemplate, coalesce_links
+from crawler.utils import build_minutes, build_url, UrlTitle, deduplicate, extract_datetime, SeenIdStore
 
 LOGGER = getLogger(__name__)
 
@@ -16,16 +18,22 @@ class ShugiinTvSpider(TvSpiderTemplate):
     domain = 'shugiintv.go.jp'
     house_name = '衆議院'
 
-    def __init__(self, start_date, end_date, *args, **kwargs):
+    def __init__(self, start_date, end_date, skip_seen='true', seen_store=None, *args, **kwargs):
         def to_date(date_str):
             return datetime.strptime(date_str, '%Y-%m-%d').date()
 
         super(ShugiinTvSpider, self).__init__(*args, **kwargs)
-        start_date = to_date(start_date)
-        end_date = to_date(end_date)
-        self.start_urls = []
-        for i in range((end_date - start_date).days):
-            self.start_urls.append(self.build_start_url(start_date + timedelta(i)))
+        self.days = [to_date(start_date) + timedelta(i) for i in range((to_date(end_date) - to_date(start_date)).days)]
+        self.seen_store = SeenIdStore(seen_store or data_path('seen_ids.sqlite', createdir=True), self.name)
+        self.seen_deli_ids = set()
+        if skip_seen == 'true':
+            self.seen_deli_ids = self.seen_store.get_days(start_date, end_date)
+            LOGGER.info(f'loaded {len(self.seen_deli_ids)} seen deli_ids from {start_date} to {end_date}')
+        self.scheduled_deli_ids = set()  # to deduplicate deli_ids listed in multiple days
+
+    def start_requests(self):
+        for day in self.days:
+            yield scrapy.Request(self.build_start_url(day), self.parse, meta={'day': day.strftime('%Y-%m-%d')})
 
     @staticmethod
     def build_start_url(date):
@@ -51,18 +59,25 @@ class ShugiinTvSpider(TvSpiderTemplate):
         LOGGER.info(f'scraped {len(deli_ids)} deli_ids from {response.url}: {deli_ids}')
         LOGGER.info(f'scraped {len(h_pages)} h_pages from {response.url}: {h_pages}')
 
-        for deli_id in deli_ids:
+        new_deli_ids = [x for x in deli_ids if x not in self.seen_deli_ids and x not in self.scheduled_deli_ids]
+        if len(new_deli_ids) < len(deli_ids):
+            LOGGER.info(f'skipped {len(deli_ids) - len(new_deli_ids)} seen or scheduled deli_ids')
+        for deli_id in new_deli_ids:
+            self.scheduled_deli_ids.add(deli_id)
             yield response.follow(
                 self.build_minutes_url(deli_id),
-                callback=self.parse_minutes
+                callback=self.parse_minutes,
+                meta={'day': response.meta['day'], 'deli_id': deli_id}
             )
         for h_page in h_pages:
             yield scrapy.FormRequest.from_response(
                 response,
                 formdata={'h_page': h_page},
-                callback=self.parse
+                callback=self.parse,
+                meta={'day': response.meta['day']}
             )
 
+    @coalesce_links
     def parse_minutes(self, response):
         try:
             minutes, activity_list, url_list = self.scrape_minutes_activities_urls(response)
@@ -70,11 +85,19 @@ class ShugiinTvSpider(TvSpiderTemplate):
             LOGGER.exception(f'failed to parse minutes from {response.url}')
             return
 
-        self.gql_client.bulk_merge([minutes] + activity_list + url_list)
-        LOGGER.info(f'merged 1 Minutes, {len(activity_list)} activities and {len(url_list)} urls')
-        self.link_minutes(minutes)
-        self.link_activities(activity_list)
-        self.link_urls(url_list)
+        yield build_merge_item([minutes] + activity_list + url_list)
+        LOGGER.info(f'scraped 1 Minutes, {len(activity_list)} activities and {len(url_list)} urls')
+        yield from self.link_minutes(minutes)
+        yield from self.link_activities(activity_list)
+        yield from self.link_urls(url_list)
+        yield CheckpointItem(state={response.meta['deli_id']: response.meta['day']})
+
+    def on_checkpoint(self, state):
+        self.seen_store.add(state)  # deli_id is seen only after its minutes are persisted
+
+    def closed(self, reason):
+        super(ShugiinTvSpider, self).closed(reason)
+        self.seen_store.close()
 
     def scrape_minutes_activities_urls(self, response):
         date_time, meeting_name = None, None
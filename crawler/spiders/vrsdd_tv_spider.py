@@ -2,29 +2,25 @@ import re
 from datetime import datetime
 from logging import getLogger
 
-import scrapy
-
-from crawler.spiders import SpiderTemplate
+from crawler.spiders import IdRangeSpiderTemplate
 from crawler.utils import build_minutes, build_url, UrlTitle
-from politylink.graphql.client import GraphQLException
 
 LOGGER = getLogger(__name__)
 
 
-class VrsddTvSpider(SpiderTemplate):
+class VrsddTvSpider(IdRangeSpiderTemplate):
     name = 'vrsdd_tv'
     domain = 'grips.ac.jp'
 
-    def __init__(self, next_id=-1, last_id=100000, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, next_id=-1, last_id=100000, failure_in_row_limit=1, window_size=4, frontier_search='true',
+                 frontier_tolerance=3, *args, **kwargs):
         if next_id == -1:
             next_id = self.fetch_next_id()
-        self.next_id = int(next_id)
-        self.last_id = int(last_id)
+        super().__init__(next_id, last_id, failure_in_row_limit, window_size, frontier_search, frontier_tolerance,
+                         *args, **kwargs)
 
-    def build_next_url(self):
-        self.next_id += 1
-        return 'http://gclip1.grips.ac.jp/video/video/{}'.format(self.next_id)
+    def build_id_url(self, id_):
+        return 'http://gclip1.grips.ac.jp/video/video/{}'.format(id_)
 
     def fetch_next_id(self):
         query = """
@@ -45,24 +41,20 @@ class VrsddTvSpider(SpiderTemplate):
             raise ValueError('no vrsdd URLs found in GraphQL. Please manually specify next_id')
         return next_id
 
-    def start_requests(self):
-        yield scrapy.Request(self.build_next_url(), self.parse)
+    def is_id_found(self, response):
+        self.parse_page_title(response.xpath('//title/text()').get() or '')
+        return True
 
-    def parse(self, response):
+    def scrape_id(self, response):
         page_title = response.xpath('//title/text()').get()
         house_name, meeting_name, date_time = self.parse_page_title(page_title)
         minutes = build_minutes(house_name + meeting_name, date_time)
         url = build_url(response.url, UrlTitle.VRSDD, self.domain)
         LOGGER.info(f'found url for minutes: {minutes}, {url}')
-        try:
-            # do not merge minutes because this is unofficial data source
-            self.delete_old_urls(minutes.id, url.title)
-            self.gql_client.merge(url)
-            self.gql_client.link(url.id, minutes.id)
-        except GraphQLException as e:  # expected when official minutes does not exist yet
-            LOGGER.warning(e)
-        if self.next_id < self.last_id:
-            yield response.follow(self.build_next_url(), callback=self.parse)
+        # do not merge minutes because this is unofficial data source,
+        # and let the pipeline skip the url if the official minutes does not exist yet
+        url.to_id = minutes.id
+        yield from self.replace_urls([minutes.id], url.title, [url], require_parents=True)
 
     @staticmethod
     def parse_page_title(text):
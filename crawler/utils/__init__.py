@@ -3,3 +3,11 @@ from .graphql import *
 from .scrape import *
 from .topics import *
 from .validate import *
+from .store import *
+from .checkpoint import *
+from .finder import *
+from .matcher import *
+from .keyphrase import *
+from .shared import *
+from .probe import *
+from .records import *
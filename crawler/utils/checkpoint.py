@@ -0,0 +1,107 @@
+"""
+長期間のクロールを途中から再開するためのチェックポイントを定義する
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from logging import getLogger
+
+LOGGER = getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    JSON file to save the progress of a crawl
+    the file is replaced atomically so that a crash while saving never corrupts the previous state
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        :return: saved state, or None if nothing is saved
+        """
+
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, state):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class PageFrontier:
+    """
+    Track committed pages of a paginated API over a list of date windows
+
+    Pages may be committed out of order (ex. fan-out mode), so the frontier only advances
+    over the contiguous committed pages from the beginning. Resuming from the frontier never skips a page.
+    """
+
+    def __init__(self, num_windows, window_index=0, next_pos=1):
+        self.num_windows = num_windows
+        self.window_index = window_index
+        self.next_pos = next_pos
+        self.last_issue_id = None
+        self.window_index2pages = dict()  # window index -> start position -> (next position, last issue id)
+        self.window_index2num_records = dict()
+
+    def is_done(self):
+        return self.window_index >= self.num_windows
+
+    def commit(self, window_index, pos, next_pos, num_records, last_issue_id=None):
+        """
+        :param pos: start position of the committed page
+        :param next_pos: start position of the next page, None if the page is the last one
+        :return: True if the frontier advanced
+        """
+
+        if next_pos is None:
+            next_pos = num_records + 1
+        self.window_index2pages.setdefault(window_index, dict())[pos] = (next_pos, last_issue_id)
+        self.window_index2num_records[window_index] = num_records
+
+        advanced = False
+        while not self.is_done():
+            pages = self.window_index2pages.get(self.window_index, dict())
+            num_records = self.window_index2num_records.get(self.window_index)
+            if self.next_pos in pages:
+                self.next_pos, last_issue_id = pages.pop(self.next_pos)
+                self.last_issue_id = last_issue_id or self.last_issue_id
+            elif num_records is not None and self.next_pos > num_records:
+                self.window_index2pages.pop(self.window_index, None)
+                self.window_index2num_records.pop(self.window_index, None)
+                self.window_index += 1
+                self.next_pos = 1
+            else:
+                break
+            advanced = True
+        return advanced
+
+
+def split_date_range(start_date, end_date, window_days):
+    """
+    split the inclusive date range into consecutive inclusive windows of window_days
+    :param start_date: str in %Y-%m-%d
+    :param end_date: str in %Y-%m-%d
+    :param window_days: the whole range is returned as one window if not positive
+    :return: list of (from date str, until date str)
+    """
+
+    if window_days <= 0:
+        return [(start_date, end_date)]
+
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    windows = []
+    while start <= end:
+        until = min(start + timedelta(days=window_days - 1), end)
+        windows.append((start.strftime('%Y-%m-%d'), until.strftime('%Y-%m-%d')))
+        start = until + timedelta(days=1)
+    return windows
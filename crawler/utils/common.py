@@ -1,3 +1,4 @@
+import hashlib
 import re
 from logging import getLogger
 
@@ -32,3 +33,24 @@ def parse_name_str(name_str):
         return parts[1], parts[0], parts[3], parts[2]
     else:
         raise ValueError(f'invalid split result: name_str={name_str}, parts={parts}')
+
+
+def parse_shard(shard_str):
+    """
+    :input: "i/n" for the i-th (0-origin) of n shards
+    :return: (i, n)
+    """
+
+    match = re.fullmatch(r'([0-9]+)/([0-9]+)', shard_str.strip())
+    if not match or not int(match.group(1)) < int(match.group(2)):
+        raise ValueError(f'invalid shard="{shard_str}", expected i/n with 0 <= i < n')
+    return int(match.group(1)), int(match.group(2))
+
+
+def in_shard(key, shard_index, num_shards):
+    """
+    assign key to a shard by a hash stable across processes and machines unlike built-in hash
+    """
+
+    digest = hashlib.md5(key.encode('UTF-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards == shard_index
@@ -5,9 +5,21 @@ Elasticsearchインスタンスを生成するためのbuildメソッドを定
 その他のフィールドはelasticsearch_syncerで定期的に同期し直す
 """
 
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from elasticsearch import helpers, TransportError
+
+from politylink.elasticsearch.client import OpType, ElasticsearchException
 from politylink.elasticsearch.schema import BillText, MemberText
 from politylink.graphql.schema import Member
 
+LOGGER = getLogger(__name__)
+
 
 def build_bill_text(bill_id, texts):
     supplement_idx = texts.index('附 則')
@@ -31,3 +43,160 @@ def build_member_text(member: Member):
     member_text.set(MemberText.Field.ID, member.id)
     member_text.set(MemberText.Field.DESCRIPTION, member.description)
     return member_text
+
+
+def disable_refresh(client, indices):
+    """
+    disable periodic refresh of the indices, except for the ones already disabled by others (ex. other processes)
+    :param client: elasticsearch.Elasticsearch
+    :return: dict of index -> original refresh_interval (None for the default) to pass to restore_refresh
+    """
+
+    index2interval = dict()
+    for index in sorted(indices):
+        settings = client.indices.get_settings(index=index, name='index.refresh_interval')
+        interval = next(iter(settings.values()), dict()).get('settings', dict()).get('index', dict()) \
+            .get('refresh_interval')
+        if interval == '-1':
+            LOGGER.info(f'refresh of {index} is already disabled')
+            continue
+        client.indices.put_settings(index=index, body={'index': {'refresh_interval': '-1'}})
+        index2interval[index] = interval
+        LOGGER.info(f'disabled refresh of {index}')
+    return index2interval
+
+
+def restore_refresh(client, index2interval):
+    """
+    restore refresh_interval of the indices and refresh them once to make the indexed documents searchable
+    """
+
+    for index, interval in index2interval.items():
+        try:
+            client.indices.put_settings(index=index, body={'index': {'refresh_interval': interval}})
+            client.indices.refresh(index=index)
+            LOGGER.info(f'restored refresh of {index}')
+        except Exception:
+            LOGGER.exception(f'failed to restore refresh of {index}')
+
+
+class BulkIndexer:
+    """
+    Index texts with the bulk API in chunks of at most max_docs documents and max_bytes bytes of sources
+
+    Chunks are sent in parallel by max_workers threads. Documents rejected by a busy cluster (HTTP 429)
+    are retried with exponential backoff up to max_retries times, and the others failed are raised at once
+    as ElasticsearchException after all chunks are sent.
+    When refresh is False, refresh of the indices is disabled on their first write and restored by close.
+    Counts of chunks, bytes, rejections and the sum of chunk latencies are kept in stats.
+    """
+
+    def __init__(self, es_client, max_docs=500, max_bytes=5 * 1024 * 1024, max_workers=2, max_retries=3,
+                 initial_backoff=1.0, refresh=True):
+        self.es_client = es_client
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.refresh = refresh
+        self.executor = None
+        self.index2interval = dict()  # indices whose refresh is disabled by this indexer
+        self.refresh_checked = set()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def index(self, texts, op_type=OpType.INDEX):
+        actions = [self.build_action(text, op_type) for text in texts]
+        if not self.refresh:
+            indices = {action['_index'] for action in actions} - self.refresh_checked
+            if indices:
+                self.index2interval.update(disable_refresh(self.es_client.client, indices))
+                self.refresh_checked.update(indices)
+
+        chunks = self.split_chunks(actions)
+        if self.max_workers > 1 and len(chunks) > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            errors_lst = list(self.executor.map(lambda args: self.send_chunk(*args), chunks))
+        else:
+            errors_lst = [self.send_chunk(*args) for args in chunks]
+        errors = [error for errors in errors_lst for error in errors]
+        if errors:
+            raise ElasticsearchException(f'failed to index {len(errors)} of {len(actions)} texts: {errors[:3]}')
+
+    @staticmethod
+    def build_action(text, op_type):
+        # same actions as ElasticsearchClient.bulk_index
+        if op_type == OpType.INDEX:
+            return {'_index': text.index, '_id': text.id, '_source': text.__dict__, '_op_type': op_type.value}
+        elif op_type == OpType.UPDATE:
+            return {'_index': text.index, '_id': text.id, 'doc': text.__dict__, '_op_type': op_type.value}
+        raise ElasticsearchException(f'unknown index operation type: {op_type}')
+
+    @staticmethod
+    def get_action_size(action):
+        return len(json.dumps(action.get('_source', action.get('doc')), ensure_ascii=False, default=str).encode())
+
+    def split_chunks(self, actions):
+        """
+        :return: list of (actions, bytes), a document larger than max_bytes is sent alone
+        """
+
+        chunks, chunk, chunk_bytes = [], [], 0
+        for action in actions:
+            size = self.get_action_size(action)
+            if chunk and (len(chunk) >= self.max_docs or chunk_bytes + size > self.max_bytes):
+                chunks.append((chunk, chunk_bytes))
+                chunk, chunk_bytes = [], 0
+            chunk.append(action)
+            chunk_bytes += size
+        if chunk:
+            chunks.append((chunk, chunk_bytes))
+        return chunks
+
+    def send_chunk(self, actions, num_bytes):
+        """
+        :return: list of errors of the documents failed to index
+        """
+
+        stats = Counter(index_chunks=1, index_bytes=num_bytes)
+        backoff = self.initial_backoff
+        for retry in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                # one request per chunk since the chunk is already within the limits
+                _, errors = helpers.bulk(self.es_client.client, actions, raise_on_error=False,
+                                         chunk_size=len(actions), max_chunk_bytes=2 * num_bytes + 1024 * 1024)
+            except TransportError as e:
+                if e.status_code != 429:
+                    raise
+                errors = [{action['_op_type']: {'_id': action['_id'], 'status': 429, 'error': str(e)}}
+                          for action in actions]
+            latency = time.monotonic() - start
+            stats['index_latency_ms'] += int(latency * 1000)
+            rejected_ids = {info['_id'] for error in errors for info in error.values() if info.get('status') == 429}
+            stats['index_rejected'] += len(rejected_ids)
+            LOGGER.debug(f'indexed {len(actions) - len(errors)} of {len(actions)} texts ({num_bytes} bytes) '
+                         f'in {latency:.3f}s, {len(rejected_ids)} rejected')
+            # other failures are not retried here since the whole item will be retried one by one
+            if not rejected_ids or len(rejected_ids) < len(errors) or retry == self.max_retries:
+                break
+            actions = [action for action in actions if action['_id'] in rejected_ids]
+            time.sleep(backoff)
+            backoff *= 2
+        with self.lock:
+            self.stats.update(stats)
+        return errors
+
+    def pop_stats(self):
+        with self.lock:
+            stats, self.stats = self.stats, Counter()
+        return stats
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+        if self.index2interval:
+            restore_refresh(self.es_client.client, self.index2interval)
+            self.index2interval = dict()
@@ -0,0 +1,202 @@
+"""
+GraphQLから一度だけ取得したデータで名前解決を行うローカルなFinderを定義する
+"""
+
+import re
+import unicodedata
+from collections import defaultdict, Counter
+from logging import getLogger
+
+from crawler.utils.matcher import KeywordMatcher
+from politylink.graphql.client import GraphQLClient
+from politylink.helpers import DietFinder
+from politylink.helpers.abstract_finder import AbstractFinder
+from politylink.helpers.bill_finder import DietRelation
+from politylink.utils.bill import extract_bill_number_or_none, extract_bill_category_or_none
+
+LOGGER = getLogger(__name__)
+
+NAME_SUFFIX_PATTERN = re.compile(r'(君|委員長|委員|議員)$')
+DIET_NUMBER_PATTERN = re.compile(r'第([0-9]+)回国会')
+
+
+def normalize_text(text):
+    """
+    normalize text for lookup by NFKC and removing whitespaces including full-width ones
+    """
+
+    return ''.join(unicodedata.normalize('NFKC', text).split())
+
+
+def normalize_member_name(text):
+    """
+    normalize member name or reading for lookup
+    ex. '山田　太郎君' -> '山田太郎', 'ヤマダ タロウ' -> 'やまだたろう'
+    """
+
+    text = normalize_text(text)
+    text = ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in text)  # katakana to hiragana
+    return NAME_SUFFIX_PATTERN.sub('', text)
+
+
+class MemberIndex(AbstractFinder):
+    """
+    In-memory Member finder compatible with politylink.helpers.MemberFinder
+
+    Names and readings are normalized by normalize_member_name and indexed by
+    1) the whole key for O(1) exact lookup, and
+    2) every substring of the key to find keys containing the query without scanning all members.
+    Keys contained in the query are found by looking up the substrings of the query.
+    """
+
+    def __init__(self, members=None, search_fields=None, **kwargs):
+        self.search_fields = search_fields or ['name', 'name_hira']
+        if members is None:
+            client = GraphQLClient(**kwargs)
+            members = client.get_all_members(['id'] + self.search_fields)
+        self.members = members
+        self.key2members = defaultdict(list)
+        self.substring2members = defaultdict(list)
+        for member in members:
+            for key in self.build_keys(member):
+                self.key2members[key].append(member)
+                for substring in self.iter_substrings(key):
+                    self.substring2members[substring].append(member)
+        self.key_lengths = sorted({len(key) for key in self.key2members})
+        LOGGER.info(f'indexed {len(members)} members with {len(self.key2members)} keys')
+
+    def build_keys(self, member):
+        keys = set()
+        for field in self.search_fields:
+            value = getattr(member, field, None)
+            for text in value if isinstance(value, list) else [value]:
+                if isinstance(text, str) and text:
+                    key = normalize_member_name(text)
+                    if key:
+                        keys.add(key)
+        return keys
+
+    @staticmethod
+    def iter_substrings(text, lengths=None):
+        for length in range(1, len(text) + 1) if lengths is None else lengths:
+            for i in range(len(text) - length + 1):
+                yield text[i:i + length]
+
+    def find(self, text, exact_match=False):
+        """
+        :param exact_match: if False, also find members whose name contains the text or is contained in the text.
+                            an exact hit takes precedence over partial ones to resolve ambiguous short names
+        """
+
+        key = normalize_member_name(text)
+        if not key:
+            return []
+        if exact_match or key in self.key2members:
+            return self.unique(self.key2members.get(key, []))
+
+        members = list(self.substring2members.get(key, []))
+        lengths = [length for length in self.key_lengths if length <= len(key)]
+        for substring in self.iter_substrings(key, lengths):
+            members += self.key2members.get(substring, [])
+        return self.unique(members)
+
+    @staticmethod
+    def unique(members):
+        return list({member.id: member for member in members}.values())
+
+
+class BillIndex(AbstractFinder):
+    """
+    In-memory Bill finder compatible with politylink.helpers.BillFinder
+
+    Bills are indexed by normalized name and bill number, and by the number of submitted and belonged diets.
+    Exact lookups are dict hits, and partial lookups use KeywordMatcher to find names contained in the text
+    with a scan over the bills of the diet (if given) for names containing the text.
+    The scan covers all the bills when neither diet_number nor a date of a known diet is given,
+    so such partial lookups cost O(number of bills) while exact lookups stay O(1).
+    Counts of hit and miss are kept in stats, which are shared by all the users of the index in the process.
+    """
+
+    def __init__(self, bills=None, diets=None, search_fields=None, **kwargs):
+        self.search_fields = search_fields or ['name', 'bill_number']
+        if bills is None:
+            client = GraphQLClient(**kwargs)
+            bills = client.get_all_bills(['id', 'category', 'belonged_to_diets'] + self.search_fields)
+        self.bills = bills
+        self.diets = diets
+        self.diet_finder = None  # created on the first lookup by date
+        self.client_kwargs = kwargs
+        self.stats = Counter()
+
+        self.bill_keys = []
+        self.key2indices = defaultdict(list)
+        self.submitted_diet2indices = defaultdict(list)
+        self.belonged_diet2indices = defaultdict(list)
+        for i, bill in enumerate(bills):
+            keys = self.build_keys(bill)
+            self.bill_keys.append(keys)
+            for key in keys:
+                self.key2indices[key].append(i)
+            match = DIET_NUMBER_PATTERN.search(getattr(bill, 'bill_number', None) or '')
+            if match:
+                self.submitted_diet2indices[int(match.group(1))].append(i)
+            for diet in getattr(bill, 'belonged_to_diets', None) or []:
+                self.belonged_diet2indices[diet.number].append(i)
+        self.keys = list(self.key2indices.keys())
+        self.matcher = KeywordMatcher(self.keys)
+        self.date2diet_number = dict()
+        LOGGER.info(f'indexed {len(bills)} bills with {len(self.keys)} keys')
+
+    def build_keys(self, bill):
+        keys = []
+        for field in self.search_fields:
+            value = getattr(bill, field, None)
+            if isinstance(value, str) and value:
+                key = normalize_text(value)
+                if key and key not in keys:
+                    keys.append(key)
+        return keys
+
+    def find(self, text, exact_match=False, diet_number=None, diet_relation=None, category=None, date=None):
+        # same query interpretation as BillFinder
+        query = extract_bill_number_or_none(text) or text
+        if not category:
+            category = extract_bill_category_or_none(query)
+        if (not diet_number) and date:
+            diet_number = self.get_diet_number(date)
+            if diet_number:
+                diet_relation = DietRelation.BELONGED
+
+        key = normalize_text(query)
+        if not key:
+            return []
+        diet_indices = self.get_diet_indices(diet_number, diet_relation)
+        if exact_match:
+            indices = self.key2indices.get(key, [])
+        else:
+            indices = [i for key_index in self.matcher.find(key) for i in self.key2indices[self.keys[key_index]]]
+            candidates = range(len(self.bills)) if diet_indices is None else diet_indices
+            indices += [i for i in candidates if any(key in bill_key for bill_key in self.bill_keys[i])]
+        if diet_indices is not None:
+            indices = set(indices).intersection(diet_indices)
+        bills = [self.bills[i] for i in sorted(set(indices))
+                 if category is None or getattr(self.bills[i], 'category', None) == category]
+
+        self.stats['hit' if bills else 'miss'] += 1
+        return bills
+
+    def get_diet_indices(self, diet_number, diet_relation):
+        if diet_number is None:
+            return None
+        if (diet_relation or DietRelation.SUBMITTED) == DietRelation.SUBMITTED:
+            return self.submitted_diet2indices.get(diet_number, [])
+        return self.belonged_diet2indices.get(diet_number, [])
+
+    def get_diet_number(self, date):
+        date_str = f'{date.year:04}-{date.month:02}-{date.day:02}'
+        if date_str not in self.date2diet_number:
+            if self.diet_finder is None:
+                self.diet_finder = DietFinder(diets=self.diets, **self.client_kwargs)
+            diets = self.diet_finder.find(date)
+            self.date2diet_number[date_str] = diets[0].number if len(diets) == 1 else None
+        return self.date2diet_number[date_str]
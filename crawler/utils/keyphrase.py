@@ -0,0 +1,24 @@
+"""
+キーフレーズ抽出をワーカープロセスで実行するためのメソッドを定義する
+"""
+
+from logging import getLogger
+
+LOGGER = getLogger(__name__)
+
+_extractor = None  # one KeyPhraseExtractor per worker process
+
+
+def extract_keyphrases(texts, num_keyphrases):
+    """
+    extract keyphrases from each of texts
+    KeyPhraseExtractor is imported and loaded lazily since it requires heavy NLP dependencies
+
+    :return: list of keyphrase lists in the same order as texts
+    """
+
+    global _extractor
+    if _extractor is None:
+        from politylink.nlp.keyphrase import KeyPhraseExtractor
+        _extractor = KeyPhraseExtractor()
+    return [_extractor.extract(text, num_keyphrases) for text in texts]
@@ -0,0 +1,115 @@
+"""
+複数のキーワードをテキストから一度の走査で検出するためのマッチャーを定義する
+"""
+
+from collections import deque, defaultdict
+from logging import getLogger
+
+LOGGER = getLogger(__name__)
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton to find all the keywords contained in a text in a single pass
+    the cost of matching depends on the length of the text, not on the number of keywords
+
+    for less than automaton_threshold keywords, plain substring search is used instead
+    since it runs in C and is faster than walking the automaton in Python (see benchmarks/bench_bill_matcher.py)
+    """
+
+    automaton_threshold = 256
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.use_automaton = len(self.keywords) >= self.automaton_threshold
+        self.goto = [dict()]  # state -> char -> next state
+        self.fail = [0]
+        self.output = [[]]  # state -> indices of keywords ending at the state
+        self.is_built = False  # automaton is built on the first match to keep unused matchers cheap
+
+    def build_automaton(self):
+        self.is_built = True
+        for i, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(i)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """
+        :return: generator of indices of keywords contained in text, which may be duplicated
+        """
+
+        if not self.use_automaton:
+            yield from (i for i, keyword in enumerate(self.keywords) if keyword and keyword in text)
+            return
+        if not self.is_built:
+            self.build_automaton()
+
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            yield from output[state]
+
+    def find(self, text):
+        """
+        :return: sorted list of indices of keywords contained in text
+        """
+
+        return sorted(set(self.iter_matches(text)))
+
+    def contains_any(self, text):
+        return any(True for _ in self.iter_matches(text))
+
+
+class BillNameMatcher:
+    """
+    find bill ids whose name is contained in a text
+    """
+
+    def __init__(self, bill_id2names):
+        self.bill_id2names = bill_id2names
+        self.name2indices = defaultdict(list)  # bills in different diets may share the same name
+        self.bill_ids = list(bill_id2names.keys())
+        for i, name in enumerate(bill_id2names.values()):
+            self.name2indices[name].append(i)
+        self.names = list(self.name2indices.keys())
+        self.matcher = KeywordMatcher(self.names)
+
+    def find_ids(self, text):
+        """
+        :return: list of bill ids in the order of bill_id2names
+        """
+
+        indices = sorted(i for name_index in self.matcher.find(text)
+                         for i in self.name2indices[self.names[name_index]])
+        return [self.bill_ids[i] for i in indices]
+
+    def subset(self, bill_ids):
+        """
+        :return: BillNameMatcher of bill_ids in the given order
+        """
+
+        return BillNameMatcher({bill_id: self.bill_id2names[bill_id] for bill_id in bill_ids
+                                if bill_id in self.bill_id2names})
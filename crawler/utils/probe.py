@@ -0,0 +1,119 @@
+"""
+連番IDのページを並行に探索するための状態管理を定義する
+"""
+
+from logging import getLogger
+
+LOGGER = getLogger(__name__)
+
+
+class IdWindow:
+    """
+    Track probing of sequential ids in (next_id, last_id] with at most window_size unresolved ids
+
+    Ids may be resolved out of order, so misses in a row are counted over the contiguous resolved ids
+    from the beginning (frontier) to keep the same semantics as probing ids one by one.
+    Probing stops when failure_in_row_limit misses are found in a row.
+    """
+
+    def __init__(self, next_id, last_id, window_size=1, failure_in_row_limit=None):
+        self.next_id = next_id  # last issued id
+        self.last_id = last_id
+        self.window_size = window_size
+        self.failure_in_row_limit = failure_in_row_limit
+        self.frontier = next_id  # ids up to frontier are resolved
+        self.failure_in_row = 0
+        self.num_hits = 0
+        self.stopped = False
+        self.id2hit = dict()
+
+    def issue(self):
+        """
+        :return: list of ids to probe next
+        """
+
+        ids = []
+        while not self.stopped and self.next_id < self.last_id and self.next_id - self.frontier < self.window_size:
+            self.next_id += 1
+            ids.append(self.next_id)
+        return ids
+
+    def commit(self, id_, hit):
+        """
+        :return: True if probing stopped by this commit
+        """
+
+        if self.stopped:
+            return False
+        self.id2hit[id_] = hit
+        while self.frontier + 1 in self.id2hit:
+            self.frontier += 1
+            if self.id2hit.pop(self.frontier):
+                self.num_hits += 1
+                self.failure_in_row = 0
+            else:
+                self.failure_in_row += 1
+                if self.failure_in_row_limit and self.failure_in_row >= self.failure_in_row_limit:
+                    self.stopped = True
+                    return True
+        return False
+
+    def is_done(self):
+        return self.stopped or self.frontier >= self.last_id
+
+
+class FrontierSearch:
+    """
+    Find the largest existing id above start_id in O(tolerance * log n) probes
+
+    Ids are probed in clusters of tolerance consecutive ids, so that gaps shorter than tolerance are not taken
+    as the end of the ids. The step from the largest found id doubles while clusters are found (galloping),
+    then the range between the largest found id and the first missing cluster is bisected.
+    """
+
+    def __init__(self, start_id, tolerance=3, max_id=None):
+        self.lo = start_id  # largest found id, start_id is assumed to exist
+        self.hi = None  # no id exists in [hi, hi + tolerance)
+        self.step = 1
+        self.tolerance = tolerance
+        self.max_id = max_id
+        self.num_clusters = 0
+        self.num_requests = 0  # probed ids
+
+    def is_done(self):
+        return self.hi is not None and self.hi <= self.lo + 1
+
+    def next_ids(self):
+        """
+        :return: ids of the next cluster to probe, empty if done
+        """
+
+        if self.is_done():
+            return []
+        if self.hi is None:
+            start = self.lo + self.step
+            end = start + self.tolerance
+            if self.max_id is not None:
+                end = min(end, self.max_id + 1)
+                if start >= end:
+                    self.hi = self.max_id + 1  # treat ids above max_id as missing
+                    return self.next_ids()
+        else:
+            start = (self.lo + self.hi) // 2
+            end = min(start + self.tolerance, self.hi)  # ids from hi are known to be missing
+        return list(range(start, end))
+
+    def commit(self, found_ids):
+        """
+        :param found_ids: found ids in the last cluster returned by next_ids
+        """
+
+        probed_ids = self.next_ids()
+        self.num_clusters += 1
+        self.num_requests += len(probed_ids)
+        if found_ids:
+            self.lo = max(found_ids)
+            if self.hi is None:
+                self.step *= 2
+        else:
+            self.hi = probed_ids[0]
@@ -0,0 +1,97 @@
+"""
+会議録のクロールで大量に生成するSpeech, Activity, Url, SpeechTextの軽量な代替を定義する
+
+sgqlcのスキーマオブジェクトはフィールドのキャッシュやJSONデータを個別に持つため、一件あたりのメモリと生成コストが大きい
+Recordは__slots__のみを持ち、GraphQLClient.build_merge_paramが参照する__field_names__を備えるためそのままmergeできる
+Elasticsearchへ書き込む直前にはto_schemaでスキーマオブジェクトに変換する
+"""
+
+from crawler.utils.graphql import UrlTitle, to_neo4j_datetime
+from politylink.elasticsearch.schema import SpeechText
+from politylink.graphql.schema import Speech, Activity, Url
+from politylink.idgen import _basegen_speech, _basegen_activity, _basegen_url
+
+
+class SchemaRecord:
+    """
+    Base of the compact records standing in for schema objects
+
+    Unset slots raise AttributeError as unset fields of the schema objects do, so hasattr checks work the same.
+    __field_names__ lists the slots sent to the backend, and the other slots are only for links (ex. to_id).
+    """
+
+    __slots__ = ()
+    schema = NotImplemented
+    __field_names__ = ()
+
+    def to_schema(self):
+        """
+        :return: schema object with all the set slots including the ones only for links
+        """
+
+        obj = self.schema(None)
+        for name in self.__slots__:
+            if hasattr(self, name):
+                setattr(obj, name, getattr(self, name))
+        return obj
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__ if hasattr(self, name))
+        return f'{self.__class__.__name__}({values})'
+
+
+class SpeechRecord(SchemaRecord):
+    __slots__ = ('id', 'minutes_id', 'order_in_minutes', 'ndl_url', 'speaker_name', 'member_id')
+    schema = Speech
+    __field_names__ = ('id', 'minutes_id', 'order_in_minutes', 'ndl_url', 'speaker_name')
+
+    def __init__(self, minutes_id, order_in_minutes):
+        self.minutes_id = minutes_id
+        self.order_in_minutes = order_in_minutes
+        self.id = f'Speech:{_basegen_speech(self)}'  # same as build_speech
+
+
+class ActivityRecord(SchemaRecord):
+    __slots__ = ('id', 'datetime', 'member_id', 'minutes_id', 'keyphrases')
+    schema = Activity
+    __field_names__ = __slots__
+
+    def __init__(self, member_id, minutes_id, dt):
+        self.member_id = member_id
+        self.minutes_id = minutes_id
+        self.datetime = to_neo4j_datetime(dt)
+        self.id = f'Activity:{_basegen_activity(self)}'  # same as build_minutes_activity
+
+
+class UrlRecord(SchemaRecord):
+    __slots__ = ('id', 'url', 'domain', 'title', 'to_id')
+    schema = Url
+    __field_names__ = ('id', 'url', 'domain', 'title')
+
+    def __init__(self, href, title, domain):
+        self.url = href
+        self.title = title.value if isinstance(title, UrlTitle) else title
+        self.domain = domain
+        self.id = f'Url:{_basegen_url(href)}'  # same as build_url
+
+
+class SpeechTextRecord(SchemaRecord):
+    __slots__ = tuple(field.value for field in SpeechText.Field)
+    schema = SpeechText
+    __field_names__ = __slots__
+    index = SpeechText.index
+
+    def __init__(self, id_, title, speaker, body, date):
+        self.id = id_
+        self.title = title
+        self.speaker = speaker
+        self.body = body
+        self.date = date
+
+
+def to_schema(obj):
+    """
+    :return: schema object of the record, or obj itself if it is not a record
+    """
+
+    return obj.to_schema() if isinstance(obj, SchemaRecord) else obj
@@ -1,7 +1,7 @@
 import json
 import re
 from datetime import datetime
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 
 from politylink.graphql.schema import ParliamentaryGroup
 
@@ -26,6 +26,16 @@ def extract_full_href_list(selector, root_url):
     return urls
 
 
+def canonicalize_news_url(url):
+    """
+    news articles are identified by the path, so query and fragment (ex. tracking parameters) are dropped
+    ex. 'https://JP.reuters.com/article/idJP1/?il=0#top' -> 'https://jp.reuters.com/article/idJP1'
+    """
+
+    parts = urlsplit(url.strip())
+    return '{}://{}{}'.format(parts.scheme, parts.netloc.lower(), parts.path.rstrip('/'))
+
+
 def extract_json_ld_or_none(response):
     maybe_text = response.xpath('//script[@type="application/ld+json"]//text()').get()
     if not maybe_text:
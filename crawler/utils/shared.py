@@ -0,0 +1,54 @@
+"""
+プロセス内の全Spiderで共有するリソース（クライアントやFinder）を初回アクセス時に生成する
+"""
+
+import threading
+import time
+from logging import getLogger
+
+LOGGER = getLogger(__name__)
+
+_resources = dict()
+_lock = threading.RLock()  # reentrant since a factory may access another shared resource
+
+
+def get_shared_resource(name, factory):
+    """
+    :return: resource created by factory on the first call for the name, and shared in the process afterwards
+    """
+
+    if name not in _resources:
+        with _lock:
+            if name not in _resources:
+                start = time.perf_counter()
+                _resources[name] = factory()
+                LOGGER.info(f'initialized {name} in {time.perf_counter() - start:.2f}s')
+    return _resources[name]
+
+
+def peek_shared_resource(name):
+    """
+    :return: resource if it is already created, otherwise None
+    """
+
+    return _resources.get(name)
+
+
+class SharedResource:
+    """
+    Descriptor to access a resource shared in the process, which is created lazily on the first access
+    assigning to the attribute of an instance overrides the resource only for the instance (ex. in tests)
+    """
+
+    def __init__(self, factory, name=None):
+        self.factory = factory
+        self.name = name
+
+    def __set_name__(self, owner, name):
+        if self.name is None:
+            self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return get_shared_resource(self.name, self.factory)
@@ -0,0 +1,193 @@
+"""
+クロール結果をローカルに永続化するためのSQLiteベースのストアを定義する
+"""
+
+import hashlib
+import json
+import sqlite3
+from importlib import metadata
+from logging import getLogger
+
+LOGGER = getLogger(__name__)
+
+
+class SqliteStore:
+    """
+    Base class of local SQLite stores
+    the connection can be shared across threads as long as the caller serializes the access
+    """
+
+    schema = NotImplemented
+    max_variables = 500  # to stay under SQLITE_MAX_VARIABLE_NUMBER
+    timeout = 30  # seconds to wait for the lock held by other processes (ex. crawler.backfill workers)
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=self.timeout, check_same_thread=False)
+        self.conn.execute(self.schema)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def chunks(self, values):
+        values = list(values)
+        for i in range(0, len(values), self.max_variables):
+            yield values[i:i + self.max_variables]
+
+
+class ContentHashStore(SqliteStore):
+    """
+    Store content hash of objects written to GraphQL or Elasticsearch to skip writing unchanged ones
+
+    Objects are keyed by (id, signature) where signature identifies the backend and the set of written fields,
+    so that partial updates of the same id (ex. Bill.reason) are tracked independently
+    """
+
+    schema = 'CREATE TABLE IF NOT EXISTS content_hash (' \
+             'id TEXT, signature TEXT, hash TEXT, PRIMARY KEY (id, signature))'
+
+    def find_changed(self, entries):
+        """
+        :param entries: list of (id, signature, hash)
+        :return: set of (id, signature) whose hash is different from the stored one
+        """
+
+        stored = dict()
+        for ids in self.chunks({entry[0] for entry in entries}):
+            query = 'SELECT id, signature, hash FROM content_hash WHERE id IN ({})'.format(','.join('?' * len(ids)))
+            for id_, signature, hash_ in self.conn.execute(query, ids):
+                stored[(id_, signature)] = hash_
+        return {(id_, signature) for id_, signature, hash_ in entries if stored.get((id_, signature)) != hash_}
+
+    def update(self, entries):
+        self.conn.executemany('INSERT OR REPLACE INTO content_hash (id, signature, hash) VALUES (?, ?, ?)', entries)
+        self.conn.commit()
+
+    def invalidate(self, ids):
+        for chunk in self.chunks(ids):
+            query = 'DELETE FROM content_hash WHERE id IN ({})'.format(','.join('?' * len(chunk)))
+            self.conn.execute(query, chunk)
+        self.conn.commit()
+
+
+class KeyphraseCache(SqliteStore):
+    """
+    Cache keyphrases extracted from texts to skip recomputing them for unchanged speeches
+
+    Entries are keyed by the hash of the text, the number of keyphrases and the version of the extractor.
+    Least recently used entries are evicted when the cache exceeds max_entries.
+    """
+
+    schema = 'CREATE TABLE IF NOT EXISTS keyphrase_cache (' \
+             'key TEXT PRIMARY KEY, keyphrases TEXT, accessed_at INTEGER)'
+
+    def __init__(self, path, max_entries=1000000, version=None):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.version = version or get_keyphrase_extractor_version()
+        # logical clock for LRU, which is incremented on every access unlike wall clock
+        self.clock = self.conn.execute('SELECT MAX(accessed_at) FROM keyphrase_cache').fetchone()[0] or 0
+
+    def build_key(self, text, num_keyphrases):
+        body = f'{self.version}:{num_keyphrases}:{text}'
+        return hashlib.md5(body.encode('UTF-8')).hexdigest()
+
+    def get(self, keys):
+        """
+        :return: dict from key to list of keyphrases for the cached keys
+        """
+
+        key2keyphrases = dict()
+        for chunk in self.chunks(set(keys)):
+            query = 'SELECT key, keyphrases FROM keyphrase_cache WHERE key IN ({})'.format(','.join('?' * len(chunk)))
+            for key, keyphrases in self.conn.execute(query, chunk):
+                key2keyphrases[key] = json.loads(keyphrases)
+        if key2keyphrases:
+            self.clock += 1
+            self.conn.executemany('UPDATE keyphrase_cache SET accessed_at = ? WHERE key = ?',
+                                  [(self.clock, key) for key in key2keyphrases])
+            self.conn.commit()
+        return key2keyphrases
+
+    def update(self, key2keyphrases):
+        self.clock += 1
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO keyphrase_cache (key, keyphrases, accessed_at) VALUES (?, ?, ?)',
+            [(key, json.dumps(keyphrases, ensure_ascii=False), self.clock) for key, keyphrases in key2keyphrases.items()])
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        num_entries = self.conn.execute('SELECT COUNT(*) FROM keyphrase_cache').fetchone()[0]
+        if num_entries > self.max_entries:
+            self.conn.execute(
+                'DELETE FROM keyphrase_cache WHERE key IN '
+                '(SELECT key FROM keyphrase_cache ORDER BY accessed_at LIMIT ?)', (num_entries - self.max_entries,))
+            self.conn.commit()
+            LOGGER.info(f'evicted {num_entries - self.max_entries} keyphrase cache entries')
+
+
+class SeenIdStore(SqliteStore):
+    """
+    Store ids of source pages already ingested to skip fetching them again in the following runs
+
+    Ids are grouped by namespace (ex. spider name) and sharded by the day they are listed,
+    so that ids of a day range can be loaded at once.
+    """
+
+    schema = 'CREATE TABLE IF NOT EXISTS seen_id (' \
+             'namespace TEXT, id TEXT, day TEXT, PRIMARY KEY (namespace, id))'
+
+    def __init__(self, path, namespace):
+        super().__init__(path)
+        self.namespace = namespace
+        self.conn.execute('CREATE INDEX IF NOT EXISTS seen_id_day ON seen_id (namespace, day)')
+        self.conn.commit()
+
+    def get_days(self, start_day, end_day):
+        """
+        :param start_day: inclusive day in %Y-%m-%d
+        :param end_day: exclusive day in %Y-%m-%d
+        :return: set of ids listed in the days
+        """
+
+        query = 'SELECT id FROM seen_id WHERE namespace = ? AND ? <= day AND day < ?'
+        return {id_ for id_, in self.conn.execute(query, (self.namespace, start_day, end_day))}
+
+    def find_seen(self, ids):
+        """
+        :return: set of ids already stored
+        """
+
+        seen_ids = set()
+        for chunk in self.chunks(set(ids)):
+            query = 'SELECT id FROM seen_id WHERE namespace = ? AND id IN ({})'.format(','.join('?' * len(chunk)))
+            seen_ids.update(id_ for id_, in self.conn.execute(query, [self.namespace] + chunk))
+        return seen_ids
+
+    def add(self, id2day):
+        self.conn.executemany('INSERT OR REPLACE INTO seen_id (namespace, id, day) VALUES (?, ?, ?)',
+                              [(self.namespace, id_, day) for id_, day in id2day.items()])
+        self.conn.commit()
+
+
+def get_keyphrase_extractor_version():
+    """
+    KeyPhraseExtractor is versioned by the politylink package which provides it
+    """
+
+    try:
+        return metadata.version('politylink')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def build_content_hash_entry(id_, backend, content: dict):
+    """
+    :return: (id, signature, hash) of the content to be written to the backend
+    """
+
+    signature = '{}:{}'.format(backend, ','.join(sorted(content.keys())))
+    body = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+    return id_, signature, hashlib.md5(body.encode('UTF-8')).hexdigest()
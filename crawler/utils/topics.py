@@ -106,11 +106,13 @@ def clean_committee_topic(topic):
     return topic
 
 
-def extract_topic_ids(speech, bill_id2names):
-    topic_ids = []
-    for bill_id, bill_name in bill_id2names.items():
-        if bill_name in speech:
-            topic_ids.append(bill_id)
+def extract_topic_ids(speech, bill_matcher):
+    """
+    :param bill_matcher: BillNameMatcher built once from all the bills
+    :return: ids of bills whose name is contained in the speech
+    """
+
+    topic_ids = bill_matcher.find_ids(speech)
     if len(topic_ids) > 1:
         LOGGER.debug(f'found multiple topics: speech={speech}, topic_ids={topic_ids}')
     return topic_ids
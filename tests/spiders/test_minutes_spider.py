@@ -1,8 +1,19 @@
+import json
 from datetime import datetime
+from types import SimpleNamespace
 
+from scrapy import Request
+from scrapy.http import TextResponse
+from scrapy.settings import Settings
+from scrapy.statscollectors import StatsCollector
+
+from crawler.items import MergeItem, IndexItem, CheckpointItem, MutationItem, KeyphraseItem, build_merge_item, \
+    build_index_item, build_keyphrase_item, build_link_item
 from crawler.spiders.minutes_spider import MinutesSpider
-from crawler.utils import build_minutes, build_speech
-from politylink.graphql.schema import BillActionType
+from crawler.utils import build_minutes, build_speech, build_minutes_activity, BillNameMatcher, SpeechRecord, BillIndex
+from politylink.elasticsearch.schema import MinutesText
+from politylink.graphql.schema import BillActionType, Bill
+from tests.test_pipelines import TestPersistencePipeline
 
 
 class TestMinutesSpider:
@@ -25,13 +36,126 @@ class TestMinutesSpider:
         minutes.topic_ids = ['Bill:A', 'Bill:B', 'Bill:D']
         bill_id2name = {'Bill:A': '法律案A', 'Bill:B': '法律案B', 'Bill:D': '法律案D'}
 
-        bill_actions = MinutesSpider.scrape_bill_actions(speech_recs, minutes, bill_id2name)
+        bill_actions = MinutesSpider.scrape_bill_actions(speech_recs, minutes, BillNameMatcher(bill_id2name))
         assert len(bill_actions) == 4
         self.assert_bill_action('Bill:A', minutes.id, 2, BillActionType.QUESTION, bill_actions[0])
         self.assert_bill_action('Bill:B', minutes.id, 2, BillActionType.QUESTION, bill_actions[1])
         self.assert_bill_action('Bill:D', minutes.id, 7, BillActionType.BILL_EXPLANATION, bill_actions[2])
         self.assert_bill_action('Bill:D', minutes.id, 8, BillActionType.VOTE, bill_actions[3])
 
+    def test_build_fanout_requests(self):
+        spider = MinutesSpider.__new__(MinutesSpider)
+        spider.windows = [('2021-01-01', '2021-01-31'), ('2021-02-01', '2021-02-28')]
+        spider.page_size = 10
+
+        requests = spider.build_fanout_requests(0, {'numberOfRecords': 35, 'nextRecordPosition': 11})
+        assert [request.url for request in requests] == [spider.build_url(0, pos) for pos in [11, 21, 31]]
+        assert requests[0].priority > requests[-1].priority
+        assert spider.build_request(0, 31).priority > spider.build_request(1, 1).priority
+        assert spider.build_fanout_requests(0, {'numberOfRecords': 8, 'nextRecordPosition': None}) == []
+
+    def test_select_issue_ids(self):
+        minutes = build_minutes('衆議院本会議', datetime(2021, 1, 1))
+        spider = MinutesSpider.__new__(MinutesSpider)
+        spider.ingested_issue_ids = {'ingested', 'updated', 'empty'}
+        spider.gql_client = type('GraphQLClient', (), {
+            'bulk_get': lambda self, ids, fields: [build_speech(minutes.id, 2)]})()
+
+        meeting_recs = [self.build_meeting_rec(issue_id, num_speeches) for issue_id, num_speeches in
+                        [('new', 3), ('ingested', 3), ('updated', 5), ('empty', 1)]]
+        assert spider.select_issue_ids(meeting_recs) == ['new', 'updated']
+
+    def test_scrape_meeting(self):
+        spider = self.build_scraping_spider()
+        meeting_rec = self.build_full_meeting_rec('issue', 6)
+
+        items = list(spider.scrape_meeting(meeting_rec))
+        speech_items = [item for item in items if isinstance(item, MergeItem) and item['objects']
+                        and isinstance(item['objects'][0], SpeechRecord)]
+        assert [len(item['objects']) for item in speech_items] == [2, 2, 1]
+        minutes_texts = [text for item in items if isinstance(item, IndexItem) for text in item['texts']
+                         if isinstance(text, MinutesText)]
+        assert minutes_texts[0].body == 'にゃー' * 5
+
+    def test_parse_checkpoint_ids(self):
+        spider = self.build_scraping_spider()
+        spider.windows, spider.fanout, spider.page_size = [('2021-01-01', '2021-01-31')], False, 1
+        page2items = dict()
+        for pos, date in [(1, '2021-01-01'), (2, '2021-01-02')]:
+            body = {'numberOfRecords': 2, 'nextRecordPosition': None,
+                    'meetingRecord': [self.build_full_meeting_rec(f'issue{pos}', 3, date)]}
+            request = Request(spider.build_url(0, pos), meta={'window_index': 0, 'pos': pos})
+            response = TextResponse(request.url, body=json.dumps(body).encode(), request=request)
+            page2items[pos] = [item for item in spider.parse(response) if not isinstance(item, Request)]
+
+        # one mutation per response, followed by the texts and the checkpoint
+        assert [type(item) for item in page2items[2]] == [MutationItem, IndexItem, IndexItem, CheckpointItem]
+        checkpoint_item = page2items[2][-1]
+        minutes2 = build_minutes('衆議院本会議', datetime(2021, 1, 2))
+        speech2 = build_speech(minutes2.id, 1)
+        assert {minutes2.id, speech2.id}.issubset(checkpoint_item['ids'])
+
+        # a poison Speech of the second page does not block the checkpoint of the first page
+        pipeline = TestPersistencePipeline.build_pipeline(broken_ids={speech2.id})
+        pipeline.spider = type('Spider', (), {'states': [], 'on_checkpoint': lambda self, state: self.states.append(state)})()
+        items = page2items[1] + page2items[2]
+        failed_ids = set()
+        counter = pipeline.persist(items, failed_ids)
+        pipeline.notify_checkpoints(counter, items, failed_ids)
+        assert [state['pos'] for state in pipeline.spider.states] == [1]
+
+    def test_coalesce(self):
+        spider = MinutesSpider.__new__(MinutesSpider)
+        activity = build_minutes_activity('Member:1', 'Minutes:1', datetime(2021, 1, 1))
+        results = [build_merge_item([activity]), build_index_item([]), build_keyphrase_item([activity], ['猫'], 1),
+                   build_link_item([activity.id], ['Minutes:1']), CheckpointItem(state={})]
+        assert [type(item) for item in spider.coalesce(results)] == [
+            KeyphraseItem, MutationItem, IndexItem, CheckpointItem]
+
+    def test_get_topic_ids_stats(self):
+        bill = Bill(None)
+        bill.id, bill.name, bill.bill_number = 'Bill:1', '猫の保護に関する法律案', '第204回国会閣法第1号'
+        bill_index = BillIndex(bills=[bill], diets=[])
+        spiders = [MinutesSpider.__new__(MinutesSpider) for _ in range(2)]
+        for spider in spiders:
+            spider.bill_finder = bill_index  # shared in the process
+            spider.crawler = SimpleNamespace(stats=StatsCollector(SimpleNamespace(settings=Settings())))
+
+        assert spiders[0].get_topic_ids(['猫の保護に関する法律案', '外交に関する件'], None) == ['Bill:1', '']
+        assert spiders[1].get_topic_ids(['猫の保護に関する法律案'], None) == ['Bill:1']
+        assert spiders[0].crawler.stats.get_stats() == {'bill_index/hit': 1, 'bill_index/miss': 1}
+        assert spiders[1].crawler.stats.get_stats() == {'bill_index/hit': 1}
+        assert bill_index.stats == {'hit': 2, 'miss': 1}
+
+    def build_scraping_spider(self):
+        spider = MinutesSpider.__new__(MinutesSpider)
+        spider.collect_text, spider.collect_speech_text, spider.collect_keyphrase = True, True, False
+        spider.overwrite_url, spider.speech_chunk_size, spider.bill_matcher = False, 2, BillNameMatcher(dict())
+        spider.member_finder = spider.committee_finder = type('Finder', (), {'find_one': self.raise_value_error})()
+        return spider
+
+    def build_full_meeting_rec(self, issue_id, num_speeches, date='2021-01-01'):
+        meeting_rec = self.build_meeting_rec(issue_id, num_speeches)
+        meeting_rec['date'] = date
+        meeting_rec['meetingURL'] = f'https://kokkai.ndl.go.jp/txt/{issue_id}'
+        for speech_rec in meeting_rec['speechRecord']:
+            speech_rec.update({'speaker': '猫', 'speech': '○猫　にゃー', 'speechURL': 'https://google.com'})
+        return meeting_rec
+
+    @staticmethod
+    def raise_value_error(*args, **kwargs):
+        raise ValueError('not found')
+
+    @staticmethod
+    def build_meeting_rec(issue_id, num_speeches):
+        return {
+            'issueID': issue_id,
+            'nameOfHouse': '衆議院',
+            'nameOfMeeting': '本会議',
+            'date': '2021-01-01',
+            'speechRecord': [{'speechOrder': i} for i in range(num_speeches)]
+        }
+
     @staticmethod
     def assert_bill_action(bill_id, minutes_id, speech_order, bill_action_type, bill_action):
         assert bill_id == bill_action.bill_id
@@ -0,0 +1,76 @@
+from scrapy.http import HtmlResponse, Request
+
+from crawler.items import MergeItem, IndexItem, CheckpointItem
+from crawler.spiders.reuters_kyodo_spider import ReutersKyodoSpider
+from crawler.spiders.reuters_spider import ReutersSpider
+from crawler.utils import build_news
+from politylink.elasticsearch.schema import NewsText
+
+
+def build_list_response(url, news_urls):
+    body = '<section id="moreSectionNews">{}</section>'.format(
+        ''.join(f'<article><a href="{news_url}">news</a></article>' for news_url in news_urls))
+    return HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+
+
+def test_parse_incremental(tmp_path):
+    seen_store = str(tmp_path / 'seen.sqlite')
+    spider = ReutersSpider(limit=100, seen_store=seen_store)
+    spider.seen_store.add({'https://jp.reuters.com/article/idJP1': '2021-01-01'})
+
+    url = spider.build_next_url()
+    results = list(spider.parse(build_list_response(url, ['/article/idJP1?il=0', '/article/idJP2', '/article/idJP2'])))
+    assert [result.url for result in results] == [
+        'https://jp.reuters.com/article/idJP2',
+        'https://jp.reuters.com/news/archive/politicsNews?view=page&page=2&pageSize=10'
+    ]
+
+    # reuters_kyodo shares the saved news with reuters
+    spider.on_checkpoint({'https://jp.reuters.com/article/idJP2': '2021-01-02'})
+    spider = ReutersKyodoSpider(limit=100, seen_store=seen_store)
+    url = spider.build_next_url()
+    assert list(spider.parse(build_list_response(url, ['/article/idJP1', '/article/idJP2/']))) == []
+
+
+def test_parse_overlapping_pages(tmp_path):
+    spider = ReutersSpider(limit=100, seen_store=str(tmp_path / 'seen.sqlite'))
+    results = list(spider.parse(build_list_response(spider.build_next_url(), ['/article/idJP1', '/article/idJP2'])))
+    assert len(results) == 3
+
+    # news scheduled on the previous page are not requested again, but do not stop pagination
+    results = list(spider.parse(build_list_response(results[-1].url, ['/article/idJP2', '/article/idJP1'])))
+    assert [result.url for result in results] == [
+        'https://jp.reuters.com/news/archive/politicsNews?view=page&page=3&pageSize=10'
+    ]
+
+
+def test_parse_news_checkpoint(tmp_path, monkeypatch):
+    spider = ReutersSpider(limit=100, seen_store=str(tmp_path / 'seen.sqlite'))
+    news = build_news('https://jp.reuters.com/article/idJP3', spider.publisher)
+    monkeypatch.setattr(spider, 'scrape_news_and_text', lambda response: (news, NewsText({'id': news.id})))
+    monkeypatch.setattr('crawler.spiders.validate_news_or_raise', lambda news: None)
+    monkeypatch.setattr('crawler.spiders.validate_news_text_or_raise', lambda news_text: None)
+
+    request = Request('https://jp.reuters.com/article/idJP3', meta={'redirect_urls': ['https://jp.reuters.com/idJP3']})
+    response = HtmlResponse(request.url, body=b'', request=request)
+    results = list(spider.parse_news(response))
+    assert [type(result) for result in results] == [MergeItem, IndexItem, CheckpointItem]
+    assert set(results[2]['state']) == {'https://jp.reuters.com/idJP3', 'https://jp.reuters.com/article/idJP3'}
+
+
+def test_build_file_requests(tmp_path):
+    file = tmp_path / 'reuters.csv'
+    file.write_text(''.join(f'https://jp.reuters.com/article/idJP{i}\n' for i in range(250)) + '\n')
+    seen_store = str(tmp_path / 'seen.sqlite')
+
+    spider = ReutersSpider(limit=100, file=str(file), seen_store=seen_store)
+    spider.seen_store.add({'https://jp.reuters.com/article/idJP0': '2021-01-01'})
+    requests = spider.start_requests()
+    assert next(requests).url == 'https://jp.reuters.com/article/idJP1'  # read lazily
+    assert len(list(requests)) == 248
+
+    urls = []
+    for i in range(3):
+        spider = ReutersSpider(limit=100, file=str(file), shard=f'{i}/3', seen_store=seen_store)
+        urls += [request.url for request in spider.start_requests()]
+    assert len(urls) == len(set(urls)) == 249
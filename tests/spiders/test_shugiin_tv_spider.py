@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from scrapy.http import HtmlResponse, Request
+
+from crawler.spiders.shugiin_tv_spider import ShugiinTvSpider
+
+
+def test_parse_skip_seen(tmp_path):
+    seen_store = str(tmp_path / 'seen.sqlite')
+    spider = ShugiinTvSpider('2021-01-01', '2021-01-03', seen_store=seen_store)
+    spider.seen_store.add({'100': '2021-01-01'})
+    spider = ShugiinTvSpider('2021-01-01', '2021-01-03', seen_store=seen_store)
+    assert [request.meta['day'] for request in spider.start_requests()] == ['2021-01-01', '2021-01-02']
+
+    body = ''.join(f'<table><tr><td><a href="index.php?ex=VL&deli_id={x}">{x}</a></td></tr></table>'
+                   for x in ['100', '101', '102'])
+    for day in ['2021-01-01', '2021-01-02']:
+        url = spider.build_start_url(datetime.strptime(day, '%Y-%m-%d'))
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url, meta={'day': day}))
+        requests = list(spider.parse(response))
+        deli_ids = [request.meta['deli_id'] for request in requests]
+        assert deli_ids == (['101', '102'] if day == '2021-01-01' else [])
+
+    spider.on_checkpoint({'101': '2021-01-01'})
+    assert spider.seen_store.get_days('2021-01-01', '2021-01-02') == {'100', '101'}
+
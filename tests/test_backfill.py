@@ -0,0 +1,17 @@
+from crawler.backfill import build_report
+
+
+def test_build_report():
+    results = [
+        {'window': ['2020-01-01', '2020-03-30'], 'finish_reason': 'finished',
+         'stats': {'item_scraped_count': 10, 'persistence/merged': 100, 'elapsed_time_seconds': 30.0,
+                   'memusage/max': 200}, 'error': None},
+        {'window': ['2020-03-31', '2020-06-28'], 'finish_reason': 'shutdown',
+         'stats': {'item_scraped_count': 5, 'elapsed_time_seconds': 20.0, 'memusage/max': 300}, 'error': None},
+        {'window': ['2020-06-29', '2020-09-26'], 'finish_reason': None, 'stats': {}, 'error': 'Traceback'},
+    ]
+    report = build_report(results)
+    assert report['num_windows'] == 3
+    assert report['stats'] == {'elapsed_time_seconds': 30.0, 'item_scraped_count': 15, 'memusage/max': 300,
+                               'persistence/merged': 100}
+    assert [failure['window'][0] for failure in report['failures']] == ['2020-03-31', '2020-06-29']
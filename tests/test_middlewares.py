@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from scrapy import Request
+from scrapy.http import Response
+
+from crawler.middlewares import DomainPolicyMiddleware, build_domain_policies
+from crawler.spiders.minutes_spider import MinutesSpider
+
+
+class FakeSlot:
+    def __init__(self, delay):
+        self.delay = delay
+
+
+class FakeCrawler:
+    def __init__(self, slots=None):
+        self.settings = SimpleNamespace(getfloat=lambda name, default=None: default)
+        self.engine = SimpleNamespace(downloader=SimpleNamespace(per_slot_settings=dict(), slots=slots or dict()))
+
+
+def build_middleware(slots=None):
+    policies = build_domain_policies({
+        'ndl.go.jp': {'concurrency': 4, 'delay': 0.25, 'autothrottle_target': 2.0, 'retry_times': 5},
+        'sangiin.go.jp': {},
+        'webtv.sangiin.go.jp': {'concurrency': 2},
+    }, {'concurrency': 1, 'delay': 1, 'retry_times': 2})
+    return DomainPolicyMiddleware(FakeCrawler(slots), policies, {'concurrency': 1, 'delay': 1})
+
+
+def test_process_request():
+    middleware = build_middleware()
+    spider = SimpleNamespace(name='minutes', domain='ndl.go.jp', max_concurrent_requests=8)
+    middleware.spider_opened(spider)
+    assert middleware.crawler.engine.downloader.per_slot_settings == {
+        'ndl.go.jp': {'concurrency': 8, 'delay': 0.25},
+        'sangiin.go.jp': {'concurrency': 1, 'delay': 1.0},
+        'webtv.sangiin.go.jp': {'concurrency': 2, 'delay': 1.0},
+    }
+
+    request = Request('https://kokkai.ndl.go.jp/api/meeting')
+    middleware.process_request(request, spider)
+    assert request.meta['download_slot'] == 'ndl.go.jp'
+    assert request.meta['max_retry_times'] == 5
+    assert request.meta['autothrottle_dont_adjust_delay']
+
+    request = Request('https://webtv.sangiin.go.jp/webtv/detail.php', meta={'max_retry_times': 0})
+    middleware.process_request(request, spider)
+    assert request.meta['download_slot'] == 'webtv.sangiin.go.jp'
+    assert request.meta['max_retry_times'] == 0
+
+    request = Request('https://example.com/')
+    middleware.process_request(request, spider)
+    assert 'download_slot' not in request.meta
+
+
+def test_minutes_fanout_concurrency(tmp_path):
+    # spider.max_concurrent_requests is no longer read by the downloader, so it is applied as slot settings
+    for fanout, concurrency in [('true', 3), ('false', 1)]:
+        middleware = build_middleware()
+        spider = MinutesSpider('2021-01-01', '2021-01-31', fanout=fanout, concurrency='3',
+                               checkpoint=str(tmp_path / 'minutes.checkpoint.json'))
+        middleware.spider_opened(spider)
+        assert middleware.crawler.engine.downloader.per_slot_settings['ndl.go.jp']['concurrency'] == concurrency
+
+
+def test_process_response():
+    slot = FakeSlot(delay=0.25)
+    middleware = build_middleware(slots={'ndl.go.jp': slot})
+    request = Request('https://kokkai.ndl.go.jp/api/meeting', meta={'download_slot': 'ndl.go.jp'})
+
+    request.meta['download_latency'] = 3.0
+    middleware.process_response(request, Response(request.url, status=200), None)
+    assert slot.delay == 1.5  # latency / autothrottle_target
+
+    request.meta['download_latency'] = 0.1
+    middleware.process_response(request, Response(request.url, status=500), None)
+    assert slot.delay == 1.5  # not reduced by error responses
+    middleware.process_response(request, Response(request.url, status=200), None)
+    assert slot.delay == 0.775
@@ -0,0 +1,240 @@
+from datetime import datetime
+
+from crawler.items import build_merge_item, build_link_item, build_index_item, build_replace_urls_item, \
+    build_keyphrase_item, LinkAccumulator, CheckpointItem
+from crawler.pipelines import PersistencePipeline
+from crawler.utils import build_url, UrlTitle, ContentHashStore, KeyphraseCache, build_minutes_activity, build_news
+from politylink.elasticsearch.client import OpType
+from politylink.elasticsearch.schema import MinutesText, NewsText
+
+
+class FakeGraphQLClient:
+    def __init__(self, broken_ids=None):
+        self.broken_ids = broken_ids or set()
+        self.calls = []
+
+    def bulk_mutation(self, op_builders):
+        merge_ids, links = [], []
+        for op_builder in op_builders:
+            if 'obj' in op_builder.keywords:
+                merge_ids.append(op_builder.keywords['obj'].id)
+            else:
+                links.append((op_builder.keywords['from_id'], op_builder.keywords['to_id']))
+        if self.broken_ids.intersection(merge_ids):
+            raise Exception('broken object')
+        self.calls.append(('mutation', merge_ids, links))
+
+    def bulk_get(self, ids, fields=None):
+        self.calls.append(('bulk_get', ids))
+        urls = [
+            build_url('https://example.com/old', UrlTitle.HONBUN, 'example.com'),
+            build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com'),
+            build_url('https://example.com/keika', UrlTitle.KEIKA, 'example.com'),
+        ]
+        return [type('Obj', (), {'id': id_, 'urls': urls}) for id_ in ids if id_ == 'Bill:1']
+
+    def bulk_delete(self, ids):
+        self.calls.append(('bulk_delete', ids))
+
+    def bulk_unlink(self, from_ids, to_ids):
+        self.calls.append(('bulk_unlink', list(zip(from_ids, to_ids))))
+
+    @staticmethod
+    def build_merge_operation(obj, op=None):
+        return op
+
+    @staticmethod
+    def build_link_operation(from_id, to_id, op=None):
+        return op
+
+
+class FakeElasticsearchClient:
+    def __init__(self):
+        self.calls = []
+
+    def bulk_index(self, objects, op_type=OpType.INDEX):
+        self.calls.append(('bulk_index', [obj.id for obj in objects]))
+
+    def index(self, obj, op_type=OpType.INDEX):
+        self.calls.append(('index', obj.id))
+
+
+class TestPersistencePipeline:
+    def test_persist(self):
+        pipeline = self.build_pipeline()
+        url1 = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+        url2 = build_url('https://example.com/2', UrlTitle.HONBUN, 'example.com')
+        items = [
+            build_merge_item([url1]),
+            build_link_item([url1.id], ['Bill:1']),
+            build_merge_item([url2]),
+            build_link_item([url1.id], ['Bill:1']),
+            build_index_item([MinutesText({'id': 'Minutes:1'})]),
+            build_index_item([MinutesText({'id': 'Minutes:2'})], op_type=OpType.MERGE),
+        ]
+
+        counter = pipeline.persist(items)
+        assert counter == {'merged': 2, 'linked': 2, 'indexed': 2}
+        assert pipeline.gql_client.calls == [('mutation', [url1.id, url2.id], [(url1.id, 'Bill:1')])]
+        assert pipeline.es_client.calls == [('bulk_index', ['Minutes:1']), ('index', 'Minutes:2')]
+
+    def test_persist_replace_urls(self):
+        pipeline = self.build_pipeline()
+        url1 = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+        url1.to_id = 'Bill:1'
+        url2 = build_url('https://example.com/2', UrlTitle.HONBUN, 'example.com')
+        url2.to_id = 'Bill:2'
+        old_url = build_url('https://example.com/old', UrlTitle.HONBUN, 'example.com')
+
+        counter = pipeline.persist([build_replace_urls_item(['Bill:1', 'Bill:2'], UrlTitle.HONBUN, [url1, url2])])
+        assert counter == {'deleted': 1, 'merged': 1, 'linked': 1}
+        assert pipeline.gql_client.calls == [
+            ('bulk_get', ['Bill:1', 'Bill:2']),
+            ('bulk_delete', [old_url.id]),  # keika url is kept because the title is different
+            ('mutation', [url2.id], [(url2.id, 'Bill:2')]),  # url1 is already linked
+        ]
+
+    def test_persist_replace_shared_urls(self):
+        pipeline = self.build_pipeline()
+        url1 = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+        url1.to_id = 'Bill:1'
+        shared_url = build_url('https://example.com/old', UrlTitle.HONBUN, 'example.com')
+        shared_url.to_id = 'Bill:3'  # dropped by Bill:1 but still used by Bill:3
+        orphan_url = build_url('https://example.com/orphan', UrlTitle.HONBUN, 'example.com')
+        orphan_url.to_id = 'Bill:4'
+
+        counter = pipeline.persist([
+            build_replace_urls_item(['Bill:1'], UrlTitle.HONBUN, [url1, orphan_url]),
+            build_replace_urls_item(['Bill:3'], UrlTitle.HONBUN, [shared_url]),
+        ])
+        assert counter == {'unlinked': 1, 'merged': 1, 'linked': 1}
+        assert pipeline.gql_client.calls == [
+            ('bulk_get', ['Bill:1', 'Bill:3']),
+            ('bulk_unlink', [(shared_url.id, 'Bill:1')]),
+            ('mutation', [shared_url.id], [(shared_url.id, 'Bill:3')]),
+        ]
+
+    def test_persist_replace_urls_require_parents(self):
+        pipeline = self.build_pipeline()
+        url1 = build_url('https://example.com/vrsdd/1', UrlTitle.VRSDD, 'example.com')
+        url1.to_id = 'Bill:1'
+        url2 = build_url('https://example.com/vrsdd/2', UrlTitle.VRSDD, 'example.com')
+        url2.to_id = 'Bill:2'  # does not exist
+
+        counter = pipeline.persist([
+            build_replace_urls_item(['Bill:1'], UrlTitle.VRSDD, [url1], require_parents=True),
+            build_replace_urls_item(['Bill:2'], UrlTitle.VRSDD, [url2], require_parents=True),
+        ])
+        assert counter == {'merged': 1, 'linked': 1}
+        assert pipeline.gql_client.calls == [
+            ('bulk_get', ['Bill:1', 'Bill:2']),
+            ('mutation', [url1.id], [(url1.id, 'Bill:1')]),
+        ]
+
+    def test_persist_isolate_failure(self):
+        url1 = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+        url2 = build_url('https://example.com/2', UrlTitle.HONBUN, 'example.com')
+        pipeline = self.build_pipeline(broken_ids={url1.id})
+
+        counter = pipeline.persist([build_merge_item([url1]), build_merge_item([url2])])
+        assert counter == {'merged': 1, 'failed': 1}
+        assert pipeline.gql_client.calls == [('mutation', [url2.id], [])]
+
+    def test_persist_skip_unchanged(self, tmp_path):
+        url1 = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+        url2 = build_url('https://example.com/2', UrlTitle.HONBUN, 'example.com')
+        pipeline = self.build_pipeline(hash_store=ContentHashStore(str(tmp_path / 'hash.sqlite')))
+
+        counter = pipeline.persist([build_merge_item([url1]), build_index_item([MinutesText({'id': 'Minutes:1'})])])
+        assert counter == {'merged': 1, 'indexed': 1}
+
+        url1.domain = 'example.jp'
+        counter = pipeline.persist([
+            build_merge_item([url1, url2]),
+            build_link_item([url2.id], ['Bill:1']),
+            build_index_item([MinutesText({'id': 'Minutes:1'})])
+        ])
+        assert counter == {'merged': 2, 'linked': 1, 'skipped_index': 1}
+
+        counter = pipeline.persist([build_merge_item([url1, url2]), build_link_item([url2.id], ['Bill:1'])])
+        assert counter == {'linked': 1, 'skipped_merge': 2}
+        assert pipeline.gql_client.calls[-1] == ('mutation', [], [(url2.id, 'Bill:1')])
+
+    def test_persist_keyphrases(self, monkeypatch, tmp_path):
+        calls = []
+
+        def extract_keyphrases(texts, num_keyphrases):
+            calls.append(texts)
+            if '壊れた' in texts:
+                raise Exception('broken text')
+            return [text.split()[:num_keyphrases] for text in texts]
+
+        monkeypatch.setattr('crawler.pipelines.extract_keyphrases', extract_keyphrases)
+        pipeline = self.build_pipeline()
+        pipeline.keyphrase_cache = KeyphraseCache(str(tmp_path / 'keyphrase.sqlite'))
+        pipeline.keyphrase_workers, pipeline.keyphrase_chunk_size = 0, 1
+        activities = [build_minutes_activity(f'Member:{i}', 'Minutes:1', datetime(2021, 1, 1)) for i in range(3)]
+        items = [build_keyphrase_item(activities, ['猫 犬 鳥 魚', '壊れた', '猫'], 2), build_merge_item(activities)]
+
+        counter = pipeline.persist(items)
+        assert counter == {'keyphrased': 2, 'merged': 3}
+        assert activities[0].keyphrases == ['猫', '犬']
+        assert not hasattr(activities[1], 'keyphrases')
+        assert activities[2].keyphrases == ['猫']
+
+        calls.clear()
+        counter = pipeline.persist(items)
+        assert counter == {'keyphrase_cache_hit': 2, 'merged': 3}
+        assert calls == [['壊れた']]
+
+    def test_notify_checkpoints(self):
+        pipeline = self.build_pipeline()
+        pipeline.spider = type('Spider', (), {'states': [], 'on_checkpoint': lambda self, state: self.states.append(state)})()
+        url = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+        items = [build_merge_item([url]), CheckpointItem(state={'pos': 1})]
+
+        pipeline.notify_checkpoints({'merged': 1, 'failed': 1}, items)
+        assert pipeline.spider.states == []
+        pipeline.notify_checkpoints({'merged': 1}, items)
+        assert pipeline.spider.states == [{'pos': 1}]
+
+    def test_persist_isolate_news(self):
+        news1 = build_news('https://example.com/news/1', 'example')
+        news2 = build_news('https://example.com/news/2', 'example')
+        pipeline = self.build_pipeline(broken_ids={news1.id})
+        pipeline.spider = type('Spider', (), {'states': [], 'on_checkpoint': lambda self, state: self.states.append(state)})()
+        items = []
+        for news in [news1, news2]:
+            items += [build_merge_item([news]), build_index_item([NewsText({'id': news.id})]),
+                      CheckpointItem(state={news.url: '2021-01-01'}, ids=[news.id])]
+
+        failed_ids = set()
+        counter = pipeline.persist(items, failed_ids)
+        assert counter == {'merged': 1, 'indexed': 1, 'failed': 2}
+        assert failed_ids == {news1.id}
+        assert pipeline.es_client.calls == [('bulk_index', [news2.id])]  # NewsText of the failed News is not indexed
+        pipeline.notify_checkpoints(counter, items, failed_ids)
+        assert pipeline.spider.states == [{news2.url: '2021-01-01'}]
+
+    @staticmethod
+    def build_pipeline(broken_ids=None, hash_store=None):
+        pipeline = PersistencePipeline(hash_store=hash_store)
+        pipeline.gql_client = FakeGraphQLClient(broken_ids)
+        pipeline.es_client = FakeElasticsearchClient()
+        return pipeline
+
+
+def test_link_accumulator():
+    accumulator = LinkAccumulator()
+    assert accumulator.flush() == []
+
+    url = build_url('https://example.com/1', UrlTitle.HONBUN, 'example.com')
+    accumulator.add(build_merge_item([url]))
+    accumulator.add(build_link_item([url.id, 'Minutes:1'], ['Bill:1', 'Committee:1']))
+    accumulator.add(build_link_item([url.id], ['Bill:1']))
+    items = accumulator.flush()
+    assert len(items) == 1
+    assert items[0]['objects'] == [url]
+    assert items[0]['from_ids'] == [url.id, 'Minutes:1']
+    assert items[0]['to_ids'] == ['Bill:1', 'Committee:1']
+    assert accumulator.flush() == []
@@ -0,0 +1,18 @@
+import pytest
+
+from crawler.runner import resolve_spider_names, parse_key_values, SPIDER_GROUPS
+
+
+def test_resolve_spider_names():
+    assert resolve_spider_names(['caa', 'shugiin'], ['bill_url']) == SPIDER_GROUPS['bill_url'] + ['shugiin']
+    assert resolve_spider_names(['shugiin', 'shugiin']) == ['shugiin']
+    with pytest.raises(ValueError):
+        resolve_spider_names([], ['unknown'])
+
+
+def test_parse_key_values():
+    assert parse_key_values(['diet=204', 'url=https://example.com/?a=b']) == {
+        'diet': '204', 'url': 'https://example.com/?a=b'}
+    assert parse_key_values(None) == {}
+    with pytest.raises(ValueError):
+        parse_key_values(['diet'])
@@ -0,0 +1,28 @@
+from crawler.utils.checkpoint import Checkpoint, PageFrontier, split_date_range
+
+
+def test_split_date_range():
+    assert split_date_range('2021-01-01', '2021-01-10', 0) == [('2021-01-01', '2021-01-10')]
+    assert split_date_range('2021-01-01', '2021-01-10', 4) == [
+        ('2021-01-01', '2021-01-04'), ('2021-01-05', '2021-01-08'), ('2021-01-09', '2021-01-10')]
+    assert split_date_range('2021-01-31', '2021-02-01', 1) == [('2021-01-31', '2021-01-31'), ('2021-02-01', '2021-02-01')]
+
+
+def test_page_frontier():
+    frontier = PageFrontier(num_windows=2)
+    assert not frontier.commit(0, 11, 21, 25, 'b')  # committed out of order
+    assert frontier.next_pos == 1
+    assert frontier.commit(0, 1, 11, 25, 'a')
+    assert (frontier.window_index, frontier.next_pos, frontier.last_issue_id) == (0, 21, 'b')
+    assert frontier.commit(0, 21, None, 25, 'c')
+    assert (frontier.window_index, frontier.next_pos, frontier.last_issue_id) == (1, 1, 'c')
+    assert frontier.commit(1, 1, None, 0)  # empty window
+    assert frontier.is_done()
+    assert frontier.last_issue_id == 'c'
+
+
+def test_checkpoint(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    assert checkpoint.load() is None
+    checkpoint.save({'window': ['2021-01-01', '2021-01-31'], 'next_pos': 11})
+    assert checkpoint.load() == {'window': ['2021-01-01', '2021-01-31'], 'next_pos': 11}
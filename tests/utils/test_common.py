@@ -1,4 +1,6 @@
-from crawler.utils.common import parse_name_str, clean_speech
+import pytest
+
+from crawler.utils.common import parse_name_str, clean_speech, parse_shard, in_shard
 
 
 def test_clean_speech():
@@ -10,3 +12,18 @@ def test_clean_speech():
 def test_parse_name_str():
     assert parse_name_str('逢沢　一郎（あいさわ　いちろう）') == ('一郎', '逢沢', 'いちろう', 'あいさわ')
     assert parse_name_str('蓮舫（れんほう）') == ('蓮舫', '', 'れんほう', '')
+
+
+def test_parse_shard():
+    assert parse_shard('0/4') == (0, 4)
+    assert parse_shard(' 3/4 ') == (3, 4)
+    for shard_str in ['4/4', '1', 'a/b']:
+        with pytest.raises(ValueError):
+            parse_shard(shard_str)
+
+
+def test_in_shard():
+    keys = [f'https://example.com/news/{i}' for i in range(100)]
+    shards = [[key for key in keys if in_shard(key, i, 3)] for i in range(3)]
+    assert sorted(key for shard in shards for key in shard) == sorted(keys)
+    assert all(shards)
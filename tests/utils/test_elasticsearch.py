@@ -1,6 +1,9 @@
 import pytest
 
-from crawler.utils.elasticsearch import build_bill_text
+from crawler.utils import elasticsearch
+from crawler.utils.elasticsearch import build_bill_text, BulkIndexer
+from politylink.elasticsearch.client import OpType, ElasticsearchException
+from politylink.elasticsearch.schema import SpeechText
 
 
 def test_build_bill_text():
@@ -26,3 +29,81 @@ def test_build_bill_text_fail():
     ]
     with pytest.raises(ValueError):
         build_bill_text('Bill:1', texts)
+
+
+class FakeIndicesClient:
+    def __init__(self):
+        self.index2interval = dict()
+        self.refreshed = []
+
+    def get_settings(self, index, name):
+        interval = self.index2interval.get(index)
+        return {index: {'settings': {'index': {'refresh_interval': interval}} if interval else {}}}
+
+    def put_settings(self, index, body):
+        self.index2interval[index] = body['index']['refresh_interval']
+
+    def refresh(self, index):
+        self.refreshed.append(index)
+
+
+class FakeElasticsearchClient:
+    def __init__(self):
+        self.client = self
+        self.indices = FakeIndicesClient()
+
+
+def build_speech_texts(n, body='発言'):
+    texts = []
+    for i in range(n):
+        text = SpeechText()
+        text.set(SpeechText.Field.ID, f'Speech:{i}')
+        text.set(SpeechText.Field.BODY, body)
+        texts.append(text)
+    return texts
+
+
+class TestBulkIndexer:
+    def test_split_chunks(self):
+        indexer = BulkIndexer(FakeElasticsearchClient(), max_docs=3, max_bytes=120)
+        actions = [indexer.build_action(text, OpType.INDEX) for text in build_speech_texts(5)]
+        actions.append(indexer.build_action(build_speech_texts(1, body='あ' * 100)[0], OpType.INDEX))
+        chunks = indexer.split_chunks(actions)
+        assert [len(chunk) for chunk, _ in chunks] == [3, 2, 1]  # too large document is sent alone
+        assert chunks[2][1] > 120
+
+    def test_index_retry_rejected(self, monkeypatch):
+        calls = []
+
+        def bulk(client, actions, **kwargs):
+            calls.append([action['_id'] for action in actions])
+            if len(calls) == 1:
+                return 1, [{'index': {'_id': 'Speech:1', 'status': 429}}]
+            return len(actions), []
+
+        monkeypatch.setattr(elasticsearch.helpers, 'bulk', bulk)
+        indexer = BulkIndexer(FakeElasticsearchClient(), max_workers=1, initial_backoff=0)
+        indexer.index(build_speech_texts(2))
+        assert calls == [['Speech:0', 'Speech:1'], ['Speech:1']]
+        stats = indexer.pop_stats()
+        assert stats['index_chunks'] == 1
+        assert stats['index_rejected'] == 1
+        assert not indexer.pop_stats()
+
+    def test_index_fail(self, monkeypatch):
+        monkeypatch.setattr(elasticsearch.helpers, 'bulk',
+                            lambda client, actions, **kwargs: (0, [{'index': {'_id': 'Speech:0', 'status': 400}}]))
+        indexer = BulkIndexer(FakeElasticsearchClient(), max_workers=1)
+        with pytest.raises(ElasticsearchException):
+            indexer.index(build_speech_texts(1))
+
+    def test_refresh(self, monkeypatch):
+        monkeypatch.setattr(elasticsearch.helpers, 'bulk', lambda client, actions, **kwargs: (len(actions), []))
+        es_client = FakeElasticsearchClient()
+        indexer = BulkIndexer(es_client, max_docs=1, max_workers=2, refresh=False)
+        indexer.index(build_speech_texts(3))
+        assert es_client.indices.index2interval == {SpeechText.index: '-1'}
+        assert indexer.pop_stats()['index_chunks'] == 3
+        indexer.close()
+        assert es_client.indices.index2interval == {SpeechText.index: None}
+        assert es_client.indices.refreshed == [SpeechText.index]
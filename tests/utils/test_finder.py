@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from crawler.utils.finder import MemberIndex, BillIndex, normalize_member_name
+from politylink.graphql.schema import Member, Bill, Diet, BillCategory, _Neo4jDateTime
+
+
+def test_normalize_member_name():
+    assert normalize_member_name('山田　太郎君') == '山田太郎'
+    assert normalize_member_name('山田委員') == '山田'
+    assert normalize_member_name('ヤマダ タロウ') == 'やまだたろう'
+
+
+class TestMemberIndex:
+    def test_find(self):
+        index = MemberIndex(members=[
+            self.build_member('Member:1', '山田 太郎', 'やまだたろう'),
+            self.build_member('Member:2', '山田花子', 'やまだはなこ'),
+            self.build_member('Member:3', '田中一郎', 'たなかいちろう'),
+        ])
+
+        assert index.find_one('山田太郎君', exact_match=True).id == 'Member:1'
+        assert index.find_one('ヤマダハナコ', exact_match=True).id == 'Member:2'
+        assert index.find('山田', exact_match=True) == []
+        assert {member.id for member in index.find('山田')} == {'Member:1', 'Member:2'}
+        assert {member.id for member in index.find('山田太郎君外2名、田中一郎君')} == {'Member:1', 'Member:3'}
+        assert index.find_one('田中一郎（自由民主党）').id == 'Member:3'
+        with pytest.raises(ValueError):
+            index.find_one('山田')
+
+    @staticmethod
+    def build_member(id_, name, name_hira):
+        member = Member(None)
+        member.id, member.name, member.name_hira = id_, name, name_hira
+        return member
+
+
+class TestBillIndex:
+    def test_find(self):
+        diets = [self.build_diet(203, datetime(2020, 10, 26), datetime(2020, 12, 5)),
+                 self.build_diet(204, datetime(2021, 1, 18), datetime(2021, 6, 16))]
+        index = BillIndex(bills=[
+            self.build_bill('Bill:1', '猫の保護に関する法律案', '第204回国会閣法第1号', BillCategory.KAKUHOU, [diets[1]]),
+            self.build_bill('Bill:2', '猫の保護に関する法律案', '第203回国会衆法第2号', BillCategory.SHUHOU, diets),
+            self.build_bill('Bill:3', '犬の保護に関する法律案', '第204回国会参法第3号', BillCategory.SANHOU, [diets[1]]),
+        ], diets=diets)
+
+        assert index.find_one('第二百四回国会閣法第一号').id == 'Bill:1'
+        assert index.find_one('猫の保護に関する法律案', exact_match=True, diet_number=203).id == 'Bill:2'
+        assert index.find_one('猫の保護に関する　法律案', exact_match=True, category=BillCategory.KAKUHOU).id == 'Bill:1'
+        assert index.find_one('犬の保護に関する法律案（参議院提出）', date=datetime(2021, 2, 1)).id == 'Bill:3'
+        assert index.find_one('猫の保護に関する法律案（内閣提出）', date=datetime(2021, 2, 1)).id == 'Bill:1'
+        assert [bill.id for bill in index.find('保護に関する法律案', date=datetime(2020, 11, 1))] == ['Bill:2']
+        assert index.find('外交に関する件', date=datetime(2021, 2, 1)) == []
+        assert index.stats == {'hit': 6, 'miss': 1}
+
+    @staticmethod
+    def build_bill(id_, name, bill_number, category, diets):
+        bill = Bill(None)
+        bill.id, bill.name, bill.bill_number, bill.category, bill.belonged_to_diets = \
+            id_, name, bill_number, category, diets
+        return bill
+
+    @staticmethod
+    def build_diet(number, start_date, end_date):
+        diet = Diet(None)
+        diet.number = number
+        diet.start_date = _Neo4jDateTime({'year': start_date.year, 'month': start_date.month, 'day': start_date.day})
+        diet.end_date = _Neo4jDateTime({'year': end_date.year, 'month': end_date.month, 'day': end_date.day})
+        return diet
@@ -0,0 +1,27 @@
+import pytest
+
+from crawler.utils.matcher import KeywordMatcher, BillNameMatcher
+
+
+@pytest.mark.parametrize('automaton_threshold', [0, 256])
+def test_keyword_matcher(monkeypatch, automaton_threshold):
+    monkeypatch.setattr(KeywordMatcher, 'automaton_threshold', automaton_threshold)
+    matcher = KeywordMatcher(['he', 'she', 'his', 'hers', ''])
+    assert matcher.use_automaton == (automaton_threshold == 0)
+    assert matcher.find('ushers') == [0, 1, 3]
+    assert matcher.find('ahishe') == [0, 1, 2]
+    assert matcher.find('xyz') == []
+    assert matcher.contains_any('this')
+    assert not matcher.contains_any('')
+
+
+def test_bill_name_matcher():
+    matcher = BillNameMatcher({
+        'Bill:1': '猫法案',
+        'Bill:2': '犬法案',
+        'Bill:3': '猫法案',  # same name in another diet
+        'Bill:4': '子猫法案',
+    })
+    assert matcher.find_ids('子猫法案と犬法案を議題とします') == ['Bill:1', 'Bill:2', 'Bill:3', 'Bill:4']
+    assert matcher.find_ids('犬法案を議題とします') == ['Bill:2']
+    assert matcher.find_ids('散会します') == []
@@ -0,0 +1,57 @@
+import pytest
+
+from crawler.utils import IdWindow, FrontierSearch
+
+
+def test_id_window():
+    window = IdWindow(next_id=0, last_id=5, window_size=3)
+    assert window.issue() == [1, 2, 3]
+    assert window.issue() == []
+    assert not window.commit(2, True)
+    assert window.issue() == []  # id=1 is not resolved yet
+    assert not window.commit(1, False)
+    assert window.frontier == 2
+    assert window.issue() == [4, 5]
+    for id_ in [3, 4, 5]:
+        window.commit(id_, True)
+    assert window.is_done()
+    assert window.num_hits == 4
+
+
+def test_id_window_failure_in_row():
+    window = IdWindow(next_id=10, last_id=100, window_size=4, failure_in_row_limit=3)
+    assert window.issue() == [11, 12, 13, 14]
+    assert not window.commit(11, False)
+    assert not window.commit(13, False)
+    assert not window.commit(14, False)  # not in a row since id=12 is not resolved yet
+    assert not window.commit(12, True)
+    assert window.frontier == 14 and window.failure_in_row == 2
+    assert window.issue() == [15, 16, 17, 18]
+    assert window.commit(15, False)
+    assert window.stopped and window.frontier == 15
+    assert window.issue() == []
+    assert not window.commit(16, True)
+    assert window.is_done()
+
+
+@pytest.mark.parametrize('existing_ids, expected', [
+    (set(range(0, 1001)), 1000),
+    (set(range(0, 1001)) - {500, 501}, 1000),  # gaps shorter than tolerance are skipped
+    (set(range(0, 11)) | set(range(20, 30)), 10),  # gaps of tolerance or longer are the end
+    ({0}, 0),
+])
+def test_frontier_search(existing_ids, expected):
+    search = FrontierSearch(0, tolerance=3)
+    while not search.is_done():
+        search.commit([id_ for id_ in search.next_ids() if id_ in existing_ids])
+    assert search.lo == expected
+    assert search.num_clusters < 30
+    assert search.num_clusters <= search.num_requests <= search.num_clusters * 3
+
+
+def test_frontier_search_max_id():
+    search = FrontierSearch(0, tolerance=3, max_id=100)
+    while search.next_ids():
+        assert max(search.next_ids()) <= 100
+        search.commit(search.next_ids())
+    assert search.lo == 100
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from crawler.utils import build_speech, build_minutes_activity, build_url, UrlTitle, SpeechRecord, ActivityRecord, \
+    UrlRecord, SpeechTextRecord, to_schema
+from politylink.elasticsearch.schema import SpeechText
+from politylink.graphql.client import GraphQLClient
+from politylink.graphql.schema import Speech
+
+
+def test_speech_record():
+    speech = build_speech('Minutes:1', 3)
+    speech.ndl_url = 'https://kokkai.ndl.go.jp/txt/1/3'
+    record = SpeechRecord('Minutes:1', 3)
+    record.ndl_url = 'https://kokkai.ndl.go.jp/txt/1/3'
+    record.member_id = 'Member:1'  # only for link
+
+    assert record.id == speech.id
+    assert not hasattr(record, 'speaker_name')
+    assert GraphQLClient.build_merge_param(record) == GraphQLClient.build_merge_param(speech)
+    schema_speech = to_schema(record)
+    assert isinstance(schema_speech, Speech)
+    assert schema_speech.member_id == 'Member:1'
+
+
+def test_activity_and_url_record():
+    dt = datetime(2021, 1, 1)
+    activity = ActivityRecord('Member:1', 'Minutes:1', dt)
+    activity.keyphrases = ['猫']
+    assert activity.id == build_minutes_activity('Member:1', 'Minutes:1', dt).id
+    assert GraphQLClient.build_merge_param(activity)['keyphrases'] == ['猫']
+
+    url = UrlRecord('https://kokkai.ndl.go.jp/txt/1', UrlTitle.HONBUN, 'ndl.go.jp')
+    expected = build_url('https://kokkai.ndl.go.jp/txt/1', UrlTitle.HONBUN, 'ndl.go.jp')
+    assert GraphQLClient.build_merge_param(url) == GraphQLClient.build_merge_param(expected)
+
+
+def test_speech_text_record():
+    record = SpeechTextRecord('Speech:1', '本会議', '猫', 'にゃー', '2021-01-01')
+    text = to_schema(record)
+    assert isinstance(text, SpeechText)
+    assert text.__dict__ == SpeechText(
+        {'id': 'Speech:1', 'title': '本会議', 'speaker': '猫', 'body': 'にゃー', 'date': '2021-01-01'}).__dict__
+    assert to_schema(text) is text
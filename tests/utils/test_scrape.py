@@ -2,7 +2,8 @@ from datetime import datetime
 
 import pytest
 
-from crawler.utils.scrape import extract_datetime, extract_parliamentary_group_or_none, extract_parliamentary_groups
+from crawler.utils.scrape import extract_datetime, extract_parliamentary_group_or_none, extract_parliamentary_groups, \
+    canonicalize_news_url
 from politylink.graphql.schema import ParliamentaryGroup
 
 
@@ -25,3 +26,10 @@ def test_extract_parliamentary_groups():
     assert extract_parliamentary_groups('') == []
     assert extract_parliamentary_groups('自由民主党・無所属の会; 公明党; 日本維新の会・無所属の会; 国民民主党・無所属クラブ') == \
            [ParliamentaryGroup.JIMIN, ParliamentaryGroup.KOMEI, ParliamentaryGroup.ISHIN, ParliamentaryGroup.KOKUMIN]
+
+
+def test_canonicalize_news_url():
+    assert canonicalize_news_url('https://JP.reuters.com/article/idJP1/?il=0#top') == \
+           'https://jp.reuters.com/article/idJP1'
+    assert canonicalize_news_url('https://mainichi.jp/articles/20210101/k00/00m/010/123000c') == \
+           'https://mainichi.jp/articles/20210101/k00/00m/010/123000c'
@@ -0,0 +1,24 @@
+from crawler.utils.shared import SharedResource, peek_shared_resource
+
+
+class Resource:
+    num_created = 0
+
+    def __init__(self):
+        Resource.num_created += 1
+
+
+class Spider:
+    resource = SharedResource(Resource, name='test_resource')
+
+
+def test_shared_resource():
+    assert peek_shared_resource('test_resource') is None
+    spider1, spider2 = Spider(), Spider()
+    assert spider1.resource is spider2.resource
+    assert Resource.num_created == 1
+    assert peek_shared_resource('test_resource') is spider1.resource
+
+    spider2.resource = 'fake'
+    assert spider2.resource == 'fake'
+    assert isinstance(spider1.resource, Resource)
@@ -0,0 +1,21 @@
+from crawler.utils.store import KeyphraseCache, SeenIdStore
+
+
+def test_keyphrase_cache(tmp_path):
+    cache = KeyphraseCache(str(tmp_path / 'keyphrase.sqlite'), max_entries=2, version='1')
+    keys = [cache.build_key(text, 3) for text in ['猫', '犬', '鳥']]
+    assert cache.build_key('猫', 3) != cache.build_key('猫', 5)
+    assert cache.build_key('猫', 3) != KeyphraseCache(str(tmp_path / 'other.sqlite'), version='2').build_key('猫', 3)
+
+    cache.update({keys[0]: ['猫'], keys[1]: ['犬']})
+    assert cache.get(keys[:1]) == {keys[0]: ['猫']}  # keys[1] becomes the least recently used
+    cache.update({keys[2]: ['鳥']})
+    assert cache.get(keys) == {keys[0]: ['猫'], keys[2]: ['鳥']}
+
+
+def test_seen_id_store(tmp_path):
+    store = SeenIdStore(str(tmp_path / 'seen.sqlite'), 'shugiin_tv')
+    store.add({'1': '2021-01-01', '2': '2021-01-02', '3': '2021-01-03'})
+    assert store.get_days('2021-01-02', '2021-01-03') == {'2'}
+    assert store.get_days('2021-01-01', '2021-02-01') == {'1', '2', '3'}
+    assert SeenIdStore(str(tmp_path / 'seen.sqlite'), 'other').get_days('2021-01-01', '2021-02-01') == set()